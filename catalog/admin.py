@@ -1,5 +1,10 @@
-from django.contrib import admin
-from .models import Genre, Book, BookInstance, Author, Language
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from . import circulation
+from .forms import BookInstanceActionForm
+from .models import Genre, Book, BookInstance, BookInstanceAudit, Hold, Author, Language, LoanEvent
+from .pagination import EstimatedCountPaginator
 
 # Register your models here.
 
@@ -10,36 +15,95 @@ admin.site.register(Genre)
 admin.site.register(Language)
 
 
-class BookInline(admin.TabularInline):
-    model = Book
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Formset que edita apenas uma página dos objetos relacionados (definida por PaginatedTabularInline)."""
+    per_page = 20
+    page_param = 'page'
+    page_number = 1
+
+    def get_queryset(self):
+        if not hasattr(self, 'page'):
+            self.page = Paginator(super().get_queryset(), self.per_page).get_page(self.page_number)
+            self.page.object_list = list(self.page.object_list)
+            for obj in self.page.object_list:
+                # O objeto pai já está carregado (ex: str(cópia) usa o título do livro sem uma query por linha):
+                setattr(obj, self.fk.name, self.instance)
+        return self.page.object_list
+
+
+class PaginatedTabularInline(admin.TabularInline):
+    """Inline que mostra os objetos relacionados em páginas de per_page (?<modelo>_page=N), e não todos de uma vez.
+
+    As inlines devem definir uma ordenação total (ex: terminada no id) para que as páginas sejam estáveis.
+    """
+    formset = PaginatedInlineFormSet
+    template = 'admin/catalog/paginated_tabular.html'
+    per_page = 20
     extra = 0
 
+    def get_formset(self, request, obj=None, **kwargs):
+        # A classe do formset é criada a cada requisição, então pode guardar a página pedida:
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = f'{self.opts.model_name}_page'
+        formset.page_number = request.GET.get(formset.page_param, 1)
+        return formset
+
+
+class BookInline(PaginatedTabularInline):
+    model = Book
+    ordering = ('title', 'id')
+
 
 @admin.register(Author)  # -> decorador que faz o mesmo que 'admin.site.register(Author)'
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ('last_name', 'first_name', 'date_of_birth', 'date_of_death')
     fields = ['first_name', 'last_name', ('date_of_birth', 'date_of_death')]
+    search_fields = ('last_name', 'first_name')
     inlines = [BookInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 # admin.site.register(Author, AuthorAdmin)
 
 
-class BooksInstanceInline(admin.TabularInline):
+class BooksInstanceInline(PaginatedTabularInline):
     model = BookInstance
-    extra = 0
+    ordering = ('due_back', 'id')
+    # Um <select> com todos os usuários em cada linha da inline seria a parte mais cara da página. O
+    # autocomplete de usuários exigiria a permissão de ver usuários, que os bibliotecários não têm:
+    raw_id_fields = ('borrower',)
 
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'display_genre')
+    list_display = ('title', 'author', 'display_genre', 'copies_available', 'copies_total')
+    list_select_related = ('author',)
+    readonly_fields = Book.COPY_COUNTER_FIELDS
+    search_fields = ('title', 'isbn')
+    autocomplete_fields = ('author',)
     inlines = [BooksInstanceInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # display_genre lê os gêneros pré-carregados (uma query para a página, e não uma por linha):
+        return super().get_queryset(request).prefetch_related('genre')
 
 
 @admin.register(BookInstance)
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ('book', 'status', 'borrower', 'due_back', 'id')
     list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'borrower')
+    # Ordenação total coberta pelo índice bookinst_due_idx (sem ordenar a tabela inteira a cada página):
+    ordering = ('due_back', 'id')
+    autocomplete_fields = ('book',)
+    raw_id_fields = ('borrower',)
+    paginator = EstimatedCountPaginator
+    # Sem o segundo COUNT(*) (o total sem filtros) exibido ao lado do número de resultados filtrados:
+    show_full_result_count = False
     fieldsets = (
         (None, {
             'fields': ('book', 'imprint', 'id')
@@ -48,3 +112,107 @@ class BookInstanceAdmin(admin.ModelAdmin):
             'fields': ('status', 'due_back', 'borrower')
         }),
     )
+    # Ações em massa: um UPDATE para todas as cópias selecionadas (inclusive "selecionar todas"), com
+    # um registro de auditoria por cópia (ver catalog/circulation.py):
+    actions = ('mark_returned', 'extend_due_back', 'send_to_maintenance', 'reassign_imprint')
+    action_form = BookInstanceActionForm
+
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm('catalog.can_mark_returned')
+
+    def action_parameter(self, request, name):
+        """Valor validado de um campo do action_form (ex: 'weeks'), ou None se não informado."""
+        form = self.action_form(request.POST, auto_id=None)
+        form.fields['action'].choices = self.get_action_choices(request)
+        form.is_valid()
+        return form.cleaned_data.get(name)
+
+    @admin.action(description='Mark selected copies as returned', permissions=['mark_returned'])
+    def mark_returned(self, request, queryset):
+        count = circulation.mark_returned(queryset, request.user)
+        self.message_user(request, f'{count} cop{"y" if count == 1 else "ies"} marked as returned.')
+
+    @admin.action(description='Extend due date of selected loans', permissions=['mark_returned'])
+    def extend_due_back(self, request, queryset):
+        weeks = self.action_parameter(request, 'weeks')
+        if not weeks:
+            self.message_user(request, 'Inform the number of weeks to extend the due date.', messages.ERROR)
+            return
+        count = circulation.extend_due_back(queryset, weeks, request.user)
+        self.message_user(
+            request,
+            f'Due date of {count} loan{"" if count == 1 else "s"} extended by {weeks} week{"" if weeks == 1 else "s"}.',
+        )
+
+    @admin.action(description='Send selected copies to maintenance', permissions=['mark_returned'])
+    def send_to_maintenance(self, request, queryset):
+        count = circulation.send_to_maintenance(queryset, request.user)
+        self.message_user(request, f'{count} cop{"y" if count == 1 else "ies"} sent to maintenance.')
+
+    @admin.action(description='Reassign imprint of selected copies', permissions=['change'])
+    def reassign_imprint(self, request, queryset):
+        imprint = self.action_parameter(request, 'imprint')
+        if not imprint:
+            self.message_user(request, 'Inform the new imprint.', messages.ERROR)
+            return
+        count = circulation.reassign_imprint(queryset, imprint, request.user)
+        self.message_user(request, f'Imprint of {count} cop{"y" if count == 1 else "ies"} changed to {imprint!r}.')
+
+
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    """Filas de espera. Os pedidos são colocados, atendidos e expirados por catalog/circulation.py."""
+    list_display = ('book', 'patron', 'status', 'priority', 'created_at', 'expires_at')
+    list_filter = ('status',)
+    list_select_related = ('book', 'patron')
+    # Filtrado por livro (?book__id__exact=N), na ordem da fila (coberta pelo índice hold_queue_idx):
+    ordering = ('book', '-priority', 'created_at', 'id')
+    raw_id_fields = ('book', 'patron', 'book_instance')
+    readonly_fields = ('status', 'book_instance', 'expires_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('cancel_holds',)
+
+    @admin.action(description='Cancel selected holds', permissions=['change'])
+    def cancel_holds(self, request, queryset):
+        count = 0
+        for hold_id in queryset.filter(status__in=Hold.ACTIVE_STATUSES).values_list('pk', flat=True):
+            circulation.cancel_hold(hold_id)
+            count += 1
+        self.message_user(request, f'{count} hold{"" if count == 1 else "s"} cancelled.')
+
+
+@admin.register(BookInstanceAudit)
+class BookInstanceAuditAdmin(admin.ModelAdmin):
+    """Registros das ações em massa, apenas para consulta."""
+    list_display = ('created_at', 'action', 'book_instance', 'user', 'changes')
+    list_filter = ('action',)
+    list_select_related = ('book_instance__book', 'user')
+    raw_id_fields = ('book_instance', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LoanEvent)
+class LoanEventAdmin(admin.ModelAdmin):
+    """Histórico dos empréstimos, apenas para consulta (os relatórios leem LoanRollup)."""
+    list_display = ('created_at', 'kind', 'book', 'book_instance', 'borrower', 'due_back', 'loaned_at')
+    list_filter = ('kind',)
+    list_select_related = ('book', 'borrower')
+    raw_id_fields = ('book_instance', 'book', 'borrower')
+    # Ordenação total coberta pelo índice loanevent_created_idx:
+    ordering = ('-created_at', '-id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,167 @@
+"""Relatórios de circulação a partir do histórico de empréstimos (LoanEvent).
+
+O comando rollup_loans agrega os eventos de cada dia em linhas diárias de LoanRollup (por livro, autor,
+gênero e língua, mais uma linha da biblioteca inteira) e soma os dias de cada mês em linhas mensais. O relatório (loan_report) lê apenas
+essas linhas: os meses inteiros do período vêm das linhas mensais e as pontas das diárias, então cinco
+anos de histórico são no máximo ~60 linhas mensais e ~60 diárias por chave, qualquer que seja o
+número de eventos.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Author, Book, Genre, Language, LoanEvent, LoanRollup
+
+# Campos somados das linhas de LoanRollup:
+ROLLUP_FIELDS = (
+    'loans', 'borrower_days', 'renewals', 'returns', 'overdue_returns', 'completed_loans', 'loan_days',
+)
+
+# Modelo de cada dimensão do relatório (para os nomes das chaves):
+DIMENSION_MODELS = {'book': Book, 'author': Author, 'genre': Genre, 'language': Language}
+
+# Livros lidos por query ao calcular um dia:
+BATCH_SIZE = 1000
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _day_start(day):
+    """Início do dia no fuso horário do site (os dias dos relatórios são os dias locais)."""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _book_dimensions(book_ids):
+    """Retorna {id do livro: [(dimensão, chave), ...]} com o próprio livro, o autor, a língua e os gêneros."""
+    book_ids = sorted(book_ids)
+    dimensions = defaultdict(list)
+    for start in range(0, len(book_ids), BATCH_SIZE):
+        batch = book_ids[start:start + BATCH_SIZE]
+        for pk, author_id, language_id in Book.objects.filter(pk__in=batch).values_list('pk', 'author', 'language'):
+            dimensions[pk] += [('book', pk), ('author', author_id), ('language', language_id)]
+        for pk, genre_id in Book.genre.through.objects.filter(book__in=batch).values_list('book', 'genre'):
+            dimensions[pk].append(('genre', genre_id))
+    return {pk: [(name, key) for name, key in keys if key is not None] for pk, keys in dimensions.items()}
+
+
+def rollup_day(day):
+    """Recalcula as linhas diárias de 'day' a partir dos eventos do dia (pode ser repetido); retorna o
+    número de eventos lidos."""
+    events = list(
+        LoanEvent.objects.filter(
+            created_at__gte=_day_start(day), created_at__lt=_day_start(day + datetime.timedelta(days=1)),
+            book__isnull=False,
+        ).values_list('kind', 'book', 'borrower', 'due_back', 'loaned_at', 'created_at')
+    )
+    dimensions = _book_dimensions({book_id for _, book_id, *_ in events})
+
+    rows = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+    borrowers = defaultdict(set)
+    for kind, book_id, borrower_id, due_back, loaned_at, created_at in events:
+        values = dict.fromkeys(ROLLUP_FIELDS, 0)
+        if kind == 'checkout':
+            values['loans'] = 1
+        elif kind == 'renew':
+            values['renewals'] = 1
+        else:
+            values['returns'] = 1
+            returned_on = timezone.localdate(created_at)
+            values['overdue_returns'] = int(due_back is not None and returned_on > due_back)
+            if loaned_at is not None:
+                values['completed_loans'] = 1
+                values['loan_days'] = (returned_on - timezone.localdate(loaned_at)).days
+        for key in [*dimensions.get(book_id, ()), (LoanRollup.TOTAL, 0)]:
+            row = rows[key]
+            for name, value in values.items():
+                row[name] += value
+            if kind == 'checkout' and borrower_id is not None:
+                borrowers[key].add(borrower_id)
+
+    for key, row in rows.items():
+        row['borrower_days'] = len(borrowers[key])
+    with transaction.atomic():
+        LoanRollup.objects.filter(period='day', start=day).delete()
+        LoanRollup.objects.bulk_create([
+            LoanRollup(period='day', start=day, dimension=dimension, key=key, **values)
+            for (dimension, key), values in rows.items()
+        ], batch_size=BATCH_SIZE)
+    return len(events)
+
+
+def rollup_month(day):
+    """Recalcula as linhas mensais do mês de 'day' somando as linhas diárias do mês."""
+    start = month_start(day)
+    totals = (
+        LoanRollup.objects.filter(period='day', start__gte=start, start__lt=next_month(start))
+        .values('dimension', 'key').annotate(**{name: models.Sum(name) for name in ROLLUP_FIELDS}).order_by()
+    )
+    with transaction.atomic():
+        LoanRollup.objects.filter(period='month', start=start).delete()
+        LoanRollup.objects.bulk_create(
+            [LoanRollup(period='month', start=start, **row) for row in totals.iterator()], batch_size=BATCH_SIZE,
+        )
+
+
+def pending_days(today=None):
+    """Dias a (re)calcular: do último dia já agregado (que pode ter sido agregado incompleto) até hoje, ou
+    desde o primeiro evento na primeira execução."""
+    today = today or timezone.localdate()
+    last = LoanRollup.objects.filter(period='day').aggregate(last=models.Max('start'))['last']
+    if last is None:
+        first = LoanEvent.objects.order_by('created_at', 'id').values_list('created_at', flat=True).first()
+        if first is None:
+            return []
+        last = timezone.localdate(first)
+    return [last + datetime.timedelta(days=offset) for offset in range((today - last).days + 1)]
+
+
+def _periods(start, end):
+    """Filtro das linhas que cobrem [start, end]: mensais para os meses inteiros, diárias para as pontas."""
+    first_full = start if start.day == 1 else next_month(start)
+    after_full = month_start(end + datetime.timedelta(days=1))
+    if first_full >= after_full:
+        return models.Q(period='day', start__gte=start, start__lte=end)
+    return (
+        models.Q(period='month', start__gte=first_full, start__lt=after_full)
+        | models.Q(period='day', start__gte=start, start__lt=first_full)
+        | models.Q(period='day', start__gte=after_full, start__lte=end)
+    )
+
+
+def _with_rates(row):
+    row['avg_loan_days'] = row['loan_days'] / row['completed_loans'] if row['completed_loans'] else None
+    row['overdue_rate'] = row['overdue_returns'] / row['returns'] if row['returns'] else None
+    return row
+
+
+def loan_report(dimension, start, end, limit=50):
+    """Totais de circulação de [start, end] por chave da dimensão ('limit' chaves com mais empréstimos)
+    e do período inteiro, lidos apenas de LoanRollup. Retorna (linhas, totais).
+
+    Os totais vêm das linhas da biblioteca inteira (LoanRollup.TOTAL): um livro com dois gêneros aparece
+    nos dois gêneros, mas seus empréstimos contam uma vez só no total, e um usuário que pega dois livros
+    no mesmo dia é um só usuário-dia. 'borrower_days' não dá os usuários únicos de um período de vários
+    dias: cada usuário conta uma vez por dia em que pegou algo emprestado.
+    """
+    periods = _periods(start, end)
+    sums = {name: models.Sum(name) for name in ROLLUP_FIELDS}
+    rows = list(
+        LoanRollup.objects.filter(periods, dimension=dimension).values('key').annotate(**sums)
+        .order_by('-loans', 'key')[:limit]
+    )
+    totals = LoanRollup.objects.filter(periods, dimension=LoanRollup.TOTAL).aggregate(**sums)
+    totals = {name: value or 0 for name, value in totals.items()}
+
+    names = DIMENSION_MODELS[dimension].objects.in_bulk([row['key'] for row in rows])
+    for row in rows:
+        row['name'] = str(names.get(row['key'], row['key']))
+        _with_rates(row)
+    return rows, _with_rates(totals)
@@ -0,0 +1,358 @@
+"""API JSON de leitura/escrita do catálogo (livros, autores, cópias, gêneros e línguas).
+
+    GET    /catalog/api/<recurso>/            lista (paginação por cursor)
+    POST   /catalog/api/<recurso>/            cria
+    GET    /catalog/api/<recurso>/<pk>        detalhe
+    PUT    /catalog/api/<recurso>/<pk>        altera (todos os campos graváveis)
+    PATCH  /catalog/api/<recurso>/<pk>        altera (apenas os campos enviados)
+    DELETE /catalog/api/<recurso>/<pk>        remove
+    POST   /catalog/api/copies/<pk>/<ação>    checkout, return, renew ou reserve (catalog/circulation.py)
+
+Parâmetros de leitura: 'fields' (ex: ?fields=title,author) seleciona os campos, 'expand'
+(ex: ?expand=author,genre) embute os objetos relacionados em vez dos ids (com select_related/
+prefetch_related, sem uma query por linha), 'cursor' e 'page_size' paginam a lista.
+
+As respostas GET levam ETag e Last-Modified derivados da versão do catálogo (catalog/cache.py),
+então uma requisição condicional (If-None-Match/If-Modified-Since) recebe 304 sem nenhuma query.
+As escritas exigem a permissão 'catalog.can_mark_returned' (como os formulários do site) e,
+com autenticação por sessão, o cabeçalho X-CSRFToken. O status e a data de devolução das cópias
+não são graváveis: só mudam pelas ações de circulação, que bloqueiam a linha da cópia, conferem o
+status atual e atendem a fila de espera do livro.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
+from django.forms.models import model_to_dict, modelform_factory
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from . import circulation
+from .cache import get_catalog_last_modified, get_catalog_version
+from .forms import RenewBookForm
+from .models import Author, Book, BookInstance, Genre, Language
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import replica_reads
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    """Erro devolvido ao cliente como {"detail": ...} com o status HTTP informado."""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class Resource:
+    """Descreve como um modelo é exposto: campos, relações expansíveis, ordenação e campos graváveis."""
+
+    def __init__(self, model, fields, ordering, expandable=None, writable=()):
+        self.model = model
+        self.fields = tuple(fields)
+        self.ordering = tuple(ordering)
+        self.expandable = expandable or {}  # campo da relação -> nome do recurso relacionado
+        self.writable = tuple(writable)
+
+    def is_many(self, name):
+        return name != 'id' and self.model._meta.get_field(name).many_to_many
+
+    @property
+    def form_class(self):
+        return modelform_factory(self.model, fields=self.writable)
+
+
+RESOURCES = {
+    'books': Resource(
+        Book,
+        fields=('id', 'title', 'summary', 'isbn', 'author', 'language', 'genre',
+                'copies_total', 'copies_available', 'next_due_back'),
+        ordering=('title', 'id'),
+        expandable={'author': 'authors', 'language': 'languages', 'genre': 'genres'},
+        writable=('title', 'summary', 'isbn', 'author', 'language', 'genre'),
+    ),
+    'authors': Resource(
+        Author,
+        fields=('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death'),
+        ordering=('last_name', 'first_name', 'id'),
+        writable=('first_name', 'last_name', 'date_of_birth', 'date_of_death'),
+    ),
+    # O usuário que pegou a cópia emprestada não é exposto pela API; status e due_back mudam apenas
+    # pelas ações de circulação (copy_action).
+    'copies': Resource(
+        BookInstance,
+        fields=('id', 'book', 'imprint', 'status', 'due_back'),
+        ordering=('id',),
+        expandable={'book': 'books'},
+        writable=('book', 'imprint'),
+    ),
+    'genres': Resource(Genre, fields=('id', 'name'), ordering=('name', 'id'), writable=('name',)),
+    'languages': Resource(Language, fields=('id', 'name'), ordering=('name', 'id'), writable=('name',)),
+}
+
+
+def _split(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def parse_selection(resource, params):
+    """Retorna (campos, relações expandidas) pedidos em ?fields= e ?expand=, validando os nomes."""
+    fields = _split(params.get('fields')) or list(resource.fields)
+    expand = _split(params.get('expand'))
+    unknown = [name for name in fields if name not in resource.fields]
+    unknown += [name for name in expand if name not in resource.expandable]
+    if unknown:
+        raise ApiError(f"Unknown field or expansion: {', '.join(unknown)}.")
+    # Uma relação expandida é sempre incluída na resposta:
+    fields += [name for name in expand if name not in fields]
+    return fields, expand
+
+
+def build_queryset(resource, fields, expand):
+    """Monta o queryset carregando apenas as colunas pedidas e as relações com JOIN/prefetch."""
+    queryset = resource.model.objects.all()
+    columns = {'pk', *resource.ordering}
+    for name in fields:
+        if name == 'id' or resource.is_many(name):
+            continue
+        columns.add(name)
+        if name in expand:
+            related = RESOURCES[resource.expandable[name]]
+            queryset = queryset.select_related(name)
+            columns.update(f'{name}__{sub}' for sub in related.fields if not related.is_many(sub))
+
+    for name in fields:
+        if name != 'id' and resource.is_many(name):
+            related_model = resource.model._meta.get_field(name).related_model
+            if name in expand:
+                related = RESOURCES[resource.expandable[name]]
+                related_queryset = related_model.objects.only(*[sub for sub in related.fields if not related.is_many(sub)])
+            else:
+                related_queryset = related_model.objects.only('pk')
+            queryset = queryset.prefetch_related(Prefetch(name, queryset=related_queryset))
+
+    return queryset.only(*columns)
+
+
+def serialize(resource, obj, fields, expand=()):
+    data = {}
+    for name in fields:
+        if name == 'id':
+            data[name] = obj.pk
+            continue
+        field = resource.model._meta.get_field(name)
+        if field.many_to_many:
+            related = getattr(obj, name).all()
+            if name in expand:
+                target = RESOURCES[resource.expandable[name]]
+                data[name] = [serialize(target, item, target.fields) for item in related]
+            else:
+                data[name] = [item.pk for item in related]
+        elif field.is_relation:
+            if name in expand:
+                target = RESOURCES[resource.expandable[name]]
+                value = getattr(obj, name)
+                data[name] = None if value is None else serialize(
+                    target, value, [sub for sub in target.fields if not target.is_many(sub)],
+                )
+            else:
+                data[name] = getattr(obj, field.attname)
+        else:
+            data[name] = getattr(obj, name)
+    return data
+
+
+def _catalog_etag(request, *args, **kwargs):
+    # A resposta depende apenas dos dados do catálogo e da URL (campos, expansões, cursor):
+    key = f'{get_catalog_version()}:{request.get_full_path()}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(get_catalog_last_modified(), tz=timezone.utc)
+
+
+def api_view(view_func):
+    """Decorator das views da API: resolve o recurso, trata ApiError e aplica os GETs condicionais."""
+    conditional = condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, resource, *args, **kwargs):
+        if resource not in RESOURCES:
+            return JsonResponse({'detail': 'Unknown resource.'}, status=404)
+        try:
+            response = conditional(request, RESOURCES[resource], *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'detail': error.detail}, status=error.status)
+        if request.method in ('GET', 'HEAD'):
+            patch_cache_control(
+                response, public=True, must_revalidate=True, max_age=getattr(settings, 'CATALOG_API_MAX_AGE', 0),
+            )
+        return response
+
+    return wrapper
+
+
+def _get_object(resource, pk, queryset=None):
+    try:
+        pk = resource.model._meta.pk.to_python(pk)
+        return (queryset if queryset is not None else resource.model.objects).get(pk=pk)
+    except (ValidationError, resource.model.DoesNotExist):
+        raise ApiError('Not found.', status=404)
+
+
+def _check_write_permission(request):
+    if not request.user.has_perm('catalog.can_mark_returned'):
+        raise ApiError('You do not have permission to perform this action.', status=403)
+
+
+def _read_json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError('Invalid JSON body.')
+    if not isinstance(data, dict):
+        raise ApiError('The JSON body must be an object.')
+    return data
+
+
+def _save(request, resource, data, instance=None):
+    form = resource.form_class(data=data, instance=instance)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors.get_json_data()}, status=400)
+    obj = form.save()
+    return JsonResponse(serialize(resource, obj, resource.fields), status=201 if instance is None else 200)
+
+
+@replica_reads
+@api_view
+def collection(request, resource):
+    if request.method == 'POST':
+        _check_write_permission(request)
+        return _save(request, resource, _read_json(request))
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD', 'POST'])
+
+    fields, expand = parse_selection(resource, request.GET)
+    try:
+        page_size = min(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError('Invalid page_size.')
+    if page_size < 1:
+        raise ApiError('Invalid page_size.')
+
+    paginator = KeysetPaginator(build_queryset(resource, fields, expand), page_size, resource.ordering)
+    try:
+        page = paginator.page(request.GET.get('cursor') or None)
+    except InvalidCursor:
+        raise ApiError('Invalid cursor.')
+
+    def page_url(cursor):
+        if cursor is None:
+            return None
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return request.build_absolute_uri(f'{request.path}?{urlencode(params, doseq=True)}')
+
+    return JsonResponse({
+        'results': [serialize(resource, obj, fields, expand) for obj in page],
+        'next': page_url(page.next_cursor),
+        'previous': page_url(page.previous_cursor),
+    })
+
+
+@replica_reads
+@api_view
+def item(request, resource, pk):
+    if request.method in ('GET', 'HEAD'):
+        fields, expand = parse_selection(resource, request.GET)
+        obj = _get_object(resource, pk, build_queryset(resource, fields, expand))
+        return JsonResponse(serialize(resource, obj, fields, expand))
+
+    if request.method not in ('PUT', 'PATCH', 'DELETE'):
+        return HttpResponseNotAllowed(['GET', 'HEAD', 'PUT', 'PATCH', 'DELETE'])
+
+    _check_write_permission(request)
+    obj = _get_object(resource, pk)
+    if request.method == 'DELETE':
+        obj.delete()
+        return HttpResponse(status=204)
+
+    data = _read_json(request)
+    if request.method == 'PATCH':
+        # Campos não enviados mantêm os valores atuais (relações muitos-para-muitos como lista de ids):
+        current = model_to_dict(obj, fields=resource.writable)
+        for name, value in current.items():
+            if resource.is_many(name):
+                current[name] = [related.pk for related in value]
+        data = {**current, **data}
+    return _save(request, resource, data, instance=obj)
+
+
+def _due_back(data, required):
+    """Valida 'due_back' do corpo com as regras da renovação pelo site (entre hoje e 4 semanas)."""
+    if data.get('due_back') is None and not required:
+        return None
+    form = RenewBookForm(data={'renewal_date': data.get('due_back')})
+    if not form.is_valid():
+        raise ApiError(' '.join(form.errors['renewal_date']))
+    return form.cleaned_data['renewal_date']
+
+
+def _borrower(data):
+    try:
+        return User.objects.get(username=data.get('borrower'))
+    except User.DoesNotExist:
+        raise ApiError('Unknown borrower.')
+
+
+COPY_ACTIONS = {
+    'checkout': lambda pk, data: circulation.checkout(pk, _borrower(data), _due_back(data, required=False)),
+    'return': lambda pk, data: circulation.return_copy(pk),
+    'renew': lambda pk, data: circulation.renew(pk, _due_back(data, required=True)),
+    'reserve': lambda pk, data: circulation.reserve(pk, _borrower(data)),
+}
+
+
+def copy_action(request, pk, action):
+    """Executa uma operação de circulação em uma cópia. Corpo JSON: 'borrower' (username) para checkout
+    e reserve, 'due_back' (obrigatório em renew). Uma operação não permitida no status atual da
+    cópia responde 409."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    resource = RESOURCES['copies']
+    try:
+        _check_write_permission(request)
+        if action not in COPY_ACTIONS:
+            raise ApiError('Unknown action.', status=404)
+        try:
+            pk = resource.model._meta.pk.to_python(pk)
+        except ValidationError:
+            raise ApiError('Not found.', status=404)
+        try:
+            copy = COPY_ACTIONS[action](pk, _read_json(request))
+        except circulation.CirculationError as error:
+            if not resource.model.objects.filter(pk=pk).exists():
+                raise ApiError('Not found.', status=404)
+            raise ApiError(str(error), status=409)
+    except ApiError as error:
+        return JsonResponse({'detail': error.detail}, status=error.status)
+    return JsonResponse(serialize(resource, copy, resource.fields))
+
+
+def api_root(request):
+    """Lista os recursos disponíveis na API."""
+    return JsonResponse({
+        name: request.build_absolute_uri(reverse('api-collection', args=[name])) for name in RESOURCES
+    })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # Conecta os handlers de sinais que mantêm os dados desnormalizados do catálogo.
+        from . import signals  # noqa: F401
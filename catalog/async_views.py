@@ -0,0 +1,159 @@
+"""Versões assíncronas (ASGI) das views de leitura mais acessadas do catálogo.
+
+Usadas no lugar das views de catalog/views.py quando CATALOG_ASYNC_VIEWS está ativo (ver
+catalog/urls.py). O Django 4.0 ainda não tem a interface assíncrona do ORM, então cada query
+roda em uma thread via sync_to_async e as queries independentes de uma página são
+disparadas ao mesmo tempo com asyncio.gather.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import connections
+from django.http import Http404
+from django.shortcuts import render
+
+from .cache import author_version, book_version, cache_catalog_page, conditional_catalog_page
+from .models import Author, Book, LibraryStats, detail_url
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import replica_reads
+from .search import search_books
+from .views import BookListView
+
+
+def _run_and_release(func, *args):
+    try:
+        return func(*args)
+    finally:
+        # Cada chamada pode cair em qualquer thread do executor, e cada thread abre a sua própria
+        # conexão (que close_old_connections só fecharia depois de CONN_MAX_AGE): fecha a conexão
+        # da thread ao terminar, para não acumular uma conexão ociosa por thread do executor.
+        connections.close_all()
+
+
+def run_query(func, *args):
+    """Executa uma função síncrona de acesso ao banco fora do event loop.
+
+    Com CATALOG_ASYNC_PARALLEL_QUERIES as funções rodam em threads (e conexões) separadas, de
+    modo que as queries reunidas com asyncio.gather são executadas de fato em paralelo, ao custo
+    de abrir uma conexão por chamada (ou retirá-la do pool, no modo 'pool'); sem ele (padrão),
+    todas rodam na thread síncrona da requisição (uma de cada vez, mas sem bloquear o event loop).
+    """
+    if getattr(settings, 'CATALOG_ASYNC_PARALLEL_QUERIES', False):
+        return sync_to_async(_run_and_release, thread_sensitive=False)(func, *args)
+    return sync_to_async(func)(*args)
+
+
+async def render_async(request, template_name, context):
+    # O template acessa request.user e a sessão (queries síncronas), então é renderizado fora do event loop.
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@replica_reads
+async def index(request):
+    """View function assíncrona para a home page do site."""
+    word = 'Outro'
+    stats, filter_books_by = await asyncio.gather(
+        run_query(LibraryStats.load),
+        run_query(search_books, word, 10),
+    )
+    context = {
+        'num_books': stats.num_books,
+        'num_instances': stats.num_instances,
+        'num_instances_available': stats.num_instances_available,
+        'num_instances_on_loan': stats.num_instances_on_loan,
+        'num_authors': stats.num_authors,
+        'num_genres': stats.num_genres,
+        'word': word,
+        'filter_books_by': filter_books_by,
+    }
+    return await render_async(request, 'index.html', context)
+
+
+@replica_reads
+@cache_catalog_page
+async def book_list(request):
+    """Lista paginada de livros: o COUNT e a página são buscados ao mesmo tempo.
+
+    Com a paginação por keyset (CATALOG_KEYSET_PAGINATION ou '?cursor='), como na BookListView, a
+    página vem de uma única query, sem COUNT nem OFFSET.
+    """
+    queryset = (
+        Book.objects.select_related('author')
+        .only('title', 'author__first_name', 'author__last_name')
+        .annotate(url=detail_url('book-detail'))
+        .order_by('title', 'id')
+    )
+    per_page = 10
+    if getattr(settings, 'CATALOG_KEYSET_PAGINATION', False) or 'cursor' in request.GET:
+        paginator = KeysetPaginator(queryset, per_page, BookListView.keyset_ordering)
+        try:
+            page_obj = await run_query(paginator.page, request.GET.get('cursor') or None)
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        context = {
+            'paginator': paginator,
+            'page_obj': page_obj,
+            'is_paginated': page_obj.has_other_pages(),
+            'object_list': page_obj.object_list,
+            'book_list': page_obj.object_list,
+        }
+        return await render_async(request, 'catalog/book_list.html', context)
+
+    try:
+        number = int(request.GET.get('page', 1))
+    except ValueError:
+        raise Http404('Invalid page.')
+    offset = (number - 1) * per_page
+
+    count, rows = await asyncio.gather(
+        run_query(queryset.count),
+        run_query(list, queryset[max(offset, 0):max(offset, 0) + per_page]),
+    )
+
+    paginator = Paginator(queryset, per_page)
+    paginator.count = count  # cached_property: evita um novo COUNT
+    try:
+        number = paginator.validate_number(number)
+    except InvalidPage:
+        raise Http404('Invalid page.')
+    page_obj = Page(rows, number, paginator)
+
+    context = {
+        'paginator': paginator,
+        'page_obj': page_obj,
+        'is_paginated': paginator.num_pages > 1,
+        'object_list': rows,
+        'book_list': rows,
+    }
+    return await render_async(request, 'catalog/book_list.html', context)
+
+
+def _load_book(pk):
+    try:
+        return Book.objects.select_related('author', 'language').prefetch_related('genre').get(pk=pk)
+    except Book.DoesNotExist:
+        raise Http404('No book found matching the query.')
+
+
+@replica_reads
+@conditional_catalog_page(book_version)
+@cache_catalog_page
+async def book_detail(request, pk):
+    book = await run_query(_load_book, pk)
+    context = {'object': book, 'book': book, 'copies': book.bookinstance_set.with_display()}
+    return await render_async(request, 'catalog/book_detail.html', context)
+
+
+@replica_reads
+@conditional_catalog_page(author_version)
+@cache_catalog_page
+async def author_detail_view(request, pk):
+    """Detalhes do autor: o autor e os livros dele são buscados ao mesmo tempo."""
+    books = Book.objects.filter(author=pk).annotate(url=detail_url('book-detail')).order_by('title')
+    authors, books = await asyncio.gather(
+        run_query(list, Author.objects.filter(pk=pk)),
+        run_query(list, books),
+    )
+    return await render_async(request, 'catalog/author_detail.html', {'authors': authors, 'books': books})
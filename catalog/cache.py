@@ -0,0 +1,240 @@
+"""Cache das páginas do catálogo, invalidado por uma versão global do catálogo.
+
+Toda alteração em Book, Author, BookInstance, Genre ou Language (ver catalog/signals.py)
+incrementa a versão, e as chaves de página e de fragmentos de template incluem a versão
+atual: entradas antigas simplesmente deixam de ser usadas e expiram sozinhas.
+
+As páginas HTML também respondem a GETs condicionais (conditional_catalog_page): o ETag e o
+Last-Modified vêm das colunas updated_at dos objetos exibidos, e uma página não alterada
+recebe 304 sem executar a view nem renderizar o template.
+"""
+import asyncio
+import datetime
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import routers
+from .models import Author, Book, BorrowerSummary, LibraryStats
+
+VERSION_KEY = 'catalog:version'
+LAST_MODIFIED_KEY = 'catalog:last-modified'
+
+
+def _initial_version():
+    # Baseada no relógio: se a chave for removida do cache a nova versão nunca colide com uma antiga.
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    """Retorna a versão atual do catálogo (criando-a se ainda não existir no cache)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), None)
+        version = cache.get(VERSION_KEY, _initial_version())
+    return version
+
+
+def get_catalog_last_modified():
+    """Retorna o timestamp (segundos) da última alteração conhecida do catálogo."""
+    last_modified = cache.get(LAST_MODIFIED_KEY)
+    if last_modified is None:
+        last_modified = time.time()
+        cache.add(LAST_MODIFIED_KEY, last_modified, None)
+    return last_modified
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, _initial_version(), None)
+    cache.set(LAST_MODIFIED_KEY, time.time(), None)
+
+
+def bump_catalog_version():
+    """Invalida as páginas em cache do catálogo.
+
+    A versão é incrementada imediatamente e de novo após o commit da transação, para que uma
+    página renderizada por outra requisição antes do commit (com os dados antigos) também seja descartada.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def replica_cache_timeout(timeout):
+    """Tempo de cache (segundos, None para sempre) do que for calculado a partir das leituras da requisição.
+
+    A versão do catálogo é incrementada no principal, mas uma réplica atrasada ainda pode devolver os
+    dados anteriores à alteração: o que ela serviu ficaria em cache sob a versão nova. Por isso,
+    quando a requisição lê de uma réplica, o tempo fica limitado a DATABASE_REPLICA_PIN_SECONDS (o
+    atraso de replicação tolerado, o mesmo que mantém quem gravou lendo do principal).
+    """
+    if not routers.reading_from_replica():
+        return timeout
+    lag = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10)
+    return lag if timeout is None else min(timeout, lag)
+
+
+def _page_cache_key(request):
+    """Retorna a chave da página em cache, ou None quando a requisição não deve usar o cache."""
+    timeout = getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600)
+    if not timeout or request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return None
+    path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'catalog:page:{get_catalog_version()}:{path_hash}'
+
+
+def _store_page(key, response):
+    timeout = replica_cache_timeout(getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600))
+    if response.status_code == 200:
+        if hasattr(response, 'render') and callable(response.render):
+            response.add_post_render_callback(lambda rendered: cache.set(key, rendered, timeout))
+        else:
+            cache.set(key, response, timeout)
+
+
+def cache_catalog_page(view_func):
+    """Decorator que guarda a resposta inteira da view para usuários anônimos.
+
+    Usuários autenticados (cuja página tem conteúdo personalizado) e métodos diferentes de
+    GET/HEAD sempre executam a view. A chave inclui a versão do catálogo e a URL completa.
+    Funciona também com views assíncronas (o acesso ao cache e à sessão roda fora do event loop).
+    """
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            key = await sync_to_async(_page_cache_key)(request)
+            if key is None:
+                return await view_func(request, *args, **kwargs)
+            response = await sync_to_async(cache.get)(key)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+                await sync_to_async(_store_page)(key, response)
+            return response
+
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = _page_cache_key(request)
+        if key is None:
+            return view_func(request, *args, **kwargs)
+        response = cache.get(key)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            _store_page(key, response)
+        return response
+
+    return wrapper
+
+
+def _conditional_state(request, version_func, use_last_modified, args, kwargs):
+    """Retorna (etag, last_modified) da página, ou None quando a resposta não deve ser condicional."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # A versão fica em cache junto com a versão do catálogo (que muda a cada alteração), então as
+    # requisições seguintes, inclusive as condicionais, não precisam consultar o banco:
+    call_hash = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+    key = f'catalog:page-version:{get_catalog_version()}:{version_func.__name__}:{call_hash}'
+    version = cache.get(key)
+    if version is None:
+        version = version_func(request, *args, **kwargs)
+        if version is None:
+            return None
+        cache.set(key, version, replica_cache_timeout(getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 600) or None))
+
+    # O menu lateral muda conforme o usuário (inclusive o número de empréstimos), então o ETag inclui o
+    # usuário e a versão do resumo dele; o Last-Modified (que não distingue usuários) só é enviado para
+    # usuários anônimos.
+    summary = BorrowerSummary.for_request(request)
+    user = (request.user.pk, summary.updated_at) if summary is not None else None
+    etag = quote_etag(hashlib.md5(repr((version, user, request.get_full_path())).encode()).hexdigest())
+    last_modified = None
+    if use_last_modified and user is None:
+        dates = [value for value in version if isinstance(value, datetime.datetime)]
+        if dates:
+            last_modified = int(max(dates).timestamp())
+    return etag, last_modified
+
+
+def _finish_response(request, response, state):
+    if state is not None and response.status_code in (200, 304):
+        etag, last_modified = state
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+
+    # Usuários anônimos: qualquer cache (ex: um proxy reverso) pode guardar a página por alguns segundos.
+    # Usuários autenticados: apenas o navegador, sempre revalidando com o ETag.
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'CATALOG_PAGE_MAX_AGE', 60))
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional_catalog_page(version_func, use_last_modified=True):
+    """Decorator que responde 304 para páginas não alteradas e define os cabeçalhos de cache.
+
+    'version_func(request, *args, **kwargs)' retorna uma tupla com os valores que definem o conteúdo
+    da página (as datas updated_at dos objetos exibidos e, se necessário, contagens), ou None para
+    executar a view sem resposta condicional (ex: objeto inexistente, que resulta em 404). A maior
+    data da tupla é enviada como Last-Modified, a menos que 'use_last_modified' seja False (páginas
+    em que uma remoção não altera nenhuma data). Funciona também com views assíncronas.
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                state = await sync_to_async(_conditional_state)(request, version_func, use_last_modified, args, kwargs)
+                response = None
+                if state is not None:
+                    response = get_conditional_response(request, etag=state[0], last_modified=state[1])
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return await sync_to_async(_finish_response)(request, response, state)
+
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            state = _conditional_state(request, version_func, use_last_modified, args, kwargs)
+            response = None
+            if state is not None:
+                response = get_conditional_response(request, etag=state[0], last_modified=state[1])
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+            return _finish_response(request, response, state)
+
+        return wrapper
+
+    return decorator
+
+
+def book_version(request, pk):
+    """Versão da página de detalhes de um livro: o livro (contadores, gêneros e língua inclusos), o autor e
+    as cópias (uma alteração só da edição de uma cópia não toca o livro)."""
+    return Book.objects.filter(pk=pk).annotate(
+        latest_copy=models.Max('bookinstance__updated_at'),
+    ).values_list('updated_at', 'author__updated_at', 'latest_copy').first()
+
+
+def author_version(request, pk):
+    """Versão da página de detalhes de um autor: o autor (tocado quando um livro dele muda) e os livros."""
+    return Author.objects.filter(pk=pk).annotate(
+        latest_book=models.Max('book__updated_at'),
+    ).values_list('updated_at', 'latest_book').first()
+
+
+def author_list_version(request):
+    """Versão da lista de autores: a última alteração e o número de autores (que muda com remoções)."""
+    return Author.objects.aggregate(latest=models.Max('updated_at'))['latest'], LibraryStats.load().num_authors
@@ -0,0 +1,452 @@
+"""Operações de circulação das cópias: empréstimo, devolução, renovação e reserva.
+
+Cada operação bloqueia a linha da cópia (SELECT ... FOR UPDATE) dentro de uma transação,
+confere o status atual e grava apenas os campos alterados (save(update_fields=...)), de modo
+que dois bibliotecários não conseguem emprestar a mesma cópia ao mesmo tempo. Os sinais de
+'catalog/signals.py' atualizam os contadores e o cache como em qualquer outro save().
+
+As variantes em massa (ex: um carrinho de devoluções com centenas de códigos) usam um único
+UPDATE ... WHERE status IN (...) e, como o UPDATE não dispara sinais, atualizam explicitamente
+LibraryStats, os contadores de cópias dos livros, os resumos dos usuários (BorrowerSummary), o
+histórico de empréstimos (LoanEvent, com bulk_create) e a versão do cache do catálogo. As ações em
+massa do admin (mark_returned, extend_due_back, send_to_maintenance, reassign_imprint) recebem
+um queryset (que pode ter dezenas de milhares de cópias) e gravam também um BookInstanceAudit
+por cópia alterada, com bulk_create.
+
+Fila de espera (Hold): uma cópia devolvida é separada, na mesma transação da devolução, para o
+primeiro usuário da fila do livro, que tem HOLD_PICKUP_PERIOD para retirá-la; as reservas não
+retiradas são expiradas pelo comando expire_holds e a cópia passa para o próximo da fila.
+"""
+import datetime
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Book, BookInstance, BookInstanceAudit, BorrowerSummary, Hold, LibraryStats, LoanEvent
+
+# Prazo padrão de um empréstimo (o mesmo proposto na renovação pelo bibliotecário):
+LOAN_PERIOD = datetime.timedelta(weeks=3)
+
+# Prazo para o usuário retirar a cópia separada para ele antes que ela passe para o próximo da fila:
+HOLD_PICKUP_PERIOD = datetime.timedelta(days=7)
+
+# Registros de auditoria inseridos por INSERT, e livros recontados por vez, nas ações em massa:
+BULK_BATCH_SIZE = 1000
+
+# Campos das cópias registrados na auditoria das ações em massa:
+AUDITED_FIELDS = ('status', 'borrower_id', 'due_back', 'imprint')
+
+# Campos de um empréstimo que alteram o resumo do usuário (BorrowerSummary):
+LOAN_FIELDS = ('status', 'borrower_id', 'due_back')
+
+
+class CirculationError(Exception):
+    """A operação não é permitida no status atual da cópia (ex: emprestar uma cópia já emprestada)."""
+
+
+class BulkResult(NamedTuple):
+    """Resultado de uma operação em massa: ids processados e ids ignorados (inexistentes ou em outro status)."""
+    done: list
+    skipped: list
+
+
+def _default_due_back():
+    return datetime.date.today() + LOAN_PERIOD
+
+
+def _lock_copy(copy_id):
+    try:
+        return BookInstance.objects.select_for_update().get(pk=copy_id)
+    except BookInstance.DoesNotExist:
+        raise CirculationError(f'Copy {copy_id} does not exist.')
+
+
+def _check_status(copy, allowed, action):
+    if copy.status not in allowed:
+        raise CirculationError(f'Cannot {action} copy {copy.pk}: it is {copy.get_status_display().lower()}.')
+
+
+@transaction.atomic
+def checkout(copy_id, borrower, due_back=None):
+    """Empresta uma cópia disponível (ou reservada para o mesmo usuário) e retorna a cópia atualizada."""
+    copy = _lock_copy(copy_id)
+    _check_status(copy, ('a', 'r'), 'check out')
+    if copy.status == 'r' and copy.borrower_id != borrower.pk:
+        raise CirculationError(f'Cannot check out copy {copy.pk}: it is reserved for another borrower.')
+
+    was_reserved = copy.status == 'r'
+    copy.status, copy.borrower, copy.due_back = 'o', borrower, due_back or _default_due_back()
+    copy.save(update_fields=['status', 'borrower', 'due_back', 'updated_at'])
+    if was_reserved:
+        Hold.objects.filter(book_instance=copy, patron=borrower, status='r').update(status='f')
+    return copy
+
+
+@transaction.atomic
+def return_copy(copy_id):
+    """Registra a devolução de uma cópia emprestada, que é separada para o primeiro da fila de espera
+    do livro ou volta a ficar disponível."""
+    copy = _lock_copy(copy_id)
+    _check_status(copy, ('o',), 'return')
+    _release_copy(copy)
+    return copy
+
+
+@transaction.atomic
+def renew(copy_id, due_back):
+    """Altera a data de devolução de uma cópia emprestada."""
+    copy = _lock_copy(copy_id)
+    _check_status(copy, ('o',), 'renew')
+
+    copy.due_back = due_back
+    copy.save(update_fields=['due_back', 'updated_at'])
+    return copy
+
+
+@transaction.atomic
+def reserve(copy_id, borrower):
+    """Reserva uma cópia disponível para o usuário (que depois pode pegá-la emprestada com checkout)."""
+    copy = _lock_copy(copy_id)
+    _check_status(copy, ('a',), 'reserve')
+
+    copy.status, copy.borrower = 'r', borrower
+    copy.save(update_fields=['status', 'borrower', 'updated_at'])
+    return copy
+
+
+def _refresh_borrowers(user_ids, new_loans=None):
+    """Recalcula os resumos dos usuários em lotes de BULK_BATCH_SIZE."""
+    user_ids = sorted(pk for pk in user_ids if pk is not None)
+    for start in range(0, len(user_ids), BULK_BATCH_SIZE):
+        BorrowerSummary.refresh(user_ids[start:start + BULK_BATCH_SIZE], new_loans)
+
+
+def _bulk_transition(copy_ids, from_statuses, **changes):
+    """Aplica 'changes' às cópias em 'from_statuses' com um único UPDATE condicional.
+
+    Deve ser chamada dentro de uma transação. Retorna um BulkResult com os ids alterados.
+    """
+    copy_ids = list(dict.fromkeys(BookInstance._meta.pk.to_python(pk) for pk in copy_ids))
+    rows = list(
+        BookInstance.objects.select_for_update()
+        .filter(pk__in=copy_ids, status__in=from_statuses)
+        .order_by('pk').values_list('pk', 'book_id', 'status', 'borrower_id', 'due_back')
+    )
+    done = [pk for pk, *_ in rows]
+    if not done:
+        return BulkResult(done=[], skipped=copy_ids)
+    BookInstance.objects.filter(pk__in=done, status__in=from_statuses).update(updated_at=timezone.now(), **changes)
+
+    # O UPDATE não dispara os sinais: atualiza os dados desnormalizados e o cache explicitamente.
+    if 'status' in changes:
+        moved = Counter(status for _, _, status, _, _ in rows if status != changes['status'])
+        deltas = {LibraryStats.STATUS_FIELDS[status]: -count for status, count in moved.items()}
+        deltas[LibraryStats.STATUS_FIELDS[changes['status']]] = sum(moved.values())
+        LibraryStats.adjust(**deltas)
+    Book.refresh_copy_counters({book_id for _, book_id, _, _, _ in rows})
+    borrower = changes.get('borrower')
+    new_loans = Counter()
+    if changes.get('status') == 'o' and borrower is not None:
+        new_loans[borrower.pk] = sum(1 for _, _, status, _, _ in rows if status != 'o')
+    borrower_ids = {borrower_id for _, _, status, borrower_id, _ in rows if status == 'o'}
+    _refresh_borrowers(borrower_ids | set(new_loans), new_loans)
+    transitions = [
+        (pk, book_id, (status, borrower_id, due_back), (
+            changes.get('status', status),
+            (borrower.pk if borrower is not None else None) if 'borrower' in changes else borrower_id,
+            changes.get('due_back', due_back),
+        ))
+        for pk, book_id, status, borrower_id, due_back in rows
+    ]
+    for start in range(0, len(transitions), BULK_BATCH_SIZE):
+        LoanEvent.record(transitions[start:start + BULK_BATCH_SIZE])
+    bump_catalog_version()
+
+    done_ids = set(done)
+    return BulkResult(done=done, skipped=[pk for pk in copy_ids if pk not in done_ids])
+
+
+@transaction.atomic
+def checkout_copies(copy_ids, borrower, due_back=None):
+    """Empresta de uma vez todas as cópias disponíveis da lista para o usuário."""
+    return _bulk_transition(
+        copy_ids, ('a',), status='o', borrower=borrower, due_back=due_back or _default_due_back(),
+    )
+
+
+@transaction.atomic
+def return_copies(copy_ids):
+    """Registra a devolução de todas as cópias emprestadas da lista (ex: um carrinho de devoluções)."""
+    result = _bulk_transition(copy_ids, ('o',), status='a', borrower=None, due_back=None)
+    for start in range(0, len(result.done), BULK_BATCH_SIZE):
+        _fulfil_holds(BookInstance.objects.filter(pk__in=result.done[start:start + BULK_BATCH_SIZE])
+                      .values_list('pk', 'book_id'))
+    return result
+
+
+def _bulk_apply(queryset, action, user, from_statuses=None, new_values=None, **changes):
+    """Aplica 'changes' com um único UPDATE às cópias do queryset (nos status 'from_statuses', se
+    informados) e grava um BookInstanceAudit por cópia. Deve ser chamada dentro de uma transação.
+
+    'new_values', se informada, calcula os valores novos de uma linha (dict de AUDITED_FIELDS) para a
+    auditoria quando 'changes' contém expressões (ex: F('due_back') + prazo). Retorna as cópias
+    alteradas, como uma lista de (id, id do livro).
+    """
+    queryset = queryset.order_by()
+    if from_statuses is not None:
+        queryset = queryset.filter(status__in=from_statuses)
+    constant = {name: value for name, value in changes.items() if not hasattr(value, 'resolve_expression')}
+
+    moved, book_ids, records, transitions, affected = Counter(), set(), [], [], []
+    borrower_ids, new_loans = set(), Counter()
+    rows = queryset.select_for_update().values_list('pk', 'book_id', *AUDITED_FIELDS)
+    for pk, book_id, *values in rows.iterator(chunk_size=BULK_BATCH_SIZE):
+        old = dict(zip(AUDITED_FIELDS, values))
+        new = {**old, **constant, **(new_values(old) if new_values else {})}
+        records.append(BookInstanceAudit(
+            book_instance_id=pk, action=action, user=user,
+            changes={name: [old[name], new[name]] for name in AUDITED_FIELDS if old[name] != new[name]},
+        ))
+        if len(records) == BULK_BATCH_SIZE:
+            BookInstanceAudit.objects.bulk_create(records)
+            records = []
+        moved[old['status'], new['status']] += 1
+        book_ids.add(book_id)
+        if 'o' in (old['status'], new['status']) and any(old[name] != new[name] for name in LOAN_FIELDS):
+            borrower_ids.update(loan['borrower_id'] for loan in (old, new) if loan['status'] == 'o')
+            if new['status'] == 'o' and (old['status'], old['borrower_id']) != ('o', new['borrower_id']):
+                new_loans[new['borrower_id']] += 1
+            transitions.append((
+                pk, book_id, tuple(old[name] for name in LOAN_FIELDS), tuple(new[name] for name in LOAN_FIELDS),
+            ))
+        affected.append((pk, book_id))
+    if not affected:
+        return []
+    BookInstanceAudit.objects.bulk_create(records)
+    queryset.update(updated_at=timezone.now(), **changes)
+    for start in range(0, len(transitions), BULK_BATCH_SIZE):
+        LoanEvent.record(transitions[start:start + BULK_BATCH_SIZE])
+
+    # O UPDATE não dispara os sinais: atualiza os dados desnormalizados e o cache explicitamente.
+    deltas = Counter()
+    for (old_status, new_status), total in moved.items():
+        if old_status != new_status:
+            deltas[LibraryStats.STATUS_FIELDS[old_status]] -= total
+            deltas[LibraryStats.STATUS_FIELDS[new_status]] += total
+    LibraryStats.adjust(**deltas)
+    # Também atualiza Book.updated_at, a versão das páginas condicionais dos livros:
+    book_ids = sorted(pk for pk in book_ids if pk is not None)
+    for start in range(0, len(book_ids), BULK_BATCH_SIZE):
+        Book.refresh_copy_counters(book_ids[start:start + BULK_BATCH_SIZE])
+    _refresh_borrowers(borrower_ids, new_loans)
+    bump_catalog_version()
+    return affected
+
+
+@transaction.atomic
+def mark_returned(queryset, user=None):
+    """Devolve as cópias emprestadas do queryset; retorna o número de cópias devolvidas."""
+    returned = _bulk_apply(queryset, 'return', user, ('o',), status='a', borrower_id=None, due_back=None)
+    for start in range(0, len(returned), BULK_BATCH_SIZE):
+        _fulfil_holds(returned[start:start + BULK_BATCH_SIZE])
+    return len(returned)
+
+
+@transaction.atomic
+def extend_due_back(queryset, weeks, user=None):
+    """Adia em 'weeks' semanas a devolução das cópias emprestadas do queryset; retorna o número de cópias."""
+    delta = datetime.timedelta(weeks=weeks)
+    return len(_bulk_apply(
+        queryset.filter(due_back__isnull=False), 'extend', user, ('o',),
+        new_values=lambda row: {'due_back': row['due_back'] + delta},
+        due_back=models.ExpressionWrapper(models.F('due_back') + delta, output_field=models.DateField()),
+    ))
+
+
+@transaction.atomic
+def send_to_maintenance(queryset, user=None):
+    """Envia para manutenção as cópias disponíveis ou reservadas do queryset.
+
+    Os pedidos para os quais as cópias reservadas estavam separadas voltam para a fila de espera, na
+    mesma posição (a ordem da fila é a da criação do pedido).
+    """
+    sent = _bulk_apply(queryset, 'maintenance', user, ('a', 'r'), status='m', borrower_id=None, due_back=None)
+    copy_ids = [pk for pk, _ in sent]
+    for start in range(0, len(copy_ids), BULK_BATCH_SIZE):
+        Hold.objects.filter(status='r', book_instance__in=copy_ids[start:start + BULK_BATCH_SIZE]).update(
+            status='w', book_instance=None, expires_at=None,
+        )
+    return len(sent)
+
+
+@transaction.atomic
+def reassign_imprint(queryset, imprint, user=None):
+    """Altera a edição (imprint) de todas as cópias do queryset; retorna o número de cópias."""
+    return len(_bulk_apply(queryset, 'imprint', user, imprint=imprint))
+
+
+def _queue_heads(book_id, count):
+    """Os 'count' primeiros pedidos em espera do livro, bloqueados (uma busca no índice hold_queue_idx).
+
+    Pedidos já bloqueados por outra transação (que os está atendendo agora) são pulados.
+    """
+    return list(
+        Hold.objects.select_for_update(skip_locked=True)
+        .filter(book_id=book_id, status='w').order_by(*Hold.QUEUE_ORDER)[:count]
+    )
+
+
+def _ready(hold, copy_id, now):
+    hold.status, hold.book_instance_id, hold.expires_at = 'r', copy_id, now + HOLD_PICKUP_PERIOD
+
+
+def _release_copy(copy):
+    """Libera uma cópia bloqueada (devolvida, ou cuja reserva foi cancelada): separa-a para o primeiro da
+    fila de espera do livro ou a deixa disponível. Grava com save(), então os sinais atualizam os contadores."""
+    heads = _queue_heads(copy.book_id, 1) if copy.book_id else []
+    if heads:
+        copy.status, copy.borrower_id, copy.due_back = 'r', heads[0].patron_id, None
+    else:
+        copy.status, copy.borrower, copy.due_back = 'a', None, None
+    copy.save(update_fields=['status', 'borrower', 'due_back', 'updated_at'])
+    if heads:
+        _ready(heads[0], copy.pk, timezone.now())
+        heads[0].save(update_fields=['status', 'book_instance', 'expires_at'])
+    return heads[0] if heads else None
+
+
+def _fulfil_holds(copies):
+    """Separa cópias disponíveis (já bloqueadas), dadas como (id, id do livro), para os primeiros das filas
+    de espera dos livros. Deve ser chamada dentro de uma transação; retorna os pedidos atendidos.
+
+    Grava as cópias separadas com bulk_update (um UPDATE por lote, sem sinais) e atualiza LibraryStats,
+    os contadores dos livros e o cache explicitamente.
+    """
+    copies_by_book = defaultdict(list)
+    for copy_id, book_id in copies:
+        if book_id is not None:
+            copies_by_book[book_id].append(copy_id)
+    # Livros com fila de espera: um EXISTS (LIMIT 1 no índice hold_queue_idx) por livro, e não uma linha
+    # por pedido em espera; os primeiros de cada fila vêm de _queue_heads, com LIMIT.
+    queued = (
+        Book.objects.filter(pk__in=list(copies_by_book))
+        .filter(models.Exists(Hold.objects.filter(book=models.OuterRef('pk'), status='w')))
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    now, fulfilled, reserved = timezone.now(), [], []
+    for book_id in queued:
+        for hold, copy_id in zip(_queue_heads(book_id, len(copies_by_book[book_id])), copies_by_book[book_id]):
+            reserved.append(BookInstance(
+                id=copy_id, status='r', borrower_id=hold.patron_id, due_back=None, updated_at=now,
+            ))
+            _ready(hold, copy_id, now)
+            fulfilled.append(hold)
+    if not fulfilled:
+        return []
+
+    BookInstance.objects.bulk_update(
+        reserved, ['status', 'borrower', 'due_back', 'updated_at'], batch_size=BULK_BATCH_SIZE,
+    )
+    Hold.objects.bulk_update(fulfilled, ['status', 'book_instance', 'expires_at'])
+    LibraryStats.adjust(**{
+        LibraryStats.STATUS_FIELDS['a']: -len(fulfilled), LibraryStats.STATUS_FIELDS['r']: len(fulfilled),
+    })
+    Book.refresh_copy_counters({hold.book_id for hold in fulfilled})
+    bump_catalog_version()
+    return fulfilled
+
+
+@transaction.atomic
+def place_hold(book, patron, priority=0):
+    """Coloca o usuário na fila de espera do livro e retorna o pedido.
+
+    Se houver cópias disponíveis (ex: cópias novas), elas são separadas para a fila na hora.
+    """
+    if Hold.objects.filter(book=book, patron=patron, status__in=Hold.ACTIVE_STATUSES).exists():
+        raise CirculationError(f'{patron} already has an active hold on {book}.')
+    hold = Hold.objects.create(book=book, patron=patron, priority=priority)
+    available = (
+        BookInstance.objects.select_for_update(skip_locked=True)
+        .filter(book=book, status='a').order_by('pk').values_list('pk', 'book_id')
+    )
+    _fulfil_holds(available)
+    hold.refresh_from_db()
+    return hold
+
+
+@transaction.atomic
+def cancel_hold(hold_id):
+    """Cancela um pedido em espera ou pronto; a cópia separada para ele passa para o próximo da fila."""
+    try:
+        hold = Hold.objects.select_for_update().get(pk=hold_id)
+    except Hold.DoesNotExist:
+        raise CirculationError(f'Hold {hold_id} does not exist.')
+    if hold.status not in Hold.ACTIVE_STATUSES:
+        raise CirculationError(f'Cannot cancel hold {hold.pk}: it is {hold.get_status_display().lower()}.')
+
+    copy_id = hold.book_instance_id if hold.status == 'r' else None
+    hold.status = 'c'
+    hold.save(update_fields=['status'])
+    if copy_id is not None:
+        copy = _lock_copy(copy_id)
+        if copy.status == 'r' and copy.borrower_id == hold.patron_id:
+            _release_copy(copy)
+    return hold
+
+
+def expire_holds(now=None, batch_size=BULK_BATCH_SIZE):
+    """Expira os pedidos prontos e não retirados até 'now'; cada cópia passa para o próximo da fila ou
+    fica disponível. Processa um lote por transação e retorna o número de pedidos expirados."""
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            holds = list(
+                Hold.objects.select_for_update(skip_locked=True)
+                .filter(status='r', expires_at__lte=now).order_by('expires_at', 'id')
+                .values_list('pk', 'book_instance_id', 'patron_id')[:batch_size]
+            )
+            if not holds:
+                return expired
+            Hold.objects.filter(pk__in=[pk for pk, _, _ in holds]).update(status='e')
+            expired += len(holds)
+
+            # Cópias ainda reservadas para o usuário do pedido expirado:
+            reserved_for = {copy_id: patron_id for _, copy_id, patron_id in holds if copy_id is not None}
+            rows = (
+                BookInstance.objects.select_for_update()
+                .filter(pk__in=list(reserved_for), status='r').order_by('pk')
+                .values_list('pk', 'book_id', 'borrower_id')
+            )
+            released = [(pk, book_id) for pk, book_id, borrower_id in rows if reserved_for[pk] == borrower_id]
+            if not released:
+                continue
+            BookInstance.objects.filter(pk__in=[pk for pk, _ in released]).update(
+                status='a', borrower=None, due_back=None, updated_at=timezone.now(),
+            )
+            LibraryStats.adjust(**{
+                LibraryStats.STATUS_FIELDS['r']: -len(released), LibraryStats.STATUS_FIELDS['a']: len(released),
+            })
+            fulfilled_books = {hold.book_id for hold in _fulfil_holds(released)}
+            Book.refresh_copy_counters({book_id for _, book_id in released} - fulfilled_books)
+            bump_catalog_version()
+
+
+def fulfil_available_copies(batch_size=BULK_BATCH_SIZE):
+    """Separa as cópias disponíveis dos livros que têm fila de espera (ex: cópias novas cadastradas pelo
+    admin); retorna o número de pedidos atendidos."""
+    books = (
+        Book.objects.filter(copies_available__gt=0, holds__status='w')
+        .order_by('pk').values_list('pk', flat=True).distinct()
+    )
+    fulfilled = 0
+    for book_id in books.iterator(chunk_size=batch_size):
+        with transaction.atomic():
+            fulfilled += len(_fulfil_holds(
+                BookInstance.objects.select_for_update(skip_locked=True)
+                .filter(book_id=book_id, status='a').order_by('pk').values_list('pk', 'book_id')
+            ))
+    return fulfilled
@@ -0,0 +1,14 @@
+from functools import partial
+
+from .cache import get_catalog_version, replica_cache_timeout
+from .models import BorrowerSummary
+
+
+def catalog(request):
+    """Disponibiliza a versão do catálogo e o tempo dos fragmentos para a tag {% cache %} e o resumo dos
+    empréstimos do usuário para o menu lateral (todos avaliados apenas quando usados)."""
+    return {
+        'catalog_version': get_catalog_version,
+        'fragment_cache_timeout': partial(replica_cache_timeout, 600),
+        'loan_summary': partial(BorrowerSummary.for_request, request),
+    }
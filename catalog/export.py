@@ -0,0 +1,137 @@
+"""Exportação do catálogo em CSV ou JSON Lines com uso de memória constante.
+
+As linhas são lidas em blocos (keyset pela primary key ou '.iterator(chunk_size=...)', que usa
+cursores no servidor no PostgreSQL) e geradas uma a uma, para serem enviadas por um
+StreamingHttpResponse ou escritas em um arquivo sem carregar a tabela inteira.
+"""
+import asyncio
+import csv
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from .models import Author, Book, BookInstance
+
+CHUNK_SIZE = 2000
+
+
+def iter_books(chunk_size=CHUNK_SIZE):
+    """Livros com autor, língua e gêneros (mesmas colunas aceitas pelo comando import_catalog)."""
+    books = Book.objects.select_related('author', 'language').order_by('pk')
+    genre_links = Book.genre.through.objects.order_by()
+    last_pk = 0
+    while True:
+        chunk = list(books.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+
+        # Gêneros do bloco inteiro em uma única query:
+        genres = {}
+        for book_id, name in genre_links.filter(book_id__in=[book.pk for book in chunk]).values_list(
+            'book_id', 'genre__name'
+        ):
+            genres.setdefault(book_id, []).append(name)
+
+        for book in chunk:
+            yield {
+                'id': book.pk,
+                'title': book.title,
+                'summary': book.summary,
+                'isbn': book.isbn,
+                'author_first_name': book.author.first_name if book.author else '',
+                'author_last_name': book.author.last_name if book.author else '',
+                'language': book.language.name if book.language else '',
+                'genres': sorted(genres.get(book.pk, [])),
+            }
+        last_pk = chunk[-1].pk
+
+
+def iter_authors(chunk_size=CHUNK_SIZE):
+    fields = ('id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death')
+    yield from Author.objects.order_by('pk').values(*fields).iterator(chunk_size=chunk_size)
+
+
+def iter_copies(chunk_size=CHUNK_SIZE):
+    copies = BookInstance.objects.order_by().values(
+        'id', 'book_id', 'book__title', 'imprint', 'status', 'due_back', 'borrower__username'
+    )
+    for copy in copies.iterator(chunk_size=chunk_size):
+        copy['book_title'] = copy.pop('book__title')
+        copy['borrower'] = copy.pop('borrower__username')
+        yield copy
+
+
+DATASETS = {
+    'books': (iter_books, ['id', 'title', 'summary', 'isbn', 'author_first_name', 'author_last_name',
+                           'language', 'genres']),
+    'authors': (iter_authors, ['id', 'first_name', 'last_name', 'date_of_birth', 'date_of_death']),
+    'copies': (iter_copies, ['id', 'book_id', 'book_title', 'imprint', 'status', 'due_back', 'borrower']),
+}
+
+
+class Echo:
+    """Pseudo-buffer que apenas devolve o valor escrito (para o csv.writer gerar linhas sob demanda)."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([';'.join(row[column]) if column == 'genres' else row[column] for column in columns])
+
+
+def export_jsonl(rows, columns):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': (export_csv, 'text/csv'),
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+}
+
+
+def export_lines(dataset, file_format, chunk_size=CHUNK_SIZE):
+    """Gera as linhas (strings) da exportação do 'dataset' no formato informado."""
+    iter_rows, columns = DATASETS[dataset]
+    export, _ = FORMATS[file_format]
+    return export(iter_rows(chunk_size), columns)
+
+
+def stream_lines(lines, lines_per_part=CHUNK_SIZE):
+    """Gera as linhas da exportação para um StreamingHttpResponse, inclusive sob ASGI.
+
+    O ASGIHandler do Django 4.0 percorre o conteúdo das respostas streaming dentro do event loop,
+    onde o ORM levanta SynchronousOnlyOperation. Nesse caso as linhas são lidas em partes por uma
+    thread dedicada (sempre a mesma, pois os cursores no servidor ficam na conexão dela), que fecha
+    a sua conexão no final. Fora de um event loop (WSGI), as linhas são geradas diretamente.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        yield from lines
+        return
+
+    def read_part():
+        return ''.join(itertools.islice(lines, lines_per_part))
+
+    def close():
+        lines.close()
+        connections.close_all()
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-export')
+    try:
+        while True:
+            part = executor.submit(read_part).result()
+            if not part:
+                return
+            yield part
+    finally:
+        executor.submit(close).result()
+        executor.shutdown()
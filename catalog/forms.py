@@ -1,9 +1,11 @@
 import datetime
+import uuid
 from django import forms
+from django.contrib.admin.helpers import ActionForm
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.forms import ModelForm
-from .models import BookInstance
+from .models import BookInstance, LoanRollup
 
 
 class RenewBookForm(forms.Form):
@@ -24,6 +26,23 @@ class RenewBookForm(forms.Form):
         return data
 
 
+class ReturnCartForm(forms.Form):
+    barcodes = forms.CharField(
+        widget=forms.Textarea,
+        help_text='Um código (id da cópia) por linha, como lidos pelo leitor de código de barras.',
+    )
+
+    def clean_barcodes(self):
+        data = self.cleaned_data['barcodes']
+        barcodes = []
+        for code in data.replace(',', ' ').split():
+            try:
+                barcodes.append(uuid.UUID(code))
+            except ValueError:
+                raise ValidationError(_('Invalid barcode: %(code)s'), params={'code': code})
+        return barcodes
+
+
 # exemplo de ModelForm:
 # class RenewBookModelForm(ModelForm):
 #     def clean_due_back(self):
@@ -45,3 +64,29 @@ class RenewBookForm(forms.Form):
 #         fields = ['due_back']
 #         labels = {'due_back': _('Renewal date')}
 #         help_texts = {'due_back': _('Enter a date between now and 4 weeks (default 3).')}
+
+
+class BookInstanceActionForm(ActionForm):
+    """Formulário das ações do admin de cópias, com os parâmetros das ações que precisam de um valor."""
+    weeks = forms.IntegerField(
+        min_value=1, max_value=52, required=False, help_text='Semanas a adiar (extend due date).',
+    )
+    imprint = forms.CharField(max_length=200, required=False, help_text='Nova edição (reassign imprint).')
+
+
+class LoanReportForm(forms.Form):
+    """Filtros do relatório de circulação (datas padrão: os últimos 12 meses)."""
+    dimension = forms.ChoiceField(choices=LoanRollup.DIMENSIONS, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        cleaned_data['dimension'] = cleaned_data.get('dimension') or 'book'
+        if not cleaned_data.get('end'):
+            cleaned_data['end'] = datetime.date.today()
+        if not cleaned_data.get('start'):
+            cleaned_data['start'] = cleaned_data['end'] - datetime.timedelta(days=365)
+        if cleaned_data['start'] > cleaned_data['end']:
+            raise ValidationError(_('Invalid period - start after end'))
+        return cleaned_data
@@ -0,0 +1,128 @@
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from catalog import urls as catalog_urls
+from catalog.models import Author, Book, BookInstance
+
+# Rotas que não fazem sentido em um benchmark de leitura (ou que leem o catálogo inteiro):
+SKIPPED = {'export-catalog', 'metrics'}
+
+
+def percentile(values, percent):
+    """Percentil pelo método nearest-rank (values já ordenados)."""
+    if not values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa cada URL de catalog/urls.py várias vezes pelo test client e relata latência '
+        '(p50/p95/p99), queries por requisição e throughput, opcionalmente salvando o resultado em JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requisições medidas por URL.')
+        parser.add_argument('--warmup', type=int, default=2, help='Requisições descartadas antes da medição.')
+        parser.add_argument('--user', help='Usuário autenticado (ex: um bibliotecário, para as páginas de staff).')
+        parser.add_argument('--cold-cache', action='store_true', help='Limpa o cache antes de cada requisição.')
+        parser.add_argument('--host', default='127.0.0.1', help='Valor do cabeçalho Host (deve estar em ALLOWED_HOSTS).')
+        parser.add_argument('--label', default='', help='Identificação da execução (ex: o hash do commit).')
+        parser.add_argument('--output', help='Arquivo JSON onde o resultado é salvo.')
+        parser.add_argument('--compare', help='Resultado JSON anterior para comparar a latência p95.')
+
+    def url_kwargs(self, pattern):
+        """Escolhe argumentos de exemplo para as rotas com parâmetros."""
+        kwargs = {}
+        for name, converter in pattern.pattern.converters.items():
+            converter_name = type(converter).__name__
+            if converter_name == 'UUIDConverter':
+                kwargs[name] = BookInstance.objects.values_list('pk', flat=True).first()
+            elif pattern.name.startswith('author'):
+                kwargs[name] = Author.objects.values_list('pk', flat=True).first()
+            else:
+                kwargs[name] = Book.objects.values_list('pk', flat=True).first()
+            if kwargs[name] is None:
+                return None
+        return kwargs
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=options['host'])
+        if options['user']:
+            try:
+                client.force_login(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        results = {}
+        for pattern in catalog_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or pattern.name in SKIPPED:
+                continue
+            kwargs = self.url_kwargs(pattern)
+            if kwargs is None:
+                self.stdout.write(f'{pattern.name}: skipped (no sample data)')
+                continue
+            url = reverse(pattern.name, kwargs=kwargs)
+
+            for _ in range(options['warmup']):
+                client.get(url)
+
+            latencies, queries, statuses = [], 0, set()
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                if options['cold_cache']:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    request_start = time.perf_counter()
+                    response = client.get(url)
+                    latencies.append((time.perf_counter() - request_start) * 1000)
+                queries += len(context)
+                statuses.add(response.status_code)
+            elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            results[pattern.name] = {
+                'url': url,
+                'status': sorted(statuses),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'queries_per_request': round(queries / options['requests'], 2),
+                'requests_per_second': round(options['requests'] / elapsed, 1),
+            }
+
+        previous = {}
+        if options['compare']:
+            previous = json.loads(Path(options['compare']).read_text())['results']
+
+        self.stdout.write(f"{'view':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'req/s':>8}")
+        for name, result in results.items():
+            line = (
+                f"{name:<22} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['queries_per_request']:>8.2f} {result['requests_per_second']:>8.1f}"
+            )
+            if name in previous and previous[name]['p95_ms']:
+                change = (result['p95_ms'] - previous[name]['p95_ms']) / previous[name]['p95_ms'] * 100
+                line += f'  p95 {change:+.0f}%'
+            self.stdout.write(line)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'label': options['label'],
+                'timestamp': timezone.now().isoformat(),
+                'requests': options['requests'],
+                'user': options['user'],
+                'results': results,
+            }, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}."))
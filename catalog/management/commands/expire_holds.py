@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog import circulation
+from catalog.models import Hold
+
+
+class Command(BaseCommand):
+    help = (
+        'Expira os pedidos da fila de espera cujas cópias separadas não foram retiradas no prazo; cada '
+        'cópia passa para o próximo da fila do livro (ou volta a ficar disponível). Também separa as '
+        'cópias disponíveis dos livros com fila de espera (ex: cópias novas). Deve ser agendado (ex: '
+        'a cada hora); cada lote é processado em uma transação, então o comando pode ser interrompido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=circulation.BULK_BATCH_SIZE,
+                            help='Pedidos expirados por transação.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os pedidos a expirar.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['dry_run']:
+            count = Hold.objects.filter(status='r', expires_at__lte=now).count()
+            self.stdout.write(self.style.SUCCESS(f'Would expire {count} holds.'))
+            return
+
+        expired = circulation.expire_holds(now, options['batch_size'])
+        fulfilled = circulation.fulfil_available_copies(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} holds; {fulfilled} waiting holds got an available copy.'
+        ))
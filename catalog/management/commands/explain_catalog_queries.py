@@ -0,0 +1,78 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.exceptions import PermissionDenied
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from catalog.models import Author, Book
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa as views de leitura do catálogo e imprime o plano (EXPLAIN) de cada SELECT executado, '
+        'para conferir o uso dos índices com os dados reais.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Usuário usado nas views que exigem login/permissão (ex: um bibliotecário).'
+        )
+        parser.add_argument('--analyze', action='store_true', help='Usa EXPLAIN ANALYZE (apenas PostgreSQL).')
+
+    def catalog_urls(self, user):
+        urls = [reverse('index'), reverse('books'), reverse('authors'), reverse('search') + '?q=book']
+        book = Book.objects.order_by('pk').first()
+        if book:
+            urls.append(reverse('book-detail', args=[book.pk]))
+        author = Author.objects.order_by('pk').first()
+        if author:
+            urls.append(reverse('author-detail', args=[author.pk]))
+        if user.is_authenticated:
+            urls += [reverse('my-borrowed'), reverse('borrowed-books')]
+        return urls
+
+    def handle(self, *args, **options):
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        else:
+            user = AnonymousUser()
+
+        try:
+            prefix = connection.ops.explain_query_prefix(analyze=True) if options['analyze'] else \
+                connection.ops.explain_query_prefix()
+        except ValueError as error:
+            # O backend não suporta a opção (ex: ANALYZE no SQLite):
+            raise CommandError(f'--analyze is not supported on {connection.vendor}: {error}')
+        factory = RequestFactory()
+
+        for url in self.catalog_urls(user):
+            request = factory.get(url)
+            request.user = user
+            request.session = SessionStore()
+            match = resolve(request.path_info)
+
+            with CaptureQueriesContext(connection) as context:
+                try:
+                    response = match.func(request, *match.args, **match.kwargs)
+                    if hasattr(response, 'render'):
+                        response.render()
+                    status = response.status_code
+                except PermissionDenied:
+                    status = 'permission denied'
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{url} ({status})'))
+            selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+            for sql in selects:
+                self.stdout.write(f'  {sql}')
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{prefix} {sql}')
+                    for row in cursor.fetchall():
+                        self.stdout.write(f'    -> {row[-1]}')
+            if not selects:
+                self.stdout.write('  (no queries)')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from catalog import export
+
+
+class Command(BaseCommand):
+    help = 'Exporta livros, autores ou cópias em CSV ou JSON Lines, lendo o banco em blocos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(export.DATASETS))
+        parser.add_argument('--format', default='csv', choices=sorted(export.FORMATS))
+        parser.add_argument('--output', help='Arquivo de saída (padrão: saída padrão).')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help='Linhas lidas por query.')
+
+    def handle(self, *args, **options):
+        lines = export.export_lines(options['dataset'], options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,212 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalog import search
+from catalog.cache import bump_catalog_version
+from catalog.models import Author, Book, BookInstance, Genre, Language, LibraryStats
+
+
+def read_csv(path):
+    """Lê o CSV linha a linha; a coluna 'genres' separa os gêneros com ';'."""
+    with open(path, newline='', encoding='utf-8-sig') as csv_file:
+        for row in csv.DictReader(csv_file):
+            row['genres'] = [name for name in (row.get('genres') or '').split(';')]
+            yield row
+
+
+def read_jsonl(path):
+    """Lê um objeto JSON por linha; 'genres' é uma lista de nomes."""
+    with open(path, encoding='utf-8') as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+# Colunas de texto (no JSON Lines, strings ou null):
+TEXT_FIELDS = ('title', 'summary', 'isbn', 'author_first_name', 'author_last_name', 'language', 'imprint', 'status')
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa livros, autores, gêneros, línguas e cópias de um arquivo CSV ou JSON Lines, '
+        'com bulk_create em lotes transacionais. Colunas: title, summary, isbn, author_first_name, '
+        'author_last_name, language, genres, copies, imprint, status.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo .csv ou .jsonl a ser importado.')
+        parser.add_argument('--format', choices=sorted(READERS), help='Formato do arquivo (padrão: pela extensão).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Linhas gravadas por transação.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Arquivo onde o número da última linha gravada é salvo; ao reiniciar, as linhas já '
+                 'importadas são puladas.',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f"Unsupported format '{file_format}', use one of: {', '.join(sorted(READERS))}.")
+        if not path.exists():
+            raise CommandError(f"File '{path}' does not exist.")
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('The database backend cannot return primary keys from bulk inserts.')
+
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+        start_row = int(checkpoint.read_text()) if checkpoint and checkpoint.exists() else 0
+        batch_size = options['batch_size']
+
+        # Mapas em memória nome -> id, para resolver as referências sem uma query por linha:
+        self.authors = {(first, last): pk for pk, first, last in Author.objects.values_list('pk', 'first_name', 'last_name')}
+        self.genres = dict(Genre.objects.values_list('name', 'pk'))
+        self.languages = dict(Language.objects.values_list('name', 'pk'))
+        self.totals = {'books': 0, 'copies': 0, 'skipped': 0}
+        self.statuses = {status for status, _ in BookInstance.LOAN_STATUS}
+        self.default_status = BookInstance._meta.get_field('status').default
+
+        started = time.monotonic()
+        row_number, batch = start_row, []
+        for index, row in enumerate(READERS[file_format](path)):
+            if index < start_row:
+                continue
+            row_number = index + 1
+            batch.append((row_number, row))
+            if len(batch) == batch_size:
+                self.import_batch(batch, row_number, checkpoint, started)
+                batch = []
+        if batch:
+            self.import_batch(batch, row_number, checkpoint, started)
+
+        # Os bulk_create não disparam os sinais, então os dados desnormalizados são atualizados no final:
+        LibraryStats.rebuild()
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.totals['books']} books and {self.totals['copies']} copies "
+            f"({self.totals['skipped']} rows skipped) in {time.monotonic() - started:.1f}s."
+        ))
+
+    def resolve(self, mapping, model, keys, build):
+        """Cria em massa as linhas de 'model' que ainda não existem e atualiza o mapa chave -> id."""
+        missing = [key for key in dict.fromkeys(keys) if key not in mapping]
+        for obj, key in zip(model.objects.bulk_create([build(key) for key in missing]), missing):
+            mapping[key] = obj.pk
+
+    def clean_row(self, row):
+        """Confere os tipos dos campos e converte 'copies' e 'status' da linha; retorna o motivo se a linha
+        for inválida."""
+        if not isinstance(row, dict):
+            return 'not an object'
+        for field in TEXT_FIELDS:
+            if not isinstance(row.get(field) or '', str):
+                return f'invalid {field} {row[field]!r}'
+        genres = row.get('genres') or []
+        if not isinstance(genres, list) or not all(isinstance(name, str) for name in genres):
+            return f"invalid genres {row['genres']!r} (expected a list of names)"
+        try:
+            copies = int(row.get('copies') or 0)
+        except (TypeError, ValueError):
+            return f"invalid copies {row.get('copies')!r}"
+        if copies < 0:
+            return f'invalid copies {copies}'
+        status = (row.get('status') or '').strip() or self.default_status
+        if status not in self.statuses:
+            return f'invalid status {status!r}'
+        row['copies'], row['status'] = copies, status
+        return None
+
+    def copy_counters(self, row):
+        """Contadores de cópias do livro novo (todas as cópias de uma linha têm o mesmo status)."""
+        counters = {'copies_total': row['copies']}
+        if row['status'] in Book.COPY_STATUS_FIELDS:
+            counters[Book.COPY_STATUS_FIELDS[row['status']]] = row['copies']
+        return counters
+
+    def import_batch(self, rows, row_number, checkpoint, started):
+        with transaction.atomic():
+            # Ignora linhas sem título/ISBN, linhas inválidas (avisando o número da linha) e ISBNs já
+            # cadastrados (o que torna a importação reexecutável):
+            valid_rows = []
+            for number, row in rows:
+                error = self.clean_row(row)
+                if error:
+                    self.stderr.write(f'Row {number} skipped: {error}.')
+                    continue
+                if (row.get('title') or '').strip() and (row.get('isbn') or '').strip():
+                    valid_rows.append(row)
+            isbns = [row['isbn'].strip() for row in valid_rows]
+            existing = set(Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True))
+            new_rows, seen = [], set()
+            for row in valid_rows:
+                isbn = row['isbn'].strip()
+                if isbn not in existing and isbn not in seen:
+                    seen.add(isbn)
+                    new_rows.append(row)
+            self.totals['skipped'] += len(rows) - len(new_rows)
+
+            author_keys = [
+                ((row.get('author_first_name') or '').strip(), (row.get('author_last_name') or '').strip())
+                for row in new_rows
+            ]
+            genre_names = [[name.strip() for name in row.get('genres') or [] if name.strip()] for row in new_rows]
+            language_names = [(row.get('language') or '').strip() for row in new_rows]
+
+            self.resolve(self.authors, Author, [key for key in author_keys if any(key)],
+                         lambda key: Author(first_name=key[0], last_name=key[1]))
+            self.resolve(self.genres, Genre, [name for names in genre_names for name in names],
+                         lambda name: Genre(name=name))
+            self.resolve(self.languages, Language, [name for name in language_names if name],
+                         lambda name: Language(name=name))
+
+            books = Book.objects.bulk_create([
+                Book(
+                    title=row['title'].strip(),
+                    summary=row.get('summary') or '',
+                    isbn=row['isbn'].strip(),
+                    author_id=self.authors.get(author_key),
+                    language_id=self.languages.get(language_name),
+                    **self.copy_counters(row),
+                )
+                for row, author_key, language_name in zip(new_rows, author_keys, language_names)
+            ])
+
+            Book.genre.through.objects.bulk_create([
+                Book.genre.through(book_id=book.pk, genre_id=self.genres[name])
+                for book, names in zip(books, genre_names)
+                for name in dict.fromkeys(names)
+            ])
+
+            copies = BookInstance.objects.bulk_create([
+                BookInstance(
+                    book_id=book.pk,
+                    imprint=row.get('imprint') or '',
+                    status=row['status'],
+                )
+                for book, row in zip(books, new_rows)
+                for _ in range(row['copies'])
+            ])
+
+            search.index_books([book.pk for book in books])
+
+        # Só registra o progresso depois que a transação do lote foi confirmada:
+        if checkpoint:
+            checkpoint.write_text(str(row_number))
+
+        self.totals['books'] += len(books)
+        self.totals['copies'] += len(copies)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Row {row_number}: {self.totals['books']} books, {self.totals['copies']} copies "
+            f"({self.totals['books'] / elapsed if elapsed else 0:.0f} books/s)"
+        )
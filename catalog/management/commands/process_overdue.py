@@ -0,0 +1,95 @@
+import datetime
+import smtplib
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from catalog.models import BookInstance, OverdueNotice
+from catalog.pagination import KeysetPaginator
+
+SUBJECT = 'Overdue books at the Local Library'
+
+
+def overdue_loans(today, chunk_size):
+    """Gera os empréstimos atrasados ainda não avisados, ordenados por usuário, buscando um bloco por vez."""
+    notified = OverdueNotice.objects.filter(book_instance=OuterRef('pk'), due_back=OuterRef('due_back'))
+    loans = (
+        BookInstance.objects.overdue(today)
+        .filter(borrower__isnull=False)
+        .exclude(Exists(notified))
+        .select_related('book', 'borrower')
+        .only('due_back', 'borrower__email', 'borrower__username', 'borrower__first_name', 'book__title')
+    )
+    paginator = KeysetPaginator(loans, chunk_size, ('borrower', 'due_back', 'id'))
+    cursor = None
+    while True:
+        page = paginator.page(cursor)
+        yield from page
+        if not page.has_next():
+            return
+        cursor = page.next_cursor
+
+
+def build_message(borrower, loans):
+    lines = [f'Hello {borrower.first_name or borrower.username},', '', 'The following books are overdue:', '']
+    lines += [f'- {loan.book.title if loan.book else loan.pk} (due back {loan.due_back})' for loan in loans]
+    lines += ['', 'Please return or renew them as soon as possible.']
+    return EmailMessage(SUBJECT, '\n'.join(lines), settings.DEFAULT_FROM_EMAIL, [borrower.email])
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia um aviso por usuário com os empréstimos atrasados ainda não avisados. Os empréstimos '
+        'são lidos em blocos e os e-mails enviados por uma única conexão; cada aviso é registrado em '
+        'OverdueNotice logo depois do envio do seu e-mail, então o comando pode ser reexecutado (ou '
+        'falhar no meio) sem duplicar e-mails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Empréstimos lidos por query.')
+        parser.add_argument('--date', type=datetime.date.fromisoformat, help='Data de referência (padrão: hoje).')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os avisos, sem enviar nada.')
+
+    def handle(self, *args, **options):
+        today = options['date'] or datetime.date.today()
+        self.dry_run = options['dry_run']
+        self.connection = get_connection()
+        self.totals = {'emails': 0, 'loans': 0, 'skipped': 0, 'failed': 0}
+
+        with self.connection:
+            loans = overdue_loans(today, options['chunk_size'])
+            for borrower_id, borrower_loans in groupby(loans, key=lambda loan: loan.borrower_id):
+                borrower_loans = list(borrower_loans)
+                if not borrower_loans[0].borrower.email:
+                    self.totals['skipped'] += 1
+                    continue
+                self.notify(borrower_loans[0].borrower, borrower_loans)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would send' if self.dry_run else 'Sent'} {self.totals['emails']} overdue notices "
+            f"covering {self.totals['loans']} loans ({self.totals['skipped']} borrowers without e-mail, "
+            f"{self.totals['failed']} failed)."
+        ))
+
+    def notify(self, borrower, loans):
+        if not self.dry_run:
+            # Um e-mail por transação: os avisos do usuário só são confirmados depois que o e-mail dele
+            # foi enviado. Se o envio falhar, nada é gravado e o aviso é tentado na próxima execução,
+            # sem repetir os e-mails já enviados aos outros usuários.
+            try:
+                with transaction.atomic():
+                    OverdueNotice.objects.bulk_create([
+                        OverdueNotice(book_instance_id=loan.pk, borrower_id=borrower.pk, due_back=loan.due_back)
+                        for loan in loans
+                    ], ignore_conflicts=True)
+                    self.connection.send_messages([build_message(borrower, loans)])
+            except (smtplib.SMTPException, OSError) as error:
+                self.totals['failed'] += 1
+                self.stderr.write(f'Could not notify {borrower.email}: {error}')
+                return
+        self.totals['emails'] += 1
+        self.totals['loans'] += len(loans)
@@ -0,0 +1,157 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.template import Node, Template
+from django.template.base import TextNode, VariableNode
+from django.template.loader import get_template
+from django.test import RequestFactory, override_settings
+
+from catalog import views
+from catalog.models import Author, Book, BookInstance, detail_url
+
+
+def describe(node):
+    """Trecho do template que gerou o nó (ex: '{{ book.title }}' ou '{% for copy in copies %}')."""
+    if isinstance(node, TextNode):
+        return 'text'
+    contents = node.token.contents if node.token else type(node).__name__
+    if len(contents) > 60:
+        contents = contents[:57] + '...'
+    return f'{{{{ {contents} }}}}' if isinstance(node, VariableNode) else f'{{% {contents} %}}'
+
+
+class TemplateProfiler:
+    """Mede o tempo de cada template (inclusivo) e de cada nó (próprio, sem os nós filhos) durante o bloco with."""
+
+    def __init__(self):
+        self.templates = defaultdict(lambda: [0, 0.0])  # nome -> [renderizações, segundos]
+        self.nodes = defaultdict(lambda: [0, 0.0, 0.0])  # (template, linha, nó) -> [renderizações, próprio, total]
+        self._children = []  # tempo dos filhos de cada nó em renderização (pilha)
+
+    def __enter__(self):
+        self._render_annotated = Node.render_annotated
+        self._render = Template._render
+        profiler = self
+
+        def render_annotated(node, context):
+            profiler._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return profiler._render_annotated(node, context)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = profiler._children.pop()
+                if profiler._children:
+                    profiler._children[-1] += elapsed
+                origin = getattr(node, 'origin', None)
+                key = (
+                    origin.template_name if origin else '?',
+                    node.token.lineno if node.token else 0,
+                    describe(node),
+                )
+                entry = profiler.nodes[key]
+                entry[0] += 1
+                entry[1] += elapsed - children
+                entry[2] += elapsed
+
+        def render(template, context):
+            start = time.perf_counter()
+            try:
+                return profiler._render(template, context)
+            finally:
+                entry = profiler.templates[template.origin.template_name or template.name]
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+
+        Node.render_annotated = render_annotated
+        Template._render = render
+        return self
+
+    def __exit__(self, *exc_info):
+        Node.render_annotated = self._render_annotated
+        Template._render = self._render
+
+
+class Command(BaseCommand):
+    help = (
+        'Renderiza os templates do catálogo com os dados do banco (ex: gerados com seed_catalog) e relata '
+        'o custo de renderização por template e por nó. As queries são executadas antes da medição, então '
+        'o tempo medido é apenas o do template.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Linhas das listas renderizadas.')
+        parser.add_argument('--renders', type=int, default=20, help='Renderizações medidas por template.')
+        parser.add_argument('--user', help='Usuário da requisição (padrão: anônimo).')
+        parser.add_argument('--top', type=int, default=15, help='Número de nós exibidos, pelo tempo próprio.')
+
+    def contexts(self, request, page_size):
+        """Retorna (template, contexto) de cada página do catálogo, com os querysets já avaliados."""
+        def view_queryset(view_class):
+            view = view_class()
+            view.setup(request)
+            return view.get_queryset()
+
+        book = (
+            views.BookDetailView.queryset.annotate(num_copies=Count('bookinstance'))
+            .order_by('-num_copies').first()
+        )
+        if book is not None:
+            yield 'catalog/book_detail.html', {
+                'book': book, 'object': book, 'copies': list(book.bookinstance_set.with_display()[:page_size]),
+            }
+        author = Author.objects.annotate(num_books=Count('book')).order_by('-num_books').first()
+        if author is not None:
+            yield 'catalog/author_detail.html', {
+                'authors': [author],
+                'books': list(Book.objects.filter(author=author).annotate(url=detail_url('book-detail'))
+                              .order_by('title')[:page_size]),
+            }
+        yield 'catalog/book_list.html', {'book_list': list(view_queryset(views.BookListView)[:page_size])}
+        yield 'catalog/author_list.html', {'author_list': list(view_queryset(views.AuthorListView)[:page_size])}
+        loans = list(
+            BookInstance.objects.filter(status__exact='o').select_related('book', 'borrower')
+            .with_display().order_by('due_back', 'id')[:page_size]
+        )
+        yield 'catalog/bookinstance_list_borrowed_staff.html', {'bookinstance_list': loans}
+        yield 'catalog/bookinstance_list_borrowed_user.html', {'bookinstance_list': loans}
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/catalog/')
+        request.user = AnonymousUser()
+        if options['user']:
+            try:
+                request.user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        request.session = {}
+
+        # Sem o cache de fragmentos ({% cache %}), para medir o conteúdo que ele guarda:
+        caches = {**settings.CACHES, 'template_fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        profiler = TemplateProfiler()
+        with override_settings(CACHES=caches):
+            for template_name, context in self.contexts(request, options['page_size']):
+                template = get_template(template_name)
+                template.render(context, request)  # aquecimento (compilação, caso o loader não tenha cache)
+                with profiler:
+                    for _ in range(options['renders']):
+                        template.render(context, request)
+
+        self.stdout.write(f"{'template':<50} {'renders':>8} {'ms/render':>10}")
+        for name, (count, seconds) in sorted(profiler.templates.items(), key=lambda item: -item[1][1] / item[1][0]):
+            self.stdout.write(f'{name:<50} {count:>8} {seconds * 1000 / count:>10.3f}')
+
+        self.stdout.write('')
+        self.stdout.write(f"{'node':<70} {'calls/render':>12} {'self ms':>9} {'total ms':>9}")
+        # Valores por renderização do template que contém o nó (base.html é renderizado por todas as páginas):
+        rows = []
+        for (template_name, lineno, description), (count, own, total) in profiler.nodes.items():
+            renders = profiler.templates[template_name][0] or 1
+            rows.append((f'{template_name}:{lineno} {description}', count / renders, own / renders, total / renders))
+        rows.sort(key=lambda row: -row[2])
+        for label, calls, own, total in rows[:options['top']]:
+            self.stdout.write(f'{label:<70} {calls:>12.1f} {own * 1000:>9.3f} {total * 1000:>9.3f}')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalog import search
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca textual de livros a partir das tabelas do catálogo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias do banco de dados a ser reindexado.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        search.get_search_backend(using).clear()
+
+        # Percorre os livros em lotes pela primary key, sem OFFSET nem carregar a tabela inteira:
+        books = Book.objects.using(using).order_by('pk').values_list('pk', flat=True)
+        last_pk, total = 0, 0
+        while True:
+            batch = list(books.filter(pk__gt=last_pk)[:search.INDEX_BATCH_SIZE])
+            if not batch:
+                break
+            search.index_books(batch, using=using)
+            last_pk, total = batch[-1], total + len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} books.'))
@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from catalog.cache import bump_catalog_version
+from catalog.models import Book, BorrowerSummary, LibraryStats
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores desnormalizados do catálogo a partir das tabelas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Livros recalculados por transação.')
+
+    def handle(self, *args, **options):
+        stats = LibraryStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Library stats rebuilt: {stats}'))
+
+        # Contadores de cópias de cada livro, em lotes pela primary key:
+        book_ids = Book.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk, total = 0, 0
+        while True:
+            batch = list(book_ids.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            Book.refresh_copy_counters(batch)
+            last_pk, total = batch[-1], total + len(batch)
+        # Os contadores são gravados com UPDATE (sem sinais): invalida as páginas em cache.
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Copy counters rebuilt for {total} books.'))
+
+        # Resumos dos empréstimos dos usuários (lifetime_loans é mantido, não pode ser recalculado):
+        user_ids = User.objects.filter(loan_summary__isnull=False).order_by('pk').values_list('pk', flat=True)
+        last_pk, total = 0, 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            BorrowerSummary.refresh(batch)
+            last_pk, total = batch[-1], total + len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Loan summaries rebuilt for {total} borrowers.'))
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from catalog import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Agrega o histórico de empréstimos (LoanEvent) em LoanRollup: uma linha por dia e por mês para '
+        'cada livro, autor, gênero e língua. Por padrão recalcula apenas do último dia já agregado até '
+        'hoje (deve ser agendado, ex: a cada hora); cada dia é recalculado por inteiro, então o comando '
+        'pode ser repetido ou interrompido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='Recalcula a partir desta data (ex: após corrigir eventos).')
+        parser.add_argument('--until', type=datetime.date.fromisoformat, help='Última data (padrão: hoje).')
+
+    def handle(self, *args, **options):
+        until = options['until'] or timezone.localdate()
+        if options['since']:
+            if options['since'] > until:
+                raise CommandError('--since must not be after --until.')
+            days = [options['since'] + datetime.timedelta(days=offset)
+                    for offset in range((until - options['since']).days + 1)]
+        else:
+            days = analytics.pending_days(until)
+
+        events = 0
+        for day in days:
+            events += analytics.rollup_day(day)
+        months = sorted({analytics.month_start(day) for day in days})
+        for month in months:
+            analytics.rollup_month(month)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {events} loan events in {len(days)} days ({len(months)} months).'
+        ))
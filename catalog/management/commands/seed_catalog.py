@@ -0,0 +1,132 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from catalog.cache import bump_catalog_version
+from catalog.models import Author, Book, BookInstance, Genre, Language
+
+GENRES = [
+    'Fiction', 'Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'Biography', 'History', 'Poetry',
+    'Horror', 'Young Adult', 'Philosophy', 'Science', 'Travel', 'Cooking', 'Children', 'Drama',
+]
+
+# Línguas e seus pesos relativos no acervo:
+LANGUAGES = [('English', 60), ('Portuguese', 20), ('Spanish', 10), ('French', 6), ('Japanese', 4)]
+
+# Distribuição dos status das cópias (aproximadamente a de uma biblioteca em funcionamento):
+STATUSES = [('a', 55), ('o', 30), ('m', 10), ('r', 5)]
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elena', 'Fábio', 'Gabriela', 'Hugo', 'Isabel', 'João',
+               'Karen', 'Lucas', 'Marina', 'Nuno', 'Olga', 'Paulo', 'Rita', 'Sérgio', 'Tânia', 'Vitor']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nascimento', 'Carvalho', 'Araújo', 'Ribeiro', 'Gomes', 'Martins', 'Rocha']
+WORDS = ['Shadow', 'River', 'Night', 'Garden', 'Empire', 'Stone', 'Memory', 'Winter', 'Light', 'Silence',
+         'Journey', 'Mirror', 'Ocean', 'Forest', 'Secret', 'Fire', 'Outro', 'City', 'Dream', 'Storm']
+
+SEED_PASSWORD = 'seed-password'
+
+
+class Command(BaseCommand):
+    help = 'Gera um catálogo sintético grande (livros, autores, cópias e usuários) com inserções em massa.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--copies-per-book', type=int, default=3, help='Média de cópias por livro.')
+        parser.add_argument('--users', type=int, default=100, help=f"Leitores (senha '{SEED_PASSWORD}').")
+        parser.add_argument('--authors', type=int, help='Número de autores (padrão: um para cada 5 livros).')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='Semente do gerador aleatório (reprodutível).')
+
+    def bulk_create(self, model, objects):
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(objects[start:start + self.batch_size])
+
+    def first_isbn_number(self):
+        """Número do primeiro ISBN sintético (979 + 10 dígitos) livre: depois do maior já gerado, e não do
+        número de livros, que diminui quando algum é removido."""
+        last = Book.objects.filter(isbn__regex=r'^979[0-9]{10}$').aggregate(last=models.Max('isbn'))['last']
+        return int(last[3:]) + 1 if last else 0
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        num_books = options['books']
+        num_authors = options['authors'] or max(num_books // 5, 1)
+
+        with transaction.atomic():
+            offset = self.first_isbn_number()
+            genres = [Genre.objects.get_or_create(name=name)[0] for name in GENRES]
+            languages = [Language.objects.get_or_create(name=name)[0] for name, _ in LANGUAGES]
+
+            password = make_password(SEED_PASSWORD)
+            first_user = User.objects.count()
+            self.bulk_create(User, [
+                User(username=f'reader{first_user + number}', password=password)
+                for number in range(options['users'])
+            ])
+            users = list(User.objects.order_by('pk').values_list('pk', flat=True))
+
+            self.bulk_create(Author, [
+                Author(
+                    first_name=rng.choice(FIRST_NAMES),
+                    last_name=f'{rng.choice(LAST_NAMES)} {number}',
+                    date_of_birth=datetime.date(1900, 1, 1) + datetime.timedelta(days=rng.randrange(36500)),
+                )
+                for number in range(num_authors)
+            ])
+            authors = list(Author.objects.order_by('-pk').values_list('pk', flat=True)[:num_authors])
+
+            # Poucos autores muito prolíficos e muitos com poucos livros (distribuição de Pareto):
+            author_weights = [rng.paretovariate(1.2) for _ in authors]
+            book_authors = rng.choices(authors, weights=author_weights, k=num_books)
+            book_languages = rng.choices(languages, weights=[weight for _, weight in LANGUAGES], k=num_books)
+            self.bulk_create(Book, [
+                Book(
+                    title=' '.join(rng.sample(WORDS, rng.randint(1, 4))),
+                    summary=' '.join(rng.choices(WORDS, k=30)).capitalize() + '.',
+                    isbn=f'979{offset + number:010d}',
+                    author_id=author_id,
+                    language=language,
+                )
+                for number, (author_id, language) in enumerate(zip(book_authors, book_languages))
+            ])
+            books = list(Book.objects.order_by('-pk').values_list('pk', flat=True)[:num_books])
+
+            genre_weights = [1 / (rank + 1) for rank in range(len(genres))]
+            links = []
+            for book_id in books:
+                for genre in set(rng.choices(genres, weights=genre_weights, k=rng.randint(1, 3))):
+                    links.append(Book.genre.through(book_id=book_id, genre_id=genre.pk))
+            self.bulk_create(Book.genre.through, links)
+
+            today = datetime.date.today()
+            statuses, status_weights = zip(*STATUSES)
+            copies = []
+            for book_id in books:
+                for _ in range(max(0, round(rng.gauss(options['copies_per_book'], 1)))):
+                    status = rng.choices(statuses, weights=status_weights)[0]
+                    on_loan = status == 'o'
+                    copies.append(BookInstance(
+                        book_id=book_id,
+                        imprint=f'{rng.choice(LAST_NAMES)} Press, {rng.randint(1950, today.year)}',
+                        status=status,
+                        # Empréstimos com devolução entre 3 semanas atrás (atrasados) e 3 semanas à frente:
+                        due_back=today + datetime.timedelta(days=rng.randint(-21, 21)) if on_loan else None,
+                        borrower_id=rng.choice(users) if on_loan and users else None,
+                    ))
+            self.bulk_create(BookInstance, copies)
+
+        # Os bulk_create não disparam sinais: atualiza os dados desnormalizados e o índice de busca.
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {num_books} books, {num_authors} authors, {len(copies)} copies and '
+            f"{options['users']} users."
+        ))
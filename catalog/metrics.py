@@ -0,0 +1,91 @@
+"""Métricas de desempenho por view, agregadas em memória e exportadas no formato texto do Prometheus.
+
+Os valores são por processo: com vários workers do gunicorn, cada scrape de /catalog/_metrics
+retorna as métricas do worker que atendeu a requisição (use a label 'instance' do Prometheus
+ou um scrape por worker para agregar).
+"""
+import threading
+from collections import defaultdict
+
+from locallibrary.db import pool
+
+# Limites (segundos) dos buckets do histograma de duração das requisições:
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = (
+    ('db_queries_total', 'Queries executadas no banco de dados.'),
+    ('db_duration_seconds_total', 'Tempo gasto em queries no banco de dados.'),
+    ('template_duration_seconds_total', 'Tempo gasto renderizando templates.'),
+    ('response_bytes_total', 'Tamanho das respostas (sem contar respostas em streaming).'),
+    ('duplicate_queries_total', 'Queries repetidas (mesmo SQL e parâmetros) dentro de uma requisição.'),
+)
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.counters = dict.fromkeys((name for name, _ in COUNTERS), 0)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(ViewMetrics)
+        self._collectors = []
+
+    def observe(self, view, duration, **counters):
+        with self._lock:
+            metrics = self._views[view]
+            metrics.requests += 1
+            metrics.duration_sum += duration
+            for index, limit in enumerate(DURATION_BUCKETS):
+                if duration <= limit:
+                    metrics.buckets[index] += 1
+            for name, value in counters.items():
+                metrics.counters[name] += value
+
+    def register_collector(self, collector):
+        """Registra uma função que retorna linhas extras (já no formato Prometheus) para a exportação."""
+        self._collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {view: (metrics.requests, metrics.duration_sum, list(metrics.buckets), dict(metrics.counters))
+                    for view, metrics in self._views.items()}
+
+    def render_prometheus(self):
+        snapshot = sorted(self.snapshot().items())
+        lines = [
+            '# HELP catalog_request_duration_seconds Duração das requisições por view.',
+            '# TYPE catalog_request_duration_seconds histogram',
+        ]
+        for view, (requests, duration_sum, buckets, _) in snapshot:
+            for limit, count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'catalog_request_duration_seconds_bucket{{view="{view}",le="{limit}"}} {count}')
+            lines.append(f'catalog_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {requests}')
+            lines.append(f'catalog_request_duration_seconds_sum{{view="{view}"}} {duration_sum:.6f}')
+            lines.append(f'catalog_request_duration_seconds_count{{view="{view}"}} {requests}')
+
+        for name, help_text in COUNTERS:
+            lines.append(f'# HELP catalog_{name} {help_text}')
+            lines.append(f'# TYPE catalog_{name} counter')
+            for view, (_, _, _, counters) in snapshot:
+                value = counters[name]
+                lines.append(f'catalog_{name}{{view="{view}"}} {value:.6f}' if isinstance(value, float)
+                             else f'catalog_{name}{{view="{view}"}} {value}')
+
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Métricas dos pools de conexões com o banco (DATABASE_POOL_MODE=pool).
+registry.register_collector(pool.render_prometheus)
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import routers
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# QueryRecorder da requisição atual. Uma ContextVar (e não um execute_wrapper instalado só nas conexões
+# da thread da requisição) para medir também as queries das threads do executor: o sync_to_async
+# copia o contexto para a thread em que a função roda.
+current_recorder = ContextVar('catalog_query_recorder', default=None)
+
+
+class QueryRecorder:
+    """execute_wrapper que mede o número, o tempo e as repetições das queries de uma requisição."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        # As queries paralelas das views assíncronas são registradas por várias threads ao mesmo tempo:
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.duration += duration
+                self.count += 1
+                self.statements[(sql, str(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper permanente de todas as conexões: repassa a query ao QueryRecorder da requisição."""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def instrument_connection(connection, **kwargs):
+    # Inserido no início da lista: connection.execute_wrapper() remove o último wrapper ao sair.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(instrument_connection, dispatch_uid='catalog.middleware.instrument_connection')
+
+
+class PerformanceMetricsMiddleware:
+    """Mede cada requisição (tempo total, queries, tempo de banco e de template, tamanho da resposta).
+
+    Os valores são enviados no cabeçalho Server-Timing e agregados por nome de URL em
+    catalog.metrics.registry, exportado em /catalog/_metrics. O tempo de template é medido para
+    views que retornam TemplateResponse (as class-based views e as views de leitura do catálogo).
+    Funciona nos modos síncrono e assíncrono (sob ASGI as views assíncronas não passam por uma
+    thread só por causa deste middleware), e conta as queries de todas as threads da requisição.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Faz o handler do Django tratar a instância como uma coroutine function (como o MiddlewareMixin).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        recorder, token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder, token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    def start(self, request):
+        # Conexões da thread atual que já estavam abertas antes de o sinal connection_created ser conectado:
+        for connection in connections.all():
+            instrument_connection(connection)
+        recorder = QueryRecorder()
+        request._template_duration = 0.0
+        return recorder, current_recorder.set(recorder), time.perf_counter()
+
+    def finish(self, request, response, recorder, start):
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+
+        if recorder.duplicates:
+            logger.warning('%s executed %d duplicate queries', request.path, recorder.duplicates)
+
+        registry.observe(
+            view,
+            duration,
+            db_queries_total=recorder.count,
+            db_duration_seconds_total=recorder.duration,
+            template_duration_seconds_total=request._template_duration,
+            response_bytes_total=size,
+            duplicate_queries_total=recorder.duplicates,
+        )
+
+        timings = [
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+            f'tpl;dur={request._template_duration * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ]
+        if recorder.duplicates:
+            timings.append(f'dup;desc="{recorder.duplicates} duplicate queries"')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        # Renderiza aqui (a renderização posterior do handler vira um no-op) para medir o tempo do template.
+        start = time.perf_counter()
+        response.render()
+        request._template_duration += time.perf_counter() - start
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Controla por requisição quais leituras podem ir para as réplicas (ver catalog/routers.py).
+
+    Views marcadas com replica_reads leem de uma réplica em GET/HEAD. Depois de uma gravação (ou de
+    qualquer POST/PUT/PATCH/DELETE) o cliente recebe um cookie que o mantém no banco principal por
+    DATABASE_REPLICA_PIN_SECONDS, para que veja as próprias alterações mesmo com atraso de replicação.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.get_replicas():
+            return self.get_response(request)
+
+        token = routers.begin_request(pinned=routers.PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            state = routers.current_state()
+            if (state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS')) and response.status_code < 500:
+                response.set_cookie(
+                    routers.PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10),
+                    secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+                )
+        finally:
+            routers.end_request(token)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = routers.current_state()
+        if state is not None and request.method in ('GET', 'HEAD') and routers.is_replica_view(view_func):
+            state.use_replica = True
@@ -0,0 +1,51 @@
+# Generated by Django 4.0.2 on 2026-10-18 01:38
+
+from django.db import migrations, models
+
+
+def populate_library_stats(apps, schema_editor):
+    """Cria a linha de estatísticas com as contagens atuais das tabelas."""
+    LibraryStats = apps.get_model('catalog', 'LibraryStats')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    status_counts = dict(
+        BookInstance.objects.order_by().values_list('status').annotate(total=models.Count('pk'))
+    )
+    LibraryStats.objects.create(
+        pk=1,
+        num_books=apps.get_model('catalog', 'Book').objects.count(),
+        num_authors=apps.get_model('catalog', 'Author').objects.count(),
+        num_genres=apps.get_model('catalog', 'Genre').objects.count(),
+        num_instances=sum(status_counts.values()),
+        num_instances_available=status_counts.get('a', 0),
+        num_instances_on_loan=status_counts.get('o', 0),
+        num_instances_reserved=status_counts.get('r', 0),
+        num_instances_maintenance=status_counts.get('m', 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_alter_bookinstance_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_books', models.IntegerField(default=0)),
+                ('num_authors', models.IntegerField(default=0)),
+                ('num_genres', models.IntegerField(default=0)),
+                ('num_instances', models.IntegerField(default=0)),
+                ('num_instances_available', models.IntegerField(default=0)),
+                ('num_instances_on_loan', models.IntegerField(default=0)),
+                ('num_instances_reserved', models.IntegerField(default=0)),
+                ('num_instances_maintenance', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'library stats',
+            },
+        ),
+        migrations.RunPython(populate_library_stats, migrations.RunPython.noop),
+    ]
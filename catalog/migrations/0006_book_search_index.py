@@ -0,0 +1,53 @@
+# Cria o índice de busca textual de livros usado por catalog/search.py.
+
+from django.db import migrations
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE catalog_book_fts USING fts5("
+    "title, summary, isbn, authors, genres, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO catalog_book_fts (rowid, title, summary, isbn, authors, genres) "
+    "SELECT b.id, b.title, b.summary, b.isbn, COALESCE(a.first_name || ' ' || a.last_name, ''), "
+    "COALESCE((SELECT group_concat(g.name, ' ') FROM catalog_book_genre bg "
+    "INNER JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '') "
+    "FROM catalog_book b LEFT OUTER JOIN catalog_author a ON a.id = b.author_id",
+]
+
+SQLITE_DROP = ['DROP TABLE IF EXISTS catalog_book_fts']
+
+POSTGRESQL_CREATE = [
+    "CREATE TABLE catalog_book_search ("
+    "book_id bigint PRIMARY KEY REFERENCES catalog_book (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX catalog_book_search_document_gin ON catalog_book_search USING gin (document)",
+    "INSERT INTO catalog_book_search (book_id, document) "
+    "SELECT b.id, "
+    "setweight(to_tsvector('simple', b.title || ' ' || b.isbn), 'A') || "
+    "setweight(to_tsvector('simple', COALESCE(a.first_name || ' ' || a.last_name, '')), 'B') || "
+    "setweight(to_tsvector('simple', COALESCE((SELECT string_agg(g.name, ' ') FROM catalog_book_genre bg "
+    "INNER JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '')), 'C') || "
+    "setweight(to_tsvector('simple', b.summary), 'D') "
+    "FROM catalog_book b LEFT OUTER JOIN catalog_author a ON a.id = b.author_id",
+]
+
+POSTGRESQL_DROP = ['DROP TABLE IF EXISTS catalog_book_search']
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_librarystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}),
+            run_for_vendor({'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.0.2 on 2026-10-18 01:53
+
+from django.db import migrations, models
+
+
+def populate_copy_counters(apps, schema_editor):
+    """Calcula os contadores de cópias de cada livro a partir das cópias já cadastradas."""
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    counters = (
+        BookInstance.objects.filter(book__isnull=False).order_by().values('book').annotate(
+            copies_total=models.Count('pk'),
+            copies_available=models.Count('pk', filter=models.Q(status='a')),
+            copies_on_loan=models.Count('pk', filter=models.Q(status='o')),
+            copies_reserved=models.Count('pk', filter=models.Q(status='r')),
+            copies_maintenance=models.Count('pk', filter=models.Q(status='m')),
+            next_due_back=models.Min('due_back', filter=models.Q(status='o')),
+        )
+    )
+    for row in counters:
+        Book.objects.filter(pk=row.pop('book')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='copies_available',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_maintenance',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_on_loan',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_reserved',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='copies_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='next_due_back',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_copy_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.2 on 2026-10-18 02:14
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0011_bookinstance_due_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookInstanceAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('return', 'Marked returned'), ('extend', 'Due date extended'), ('maintenance', 'Sent to maintenance'), ('imprint', 'Imprint reassigned')], max_length=20)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('book_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audit_records', to='catalog.bookinstance')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bookinstanceaudit',
+            index=models.Index(fields=['book_instance', 'created_at'], name='bookinst_audit_copy_idx'),
+        ),
+    ]
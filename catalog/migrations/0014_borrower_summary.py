@@ -0,0 +1,54 @@
+# Generated by Django 4.0.2 on 2026-10-18 02:21
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_borrower_summaries(apps, schema_editor):
+    """Cria os resumos dos usuários com empréstimos atuais (sem histórico, lifetime_loans começa neles)."""
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    BorrowerSummary = apps.get_model('catalog', 'BorrowerSummary')
+    today = datetime.date.today()
+    loans = (
+        BookInstance.objects.filter(status='o', borrower__isnull=False).order_by().values('borrower').annotate(
+            active_loans=models.Count('pk'),
+            overdue_loans=models.Count('pk', filter=models.Q(due_back__lt=today)),
+            next_due_back=models.Min('due_back'),
+        )
+    )
+    BorrowerSummary.objects.bulk_create([
+        BorrowerSummary(
+            user_id=row['borrower'], active_loans=row['active_loans'], overdue_loans=row['overdue_loans'],
+            next_due_back=row['next_due_back'], lifetime_loans=row['active_loans'], computed_on=today,
+        )
+        for row in loans.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('catalog', '0013_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowerSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('overdue_loans', models.IntegerField(default=0)),
+                ('next_due_back', models.DateField(blank=True, null=True)),
+                ('lifetime_loans', models.IntegerField(default=0, help_text='Empréstimos já feitos pelo usuário')),
+                ('computed_on', models.DateField(default=datetime.date.today)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'borrower summaries',
+            },
+        ),
+        migrations.RunPython(populate_borrower_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.0.2 on 2026-10-18 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0014_borrower_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('checkout', 'Checkout'), ('return', 'Return'), ('renew', 'Renewal')], max_length=10)),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('loaned_at', models.DateTimeField(blank=True, help_text='Início do empréstimo', null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LoanRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField(help_text='Dia, ou primeiro dia do mês')),
+                ('dimension', models.CharField(choices=[('book', 'Book'), ('author', 'Author'), ('genre', 'Genre'), ('language', 'Language'), ('all', 'Library')], max_length=8)),
+                ('key', models.BigIntegerField(help_text='Id do livro, autor, gênero ou língua')),
+                ('loans', models.IntegerField(default=0)),
+                ('borrower_days', models.IntegerField(default=0, help_text='Usuários distintos de cada dia, somados nos meses (não são usuários únicos)')),
+                ('renewals', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+                ('overdue_returns', models.IntegerField(default=0)),
+                ('completed_loans', models.IntegerField(default=0, help_text='Devoluções com o início do empréstimo conhecido')),
+                ('loan_days', models.IntegerField(default=0, help_text='Duração somada dos empréstimos completos (dias)')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='loanrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'dimension', 'start', 'key'), name='loanrollup_unique'),
+        ),
+        migrations.AddField(
+            model_name='loanevent',
+            name='book',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loan_events', to='catalog.book'),
+        ),
+        migrations.AddField(
+            model_name='loanevent',
+            name='book_instance',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loan_events', to='catalog.bookinstance'),
+        ),
+        migrations.AddField(
+            model_name='loanevent',
+            name='borrower',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loan_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['created_at', 'id'], name='loanevent_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['book_instance', 'kind', 'created_at'], name='loanevent_copy_kind_idx'),
+        ),
+    ]
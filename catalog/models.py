@@ -1,4 +1,7 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
 from django.urls import reverse  # Usado para gerar URLs revertendo os padrões de URL.
 from django.contrib.auth.models import User
 from datetime import date
@@ -7,6 +10,16 @@ import uuid  # Necessário para gerar instâncias únicas de livros (id em BookI
 # Create your models here.
 
 
+def detail_url(viewname, field='pk'):
+    """Expressão que monta no banco a URL reverse(viewname, args=[<field>]) de cada linha (chave inteira).
+
+    Usada como anotação nas listas, em vez de um get_absolute_url()/{% url %} (um reverse()) por linha no template.
+    """
+    placeholder = '2147483647'
+    prefix, _, suffix = reverse(viewname, args=[placeholder]).partition(placeholder)
+    return Concat(models.Value(prefix), Cast(field, models.CharField()), models.Value(suffix))
+
+
 class Genre(models.Model):
     """Modelo representando um gênero de livro."""
     name = models.CharField(max_length=200, help_text='Insira um gênero de livro (ex: Ficção Científica)')
@@ -45,14 +58,91 @@ class Book(models.Model):
     genre = models.ManyToManyField(Genre, help_text='Selecione um gênero para este livro')
     
     language = models.ForeignKey('Language', on_delete=models.SET_NULL, null=True)
+
+    # Contadores desnormalizados das cópias (BookInstance) do livro, mantidos pelos handlers de
+    # 'catalog/signals.py' via refresh_copy_counters() e reconstruídos pelo comando reconcile_counters:
+    copies_total = models.IntegerField(default=0, editable=False)
+    copies_available = models.IntegerField(default=0, editable=False)
+    copies_on_loan = models.IntegerField(default=0, editable=False)
+    copies_reserved = models.IntegerField(default=0, editable=False)
+    copies_maintenance = models.IntegerField(default=0, editable=False)
+    next_due_back = models.DateField(null=True, blank=True, editable=False)
+
+    # Data da última alteração do livro ou do que a página de detalhes mostra dele (cópias, gêneros,
+    # língua), usada nas respostas condicionais (ETag/Last-Modified) das páginas do catálogo:
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Campo de contagem correspondente a cada valor de BookInstance.status:
+    COPY_STATUS_FIELDS = {
+        'm': 'copies_maintenance',
+        'o': 'copies_on_loan',
+        'a': 'copies_available',
+        'r': 'copies_reserved',
+    }
+    COPY_COUNTER_FIELDS = ('copies_total', *COPY_STATUS_FIELDS.values(), 'next_due_back')
+
+    class Meta:
+        indexes = [
+            # Ordenação da BookListView (e da paginação por keyset):
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['isbn'], name='book_isbn_unique'),
+        ]
     
     def __str__(self):
         """String para representar o objeto Model."""
         return self.title
     
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        # Um save() de um livro já existente (formulários, admin) não grava os contadores de cópias,
+        # que podem ter mudado desde que o objeto foi carregado:
+        if update_fields is None and not force_insert and not self._state.adding:
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COPY_COUNTER_FIELDS
+            ]
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
     def get_absolute_url(self):
         """Retorna a URL para acessar um registro de detalhes para este livro"""
         return reverse('book-detail', args=[str(self.id)])
+
+    @classmethod
+    def refresh_copy_counters(cls, book_ids):
+        """Recalcula os contadores de cópias dos livros informados a partir da tabela de BookInstance.
+
+        As linhas dos livros são bloqueadas (SELECT ... FOR UPDATE) antes da contagem, de modo que
+        recálculos concorrentes do mesmo livro são serializados e o último sempre vê o estado final.
+        """
+        book_ids = {pk for pk in book_ids if pk is not None}
+        if not book_ids:
+            return
+
+        aggregates = {
+            'copies_total': models.Count('pk'),
+            'next_due_back': models.Min('due_back', filter=models.Q(status='o')),
+        }
+        for status, field_name in cls.COPY_STATUS_FIELDS.items():
+            aggregates[field_name] = models.Count('pk', filter=models.Q(status=status))
+
+        with transaction.atomic():
+            locked_ids = list(
+                cls.objects.select_for_update().filter(pk__in=book_ids).order_by('pk').values_list('pk', flat=True)
+            )
+            counters = {
+                row.pop('book'): row
+                for row in BookInstance.objects.filter(book__in=locked_ids).order_by()
+                .values('book').annotate(**aggregates)
+            }
+            now = timezone.now()
+            for pk, values in counters.items():
+                cls.objects.filter(pk=pk).update(updated_at=now, **values)
+
+            # Livros sem nenhuma cópia são zerados em um único UPDATE:
+            empty = dict.fromkeys(aggregates, 0)
+            empty['next_due_back'] = None
+            cls.objects.filter(pk__in=[pk for pk in locked_ids if pk not in counters]).update(updated_at=now, **empty)
     
     def display_genre(self):
         """Cria uma string para o gênero. Isso é necessário para mostrar o gênero no model localizado em Admin.py"""
@@ -61,6 +151,35 @@ class Book(models.Model):
     display_genre.short_description = 'Genre'
     
 
+class BookInstanceQuerySet(models.QuerySet):
+    """Consultas de empréstimos atrasados feitas no banco (sem carregar e testar cada cópia em Python)."""
+
+    def overdue(self, today=None):
+        """Cópias emprestadas com a data de devolução já vencida (usa o índice parcial de empréstimos)."""
+        return self.filter(status__exact='o', due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        """Anota 'overdue' (booleano calculado no banco), usado por BookInstance.is_overdue."""
+        return self.annotate(overdue=models.ExpressionWrapper(
+            models.Q(due_back__lt=today or date.today()), output_field=models.BooleanField(),
+        ))
+
+    def with_display(self, today=None):
+        """Anota o que os templates exibem de cada cópia: 'overdue', 'status_label' (o mesmo que
+        get_status_display()), 'status_css' (classe CSS do status) e 'book_url' (URL do livro)."""
+        status_css = [
+            models.When(status=status, then=models.Value(css)) for status, css in BookInstance.STATUS_CSS.items()
+        ]
+        return self.with_overdue(today).annotate(
+            status_label=models.Case(
+                *[models.When(status=status, then=models.Value(label)) for status, label in BookInstance.LOAN_STATUS],
+                default=models.Value(''),
+            ),
+            status_css=models.Case(*status_css, default=models.Value('text-warning')),
+            book_url=detail_url('book-detail', 'book_id'),
+        )
+
+
 class BookInstance(models.Model):
     """Modelo representando uma cópia específica de um livro (ex: que pode ser pego emprestado da biblioteca)."""
     id = models.UUIDField(
@@ -79,6 +198,8 @@ class BookInstance(models.Model):
         ('a', 'Available'),
         ('r', 'Reserved'),
     )
+    # Classe CSS de cada status nas páginas do catálogo ('text-warning' para os demais):
+    STATUS_CSS = {'a': 'text-success', 'm': 'text-danger'}
 
     status = models.CharField(
         max_length=1,
@@ -87,10 +208,23 @@ class BookInstance(models.Model):
         default='m',
         help_text='Disponibilidade do livro',
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookInstanceQuerySet.as_manager()
 
     class Meta:
         ordering = ['due_back']
         permissions = (('can_mark_returned', 'Set book as returned'),)
+        indexes = [
+            # Cópias emprestadas por data de devolução (OnLoanBooksListView), índice parcial:
+            models.Index(fields=['due_back', 'id'], condition=models.Q(status='o'), name='bookinst_on_loan_due_idx'),
+            # Empréstimos de um usuário (LoanedBooksByUserListView):
+            models.Index(fields=['borrower', 'status', 'due_back', 'id'], name='bookinst_borrower_status_idx'),
+            # Filtros por status/data de devolução do admin:
+            models.Index(fields=['status', 'due_back', 'id'], name='bookinst_status_due_idx'),
+            # Changelist do admin sem filtros (ordenado por data de devolução):
+            models.Index(fields=['due_back', 'id'], name='bookinst_due_idx'),
+        ]
 
     def __str__(self):
         """String para rebresentar o objeto Model"""
@@ -98,21 +232,138 @@ class BookInstance(models.Model):
 
     @property
     def is_overdue(self):
-        """Verifica se uma instância está atrasada"""
+        """Verifica se uma instância está atrasada (usa a anotação de with_overdue(), quando presente)"""
+        if 'overdue' in self.__dict__:
+            return bool(self.overdue)
         if self.due_back and date.today() > self.due_back:
             return True
         return False
     
     
+class OverdueNotice(models.Model):
+    """Registro de um aviso de atraso enviado ao usuário (um por empréstimo e data de devolução).
+
+    A restrição única garante que o comando process_overdue possa ser reexecutado sem enviar
+    o mesmo aviso duas vezes; uma renovação muda a data de devolução e permite um novo aviso.
+    """
+    book_instance = models.ForeignKey('BookInstance', on_delete=models.CASCADE, related_name='overdue_notices')
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='overdue_notices')
+    due_back = models.DateField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book_instance', 'due_back'], name='overdue_notice_unique'),
+        ]
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.book_instance_id} ({self.due_back})'
+
+
+class Hold(models.Model):
+    """Pedido de reserva de um livro por um usuário: a fila de espera pelas cópias do livro.
+
+    A fila de cada livro é ordenada por prioridade (maior primeiro) e depois pela ordem de chegada
+    (QUEUE_ORDER, repetida em Meta). O índice parcial hold_queue_idx cobre exatamente os pedidos em
+    espera nessa ordem, então o primeiro da fila é encontrado com uma busca no índice, qualquer que
+    seja o tamanho da fila.
+    Quando uma cópia é separada para o usuário ('ready'), ela fica reservada até expires_at.
+    """
+    STATUS = (
+        ('w', 'Waiting'),
+        ('r', 'Ready for pickup'),
+        ('f', 'Fulfilled'),
+        ('c', 'Cancelled'),
+        ('e', 'Expired'),
+    )
+    ACTIVE_STATUSES = ('w', 'r')
+    QUEUE_ORDER = ('-priority', 'created_at', 'id')
+
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='holds')
+    patron = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=1, choices=STATUS, default='w')
+    priority = models.SmallIntegerField(default=0, help_text='Pedidos com prioridade maior são atendidos antes')
+    created_at = models.DateTimeField(default=timezone.now)
+    book_instance = models.ForeignKey(
+        'BookInstance', on_delete=models.SET_NULL, null=True, blank=True, related_name='holds',
+        help_text='Cópia separada para o usuário',
+    )
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['book', '-priority', 'created_at', 'id']
+        indexes = [
+            # Primeiro da fila de um livro (apenas os pedidos em espera):
+            models.Index(
+                fields=['book', '-priority', 'created_at', 'id'], condition=models.Q(status='w'), name='hold_queue_idx',
+            ),
+            # Reservas separadas e não retiradas, por prazo (comando expire_holds):
+            models.Index(fields=['expires_at', 'id'], condition=models.Q(status='r'), name='hold_ready_expiry_idx'),
+            # Pedidos de um usuário:
+            models.Index(fields=['patron', 'status'], name='hold_patron_status_idx'),
+        ]
+        constraints = [
+            # Um pedido ativo por usuário e livro:
+            models.UniqueConstraint(
+                fields=['book', 'patron'], condition=models.Q(status__in=('w', 'r')), name='hold_active_unique',
+            ),
+        ]
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.book_id} ({self.patron_id}, {self.get_status_display()})'
+
+
+class BookInstanceAudit(models.Model):
+    """Registro de uma alteração feita por uma ação em massa do admin em uma cópia.
+
+    As ações gravam as cópias com um único UPDATE (sem save() nem sinais por cópia), então é este
+    registro, criado com bulk_create, que guarda quem alterou o quê: 'changes' mapeia cada campo
+    alterado para [valor anterior, valor novo].
+    """
+    ACTIONS = (
+        ('return', 'Marked returned'),
+        ('extend', 'Due date extended'),
+        ('maintenance', 'Sent to maintenance'),
+        ('imprint', 'Imprint reassigned'),
+    )
+
+    book_instance = models.ForeignKey('BookInstance', on_delete=models.CASCADE, related_name='audit_records')
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    changes = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['book_instance', 'created_at'], name='bookinst_audit_copy_idx'),
+        ]
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.book_instance_id}: {self.get_action_display()}'
+
+
 class Author(models.Model):
     """Modelo representando um autor."""
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     date_of_birth = models.DateField(null=True, blank=True)
     date_of_death = models.DateField('died', null=True, blank=True)
+
+    # Alterada também quando um livro do autor muda (ver catalog/signals.py), de modo que vale
+    # como data de alteração da página de detalhes do autor:
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['last_name', 'first_name', 'id'], name='author_name_idx'),
+            # MAX(updated_at) da lista de autores (respostas condicionais):
+            models.Index(fields=['updated_at'], name='author_updated_idx'),
+        ]
     
     def get_absolute_url(self):
         """Retorna a URL para acessar uma instância de autor em particular."""
@@ -122,3 +373,278 @@ class Author(models.Model):
         """String para representar o objeto Model."""
         return f'{self.last_name}, {self.first_name}'
 
+
+
+class LibraryStats(models.Model):
+    """Modelo desnormalizado com as contagens exibidas na home page.
+
+    Existe uma única linha (pk=1), mantida de forma incremental pelos handlers de
+    'catalog/signals.py', de modo que a home page lê todas as contagens em uma só query.
+    """
+    SINGLETON_PK = 1
+
+    # Campo de contagem correspondente a cada valor de BookInstance.status:
+    STATUS_FIELDS = {
+        'm': 'num_instances_maintenance',
+        'o': 'num_instances_on_loan',
+        'a': 'num_instances_available',
+        'r': 'num_instances_reserved',
+    }
+
+    num_books = models.IntegerField(default=0)
+    num_authors = models.IntegerField(default=0)
+    num_genres = models.IntegerField(default=0)
+    num_instances = models.IntegerField(default=0)
+    num_instances_available = models.IntegerField(default=0)
+    num_instances_on_loan = models.IntegerField(default=0)
+    num_instances_reserved = models.IntegerField(default=0)
+    num_instances_maintenance = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'library stats'
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.num_books} books, {self.num_instances} copies'
+
+    @classmethod
+    def load(cls):
+        """Retorna a linha de estatísticas, recalculando-a caso ainda não exista."""
+        try:
+            return cls.objects.get(pk=cls.SINGLETON_PK)
+        except cls.DoesNotExist:
+            return cls.rebuild()
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula todas as contagens a partir das tabelas (usado na reconciliação e após cargas em massa)."""
+        status_counts = dict(
+            BookInstance.objects.order_by().values_list('status').annotate(total=models.Count('pk'))
+        )
+        defaults = {
+            'num_books': Book.objects.count(),
+            'num_authors': Author.objects.count(),
+            'num_genres': Genre.objects.count(),
+            'num_instances': sum(status_counts.values()),
+        }
+        for status, field_name in cls.STATUS_FIELDS.items():
+            defaults[field_name] = status_counts.get(status, 0)
+
+        stats, _ = cls.objects.update_or_create(pk=cls.SINGLETON_PK, defaults=defaults)
+        return stats
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """Aplica incrementos/decrementos atômicos (UPDATE ... SET campo = campo + n) às contagens."""
+        changes = {field_name: models.F(field_name) + delta for field_name, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(pk=cls.SINGLETON_PK).update(**changes)
+
+
+class BorrowerSummary(models.Model):
+    """Resumo desnormalizado dos empréstimos de um usuário (página 'My Borrowed', API e menu lateral).
+
+    Mantido pelos handlers de 'catalog/signals.py' e pelas operações em massa de 'catalog/circulation.py',
+    que chamam refresh() para os usuários afetados. O número de empréstimos atrasados depende do dia:
+    overdue_loans vale para computed_on, e for_user() o recalcula na primeira leitura de um outro dia
+    apenas quando o usuário tem um empréstimo vencido (next_due_back no passado).
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='loan_summary')
+    active_loans = models.IntegerField(default=0)
+    overdue_loans = models.IntegerField(default=0)
+    next_due_back = models.DateField(null=True, blank=True)
+    lifetime_loans = models.IntegerField(default=0, help_text='Empréstimos já feitos pelo usuário')
+    computed_on = models.DateField(default=date.today)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'borrower summaries'
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.user_id}: {self.active_loans} loans, {self.overdue_loans} overdue'
+
+    @classmethod
+    def for_user(cls, user, today=None):
+        """Retorna o resumo do usuário (uma busca pela primary key), recalculando-o se estiver desatualizado."""
+        today = today or date.today()
+        summary = cls.objects.filter(pk=user.pk).first()
+        if summary is None:
+            # Usuário que nunca pegou um livro emprestado (o resumo é criado no primeiro empréstimo):
+            return cls(user_id=user.pk, computed_on=today)
+        if summary.computed_on != today and summary.next_due_back is not None and summary.next_due_back < today:
+            cls.refresh([user.pk], today=today)
+            summary = cls.objects.get(pk=user.pk)
+        return summary
+
+    @classmethod
+    def for_request(cls, request):
+        """Resumo do usuário da requisição (None para anônimos), lido uma única vez por requisição."""
+        if not request.user.is_authenticated:
+            return None
+        if not hasattr(request, '_loan_summary'):
+            request._loan_summary = cls.for_user(request.user)
+        return request._loan_summary
+
+    def as_dict(self):
+        """Valores do resumo para a API JSON."""
+        return {
+            'active_loans': self.active_loans,
+            'overdue_loans': self.overdue_loans,
+            'next_due_back': self.next_due_back,
+            'lifetime_loans': self.lifetime_loans,
+        }
+
+    @classmethod
+    def refresh(cls, user_ids, new_loans=None, today=None):
+        """Recalcula os resumos dos usuários informados a partir dos empréstimos atuais (status 'o').
+
+        'new_loans' ({id do usuário: n}) soma os empréstimos feitos agora a lifetime_loans, que não pode
+        ser recalculado a partir das cópias. Como em Book.refresh_copy_counters, as linhas dos resumos
+        são bloqueadas antes da contagem.
+        """
+        user_ids = {pk for pk in user_ids if pk is not None}
+        if not user_ids:
+            return
+        today = today or date.today()
+        new_loans = new_loans or {}
+
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(user_id=pk) for pk in user_ids], ignore_conflicts=True)
+            locked_ids = list(
+                cls.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True)
+            )
+            # Uma busca no índice bookinst_borrower_status_idx por usuário:
+            loans = {
+                row.pop('borrower'): row
+                for row in BookInstance.objects.filter(borrower__in=locked_ids, status='o').order_by()
+                .values('borrower').annotate(
+                    active_loans=models.Count('pk'),
+                    overdue_loans=models.Count('pk', filter=models.Q(due_back__lt=today)),
+                    next_due_back=models.Min('due_back'),
+                )
+            }
+            now = timezone.now()
+            empty = {'active_loans': 0, 'overdue_loans': 0, 'next_due_back': None}
+            for pk in locked_ids:
+                if pk in loans or new_loans.get(pk):
+                    cls.objects.filter(pk=pk).update(
+                        computed_on=today, updated_at=now, **loans.get(pk, empty),
+                        lifetime_loans=models.F('lifetime_loans') + new_loans.get(pk, 0),
+                    )
+            # Usuários sem empréstimos e sem empréstimos novos são zerados em um único UPDATE:
+            cls.objects.filter(pk__in=[pk for pk in locked_ids if pk not in loans and not new_loans.get(pk)]).update(
+                computed_on=today, updated_at=now, **empty,
+            )
+
+
+class LoanEvent(models.Model):
+    """Histórico dos empréstimos (apenas inserções): um evento por empréstimo, devolução e renovação.
+
+    Gravado por record(), chamada pelos handlers de 'catalog/signals.py' e pelas operações em massa de
+    'catalog/circulation.py' (com bulk_create). Os eventos de devolução e renovação guardam o início do
+    empréstimo (loaned_at), então a duração de um empréstimo não exige parear eventos nos relatórios.
+    """
+    KINDS = (
+        ('checkout', 'Checkout'),
+        ('return', 'Return'),
+        ('renew', 'Renewal'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    book_instance = models.ForeignKey('BookInstance', on_delete=models.SET_NULL, null=True, related_name='loan_events')
+    book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True, related_name='loan_events')
+    borrower = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='loan_events')
+    due_back = models.DateField(null=True, blank=True)
+    loaned_at = models.DateTimeField(null=True, blank=True, help_text='Início do empréstimo')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Eventos de um dia (comando rollup_loans):
+            models.Index(fields=['created_at', 'id'], name='loanevent_created_idx'),
+            # Último empréstimo de uma cópia (início do empréstimo na devolução):
+            models.Index(fields=['book_instance', 'kind', 'created_at'], name='loanevent_copy_kind_idx'),
+        ]
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.get_kind_display()} of {self.book_instance_id} ({self.created_at:%Y-%m-%d})'
+
+    @classmethod
+    def record(cls, transitions, now=None):
+        """Grava os eventos das mudanças de cópias, dadas como (id da cópia, id do livro, antes, depois), em
+        que antes/depois são (status, id do usuário, data de devolução). Retorna os eventos gravados.
+        """
+        now = now or timezone.now()
+        events = []
+        for copy_id, book_id, old, new in transitions:
+            (old_status, old_borrower_id, old_due_back), (status, borrower_id, due_back) = old, new
+            common = {'book_instance_id': copy_id, 'book_id': book_id, 'created_at': now}
+            same_loan = old_status == status == 'o' and old_borrower_id == borrower_id
+            if old_status == 'o' and not same_loan:
+                events.append(cls(kind='return', borrower_id=old_borrower_id, due_back=old_due_back, **common))
+            if status == 'o' and not same_loan:
+                events.append(cls(kind='checkout', borrower_id=borrower_id, due_back=due_back, loaned_at=now, **common))
+            elif same_loan and old_due_back != due_back:
+                events.append(cls(kind='renew', borrower_id=borrower_id, due_back=due_back, **common))
+        if not events:
+            return []
+
+        # Início dos empréstimos que terminam ou são renovados (o último checkout de cada cópia):
+        open_ids = {event.book_instance_id for event in events if event.kind != 'checkout'}
+        if open_ids:
+            starts = dict(
+                cls.objects.filter(kind='checkout', book_instance__in=open_ids).order_by()
+                .values_list('book_instance').annotate(start=models.Max('created_at'))
+            )
+            for event in events:
+                if event.kind != 'checkout':
+                    event.loaned_at = starts.get(event.book_instance_id)
+        return cls.objects.bulk_create(events)
+
+
+class LoanRollup(models.Model):
+    """Totais de circulação pré-agregados de um dia ou mês por livro, autor, gênero ou língua.
+
+    Calculados a partir de LoanEvent pelo comando rollup_loans ('catalog/analytics.py'); o relatório de
+    circulação lê apenas estas linhas. 'borrower_days' conta os usuários distintos de cada dia, e as linhas
+    mensais (e os relatórios de vários dias) somam as diárias: um usuário que pega livros em dois dias conta
+    duas vezes. As linhas da dimensão TOTAL (chave 0) somam a biblioteca inteira, com cada usuário contado
+    uma vez por dia mesmo que pegue vários livros.
+    """
+    PERIODS = (
+        ('day', 'Day'),
+        ('month', 'Month'),
+    )
+    DIMENSIONS = (
+        ('book', 'Book'),
+        ('author', 'Author'),
+        ('genre', 'Genre'),
+        ('language', 'Language'),
+    )
+    TOTAL = 'all'
+
+    period = models.CharField(max_length=5, choices=PERIODS)
+    start = models.DateField(help_text='Dia, ou primeiro dia do mês')
+    dimension = models.CharField(max_length=8, choices=DIMENSIONS + ((TOTAL, 'Library'),))
+    key = models.BigIntegerField(help_text='Id do livro, autor, gênero ou língua')
+    loans = models.IntegerField(default=0)
+    borrower_days = models.IntegerField(
+        default=0, help_text='Usuários distintos de cada dia, somados nos meses (não são usuários únicos)',
+    )
+    renewals = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+    overdue_returns = models.IntegerField(default=0)
+    completed_loans = models.IntegerField(default=0, help_text='Devoluções com o início do empréstimo conhecido')
+    loan_days = models.IntegerField(default=0, help_text='Duração somada dos empréstimos completos (dias)')
+
+    class Meta:
+        constraints = [
+            # Também cobre a leitura do relatório (período, dimensão e intervalo de datas):
+            models.UniqueConstraint(fields=['period', 'dimension', 'start', 'key'], name='loanrollup_unique'),
+        ]
+
+    def __str__(self):
+        """String para representar o objeto Model."""
+        return f'{self.dimension} {self.key} ({self.period} {self.start})'
@@ -0,0 +1,205 @@
+"""Paginação por keyset (seek/cursor) para as list views do catálogo.
+
+Ao contrário do Paginator do Django, não executa COUNT(*) nem OFFSET: cada página é
+buscada com um filtro "depois/antes da última linha vista" sobre a ordenação da view,
+de modo que a página 10.000 custa o mesmo que a primeira.
+
+Para o admin, que precisa de números de página, EstimatedCountPaginator troca o COUNT(*)
+exato das tabelas grandes por uma estimativa do banco.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    """Cursor que não pôde ser decodificado para a ordenação do paginador."""
+
+
+class KeysetPage:
+    """Uma página de resultados e os cursores (opacos) das páginas vizinhas."""
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Pagina um queryset pelos campos de 'ordering' (todos ascendentes, NULLs por último).
+
+    O último campo da ordenação deve ser único (normalmente a primary key) para servir de
+    desempate entre linhas com os mesmos valores nos demais campos.
+    """
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [queryset.model._meta.get_field(name) for name in self.ordering]
+
+    def encode_cursor(self, direction, obj):
+        values = [getattr(obj, field.attname) for field in self.fields]
+        payload = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in (self.NEXT, self.PREVIOUS) or len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return direction, [
+                None if value is None else field.to_python(value) for field, value in zip(self.fields, values)
+            ]
+        except Exception as error:
+            raise InvalidCursor(cursor) from error
+
+    def _seek_filter(self, values, after):
+        """Monta o filtro (a > x) OR (a = x AND b > y) OR ... respeitando NULLs por último."""
+        condition = Q()
+        terms = []
+        for field, value in zip(self.fields, values):
+            name = field.name
+            if after:
+                # Nenhum valor vem depois de NULL; NULL vem depois de qualquer valor.
+                beyond = None if value is None else Q(**{f'{name}__gt': value})
+                if value is not None and field.null:
+                    beyond |= Q(**{f'{name}__isnull': True})
+            else:
+                beyond = Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__lt': value})
+            if beyond is not None:
+                terms.append(condition & beyond)
+            condition &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+        seek = Q()
+        for term in terms:
+            seek |= term
+        return seek if terms else Q(pk__in=[])
+
+    def page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor) if cursor else (self.NEXT, None)
+        forward = direction == self.NEXT
+
+        if forward:
+            order_by = [F(name).asc(nulls_last=True) for name in self.ordering]
+        else:
+            order_by = [F(name).desc(nulls_first=True) for name in self.ordering]
+
+        queryset = self.queryset.order_by(*order_by)
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, after=forward))
+
+        # Busca uma linha a mais apenas para saber se existe outra página nessa direção:
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else True
+        has_previous = values is not None if forward else has_more
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(self.NEXT, rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(self.PREVIOUS, rows[0]) if rows and has_previous else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """Mixin para ListView que ativa a paginação por keyset.
+
+    É opcional: vale para todas as requisições com CATALOG_KEYSET_PAGINATION = True, ou
+    por requisição quando o parâmetro 'cursor' está presente (vazio para a primeira página).
+    Sem ele, a view continua usando o Paginator padrão do Django.
+    """
+    keyset_ordering = None
+    cursor_kwarg = 'cursor'
+
+    def use_keyset_pagination(self):
+        return getattr(settings, 'CATALOG_KEYSET_PAGINATION', False) or self.cursor_kwarg in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg) or None)
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+def estimated_row_count(queryset):
+    """Número aproximado de linhas da tabela do queryset, das estatísticas do banco (None se indisponível).
+
+    PostgreSQL: pg_class.reltuples (atualizado pelo autovacuum/ANALYZE); SQLite: sqlite_stat1 (após ANALYZE).
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT CAST(stat AS integer) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:  # ex: sqlite_stat1 ainda não existe (ANALYZE nunca executado)
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator que evita o COUNT(*) exato em tabelas grandes (changelists do admin).
+
+    Sem filtros, usa a estimativa do banco quando ela passa de estimate_threshold linhas. Com filtros,
+    conta no máximo max_count linhas (COUNT sobre uma subquery com LIMIT): além disso as páginas
+    seguintes não são listadas, e o filtro deve ser refinado.
+    """
+    estimate_threshold = 100_000
+    max_count = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return queryset.order_by()[:self.max_count].count()
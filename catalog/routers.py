@@ -0,0 +1,90 @@
+"""Roteamento das leituras do catálogo para réplicas do banco de dados.
+
+As réplicas são configuradas em DATABASE_REPLICAS (ver settings.py). Apenas as views marcadas
+com replica_reads (páginas de leitura do catálogo) leem de uma réplica, e somente em GET/HEAD;
+todo o resto, e qualquer gravação, usa o banco principal ('default').
+
+O estado de cada requisição é mantido pelo ReplicaRoutingMiddleware (catalog/middleware.py):
+depois de uma gravação a requisição passa a ler do principal, e o cliente recebe um cookie
+que o mantém no principal por alguns segundos (ler as próprias gravações apesar do atraso
+de replicação das réplicas).
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary'
+
+_routing_state = ContextVar('catalog_routing_state', default=None)
+
+
+class RoutingState:
+    """Estado de roteamento de uma requisição."""
+
+    def __init__(self, pinned=False):
+        self.use_replica = False
+        self.pinned = pinned  # o cliente gravou algo há pouco (cookie PIN_COOKIE)
+        self.wrote = False  # a requisição atual já gravou algo
+
+
+def replica_reads(view):
+    """Marca uma view (função ou class-based view) cujas leituras podem ser servidas por uma réplica."""
+    view.replica_reads = True
+    return view
+
+
+def is_replica_view(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_func, 'replica_reads', False) or getattr(view_class, 'replica_reads', False)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def begin_request(pinned=False):
+    """Inicia o estado de roteamento da requisição; retorna o token para end_request()."""
+    return _routing_state.set(RoutingState(pinned=pinned))
+
+
+def end_request(token):
+    _routing_state.reset(token)
+
+
+def current_state():
+    return _routing_state.get()
+
+
+def reading_from_replica():
+    """Indica se as leituras da requisição atual vão para uma réplica (que pode estar atrasada)."""
+    state = _routing_state.get()
+    return bool(state is not None and get_replicas() and state.use_replica and not state.pinned and not state.wrote)
+
+
+class ReplicaRouter:
+    """Router que envia as leituras das views de catálogo para uma réplica aleatória."""
+
+    def db_for_read(self, model, **hints):
+        if not reading_from_replica():
+            return None
+        return random.choice(get_replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # As réplicas recebem o esquema (e os dados) do principal pela replicação.
+        if db in get_replicas():
+            return False
+        return None
@@ -0,0 +1,172 @@
+"""Busca textual de livros por meio de um índice mantido pelos sinais do catálogo.
+
+Cada livro tem um documento no índice com título, ISBN, nomes dos autores, gêneros e
+resumo. O índice é uma tabela auxiliar criada pela migração 0006:
+
+- PostgreSQL: 'catalog_book_search' com uma coluna tsvector (pesos A-D) e índice GIN;
+- SQLite: a tabela virtual FTS5 'catalog_book_fts', com ranking bm25.
+
+Outros bancos usam um fallback com icontains (sem índice nem ranking).
+"""
+import re
+
+from django.db import connections
+
+from .models import Book
+
+# Número de livros reindexados por lote (limita o tamanho das queries e da memória usada).
+INDEX_BATCH_SIZE = 500
+
+
+def search_terms(query):
+    """Extrai os termos (palavras) da busca, ignorando a sintaxe de consulta do banco."""
+    return re.findall(r'\w+', query or '')
+
+
+def book_documents(book_ids, using='default'):
+    """Gera (id, título, resumo, isbn, autores, gêneros) para os livros informados."""
+    books = Book.objects.using(using).filter(pk__in=book_ids).select_related('author').prefetch_related('genre')
+    for book in books:
+        author = f'{book.author.first_name} {book.author.last_name}' if book.author else ''
+        genres = ' '.join(genre.name for genre in book.genre.all())
+        yield book.pk, book.title, book.summary, book.isbn, author, genres
+
+
+class SQLiteSearchBackend:
+    table = 'catalog_book_fts'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def remove(self, book_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in book_ids])
+
+    def index(self, book_ids):
+        rows = list(book_documents(book_ids, self.connection.alias))
+        self.remove(book_ids)
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, summary, isbn, authors, genres) '
+                f'VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, query, limit, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        # Cada termo vira um prefixo entre aspas, combinados com AND implícito do FTS5:
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        with self.connection.cursor() as cursor:
+            # Pesos do bm25 na ordem das colunas: title, summary, isbn, authors, genres.
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, 10.0, 1.0, 10.0, 5.0, 2.0), rowid LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchBackend:
+    table = 'catalog_book_search'
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def remove(self, book_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE book_id = ANY(%s)', [list(book_ids)])
+
+    def index(self, book_ids):
+        rows = [
+            (pk, f'{title} {isbn}', author, genres, summary)
+            for pk, title, summary, isbn, author, genres in book_documents(book_ids, self.connection.alias)
+        ]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (book_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                f"setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D')) "
+                f"ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+        missing = set(book_ids) - {row[0] for row in rows}
+        if missing:
+            self.remove(missing)
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+    def search(self, query, limit, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT book_id FROM {self.table}, to_tsquery('simple', %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC, book_id LIMIT %s OFFSET %s",
+                [tsquery, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """Busca sem índice para bancos sem suporte a texto completo (apenas título, sem ranking)."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def remove(self, book_ids):
+        pass
+
+    def index(self, book_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, limit, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        books = Book.objects.using(self.connection.alias).order_by('title', 'id')
+        for term in terms:
+            books = books.filter(title__icontains=term)
+        return list(books.values_list('pk', flat=True)[offset:offset + limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)(connection)
+
+
+def index_books(book_ids, using='default'):
+    """(Re)indexa os livros informados, em lotes de INDEX_BATCH_SIZE."""
+    book_ids = list(book_ids)
+    backend = get_search_backend(using)
+    for start in range(0, len(book_ids), INDEX_BATCH_SIZE):
+        backend.index(book_ids[start:start + INDEX_BATCH_SIZE])
+
+
+def remove_books(book_ids, using='default'):
+    get_search_backend(using).remove(list(book_ids))
+
+
+def search_books(query, limit, offset=0, using='default'):
+    """Retorna os livros que correspondem à busca, do mais relevante para o menos relevante."""
+    book_ids = get_search_backend(using).search(query, limit, offset)
+    books = Book.objects.using(using).select_related('author').in_bulk(book_ids)
+    return [books[pk] for pk in book_ids if pk in books]
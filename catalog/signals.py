@@ -0,0 +1,247 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import search
+from .cache import bump_catalog_version
+from .models import Author, Book, BookInstance, BorrowerSummary, Genre, Language, LibraryStats, LoanEvent
+
+
+def _status_delta(status, delta):
+    """Retorna o incremento do campo de LibraryStats correspondente ao status (vazio se não houver)."""
+    field_name = LibraryStats.STATUS_FIELDS.get(status)
+    return {field_name: delta} if field_name else {}
+
+
+@receiver(post_init, sender=BookInstance)
+def remember_loaded_status(sender, instance, **kwargs):
+    """Guarda status, livro, data de devolução e usuário carregados do banco para detectar mudanças no post_save."""
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_book_id = instance.__dict__.get('book_id')
+    instance._loaded_due_back = instance.__dict__.get('due_back')
+    instance._loaded_borrower_id = instance.__dict__.get('borrower_id')
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_instance(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created:
+        LibraryStats.adjust(num_instances=1, **_status_delta(instance.status, 1))
+    elif instance._loaded_status != instance.status:
+        deltas = _status_delta(instance._loaded_status, -1)
+        deltas.update(_status_delta(instance.status, 1))
+        LibraryStats.adjust(**deltas)
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_instance(sender, instance, **kwargs):
+    LibraryStats.adjust(num_instances=-1, **_status_delta(instance._loaded_status, -1))
+
+
+# Contadores de cópias de cada livro (Book.copies_*): recalculados para os livros afetados quando uma
+# cópia é criada, removida, muda de status/data de devolução ou passa para outro livro.
+
+@receiver(post_save, sender=BookInstance)
+def refresh_saved_instance_book(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    if created or (instance._loaded_book_id, instance._loaded_due_back) != (instance.book_id, instance.due_back):
+        Book.refresh_copy_counters([instance._loaded_book_id, instance.book_id])
+    elif instance._loaded_status != instance.status:
+        Book.refresh_copy_counters([instance.book_id])
+
+
+# Resumo dos empréstimos de cada usuário (BorrowerSummary): recalculado para o usuário anterior e o
+# atual quando um empréstimo começa, termina, muda de usuário ou de data de devolução.
+
+@receiver(post_save, sender=BookInstance)
+def refresh_saved_instance_borrowers(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    loaded = (None, None, None) if created else (
+        instance._loaded_status, instance._loaded_borrower_id, instance._loaded_due_back,
+    )
+    if 'o' not in (loaded[0], instance.status) or loaded == (instance.status, instance.borrower_id, instance.due_back):
+        return
+    # Apenas os usuários do empréstimo que terminou e do que começou (não os de reservas):
+    user_ids = [loaded[1] if loaded[0] == 'o' else None, instance.borrower_id if instance.status == 'o' else None]
+    is_new_loan = instance.status == 'o' and loaded[:2] != ('o', instance.borrower_id)
+    BorrowerSummary.refresh(user_ids, new_loans={instance.borrower_id: 1} if is_new_loan else None)
+
+
+# Histórico dos empréstimos (LoanEvent): um evento quando um empréstimo começa, termina ou é renovado.
+
+@receiver(post_save, sender=BookInstance)
+def log_loan_events(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    loaded = (None, None, None) if created else (
+        instance._loaded_status, instance._loaded_borrower_id, instance._loaded_due_back,
+    )
+    saved = (instance.status, instance.borrower_id, instance.due_back)
+    LoanEvent.record([(instance.pk, instance.book_id, loaded, saved)])
+
+
+@receiver(post_save, sender=BookInstance)
+def remember_saved_status(sender, instance, **kwargs):
+    # Conectado depois dos handlers acima, que comparam os valores carregados com os gravados.
+    instance._loaded_status = instance.status
+    instance._loaded_book_id = instance.book_id
+    instance._loaded_due_back = instance.due_back
+    instance._loaded_borrower_id = instance.borrower_id
+
+
+@receiver(post_delete, sender=BookInstance)
+def refresh_deleted_instance_book(sender, instance, **kwargs):
+    Book.refresh_copy_counters([instance._loaded_book_id])
+
+
+@receiver(post_delete, sender=BookInstance)
+def refresh_deleted_instance_borrower(sender, instance, **kwargs):
+    if instance._loaded_status == 'o':
+        BorrowerSummary.refresh([instance._loaded_borrower_id])
+
+
+# Contadores simples (criação/remoção) para os demais modelos exibidos na home page:
+COUNTED_MODELS = {
+    Book: 'num_books',
+    Author: 'num_authors',
+    Genre: 'num_genres',
+}
+
+
+@receiver(post_save)
+def count_created_object(sender, created, raw=False, **kwargs):
+    if created and not raw and sender in COUNTED_MODELS:
+        LibraryStats.adjust(**{COUNTED_MODELS[sender]: 1})
+
+
+@receiver(post_delete)
+def count_deleted_object(sender, **kwargs):
+    if sender in COUNTED_MODELS:
+        LibraryStats.adjust(**{COUNTED_MODELS[sender]: -1})
+
+
+# Índice de busca (catalog/search.py): o documento de um livro inclui o nome do autor e os gêneros,
+# então alterações nesses modelos também reindexam os livros relacionados.
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    search.remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books([instance.pk])
+    elif action == 'pre_clear':
+        # Em genre.book_set.clear() o post_clear não informa os livros afetados.
+        instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        search.index_books(instance._search_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(pk_set)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+def index_related_books(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_books(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def remember_related_books(sender, instance, **kwargs):
+    # Após a remoção os livros não apontam mais para o autor/gênero, então os ids são guardados antes.
+    instance._search_book_ids = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_orphaned_books(sender, instance, **kwargs):
+    search.index_books(instance._search_book_ids)
+
+
+# Datas de alteração (updated_at) das páginas condicionais: o autor é "tocado" quando um livro dele muda
+# e o livro quando os gêneros ou a língua dele mudam (os contadores de cópias já atualizam o livro).
+
+def _touch(model, pks):
+    pks = {pk for pk in pks if pk is not None}
+    if pks:
+        model.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+@receiver(post_init, sender=Book)
+def remember_loaded_author(sender, instance, **kwargs):
+    instance._loaded_author_id = instance.__dict__.get('author_id')
+
+
+@receiver(post_save, sender=Book)
+def touch_saved_book_authors(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch(Author, [instance._loaded_author_id, instance.author_id])
+        instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Book)
+def touch_deleted_book_author(sender, instance, **kwargs):
+    _touch(Author, [instance._loaded_author_id])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _touch(Book, [instance.pk])
+    elif action == 'post_clear':
+        _touch(Book, instance._search_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        _touch(Book, pk_set)
+
+
+@receiver(post_save, sender=Genre)
+def touch_genre_books(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        _touch(Book, instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def touch_orphaned_genre_books(sender, instance, **kwargs):
+    _touch(Book, instance._search_book_ids)
+
+
+@receiver(post_save, sender=Language)
+@receiver(pre_delete, sender=Language)
+def touch_language_books(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        Book.objects.filter(language=instance).update(updated_at=timezone.now())
+
+
+# Cache das páginas do catálogo (catalog/cache.py): qualquer alteração invalida as páginas em cache.
+CACHED_MODELS = (Book, Author, BookInstance, Genre, Language)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_catalog_cache(sender, raw=False, **kwargs):
+    if sender in CACHED_MODELS and not raw:
+        bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_catalog_cache_on_genres(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Mixin para TestCase que garante um número máximo de queries por view.
+
+    Falha listando as queries executadas quando a view passa do orçamento, o que
+    normalmente indica um N+1 introduzido no template ou no queryset da view. O cache é
+    limpo antes da requisição para que o orçamento meça sempre o caminho sem cache.
+    """
+
+    def assertQueryBudget(self, url, budget, status_code=200):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status_code)
+
+        executed = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{url} executou {len(context)} queries (orçamento: {budget}):\n{executed}'
+        )
+        return response
@@ -0,0 +1,112 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Author, Book, BookInstance, BookInstanceAudit, Genre
+from ..pagination import EstimatedCountPaginator, estimated_row_count
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='2HJ1vRV0Z&3iD')
+        genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Horror')]
+        for number in range(30):
+            author = Author.objects.create(first_name='John', last_name=f'Smith {number}')
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'ISBN{number}', author=author)
+            book.genre.set(genres)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=cls.admin)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for url, queries in (
+            # Sessão, usuário, COUNT limitado e a página (livro e usuário via JOIN):
+            (reverse('admin:catalog_bookinstance_changelist'), 4),
+            # ... e os gêneros da página em uma query de prefetch:
+            (reverse('admin:catalog_book_changelist'), 5),
+        ):
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Fantasy, Horror')
+
+    def test_book_inline_is_paginated(self):
+        book = Book.objects.first()
+        for _ in range(24):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        url = reverse('admin:catalog_book_change', args=[book.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['inline_admin_formsets'][0].formset.initial_form_count(), 20)
+        self.assertContains(response, 'Page 1 of 2')
+        response = self.client.get(url, {'bookinstance_page': 2})
+        self.assertEqual(response.context['inline_admin_formsets'][0].formset.initial_form_count(), 5)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for status in 'aaao':
+            BookInstance.objects.create(book=book, imprint='Imprint', status=status)
+
+    def test_unfiltered_count_uses_the_database_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        queryset = BookInstance.objects.all()
+        self.assertEqual(estimated_row_count(queryset), 4)
+
+        paginator = EstimatedCountPaginator(queryset, 10)
+        paginator.estimate_threshold = 1
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 4)
+        self.assertEqual(EstimatedCountPaginator(queryset.filter(status='a'), 10).count, 3)
+
+    def test_filtered_count_is_capped(self):
+        paginator = EstimatedCountPaginator(BookInstance.objects.filter(status='a'), 1)
+        paginator.max_count = 2
+        self.assertEqual(paginator.count, 2)
+        self.assertEqual(paginator.num_pages, 2)
+
+
+class BookInstanceAdminActionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='2HJ1vRV0Z&3iD')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for _ in range(5):
+            BookInstance.objects.create(
+                book=cls.book, imprint='Imprint', status='o', borrower=cls.admin, due_back=datetime.date(2030, 1, 10),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:catalog_bookinstance_changelist')
+
+    def run_action(self, action, **data):
+        # "Selecionar todas" as cópias do changelist (select_across), e não apenas as da página:
+        return self.client.post(self.url, {
+            'action': action, 'select_across': '1', 'index': '0',
+            '_selected_action': [str(BookInstance.objects.values_list('pk', flat=True).first())], **data,
+        }, follow=True)
+
+    def test_extend_and_return_all_copies(self):
+        response = self.run_action('extend_due_back', weeks='1')
+        self.assertContains(response, 'Due date of 5 loans extended by 1 week.')
+        self.assertEqual(set(BookInstance.objects.values_list('due_back', flat=True)), {datetime.date(2030, 1, 17)})
+
+        response = self.run_action('mark_returned')
+        self.assertContains(response, '5 copies marked as returned.')
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available, self.book.copies_on_loan), (5, 0))
+        self.assertEqual(BookInstanceAudit.objects.filter(user=self.admin).count(), 10)
+
+    def test_action_parameter_is_required(self):
+        response = self.run_action('reassign_imprint')
+        self.assertContains(response, 'Inform the new imprint.')
+        self.assertFalse(BookInstanceAudit.objects.exists())
@@ -0,0 +1,139 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import analytics, circulation
+from ..models import Author, Book, BookInstance, Genre, Language, LoanEvent, LoanRollup
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+
+class LoanEventTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a') for _ in range(3)]
+
+    def test_single_and_bulk_operations_are_logged(self):
+        circulation.checkout(self.copies[0].pk, self.reader, datetime.date(2030, 1, 10))
+        circulation.renew(self.copies[0].pk, datetime.date(2030, 1, 20))
+        circulation.return_copy(self.copies[0].pk)
+        circulation.checkout_copies([copy.pk for copy in self.copies[1:]], self.reader, datetime.date(2030, 1, 10))
+        circulation.extend_due_back(BookInstance.objects.filter(status='o'), 1)
+        circulation.mark_returned(BookInstance.objects.all())
+
+        events = LoanEvent.objects.order_by('id')
+        self.assertEqual(
+            [event.kind for event in events],
+            ['checkout', 'renew', 'return', 'checkout', 'checkout', 'renew', 'renew', 'return', 'return'],
+        )
+        checkout, renewal, returned = events[:3]
+        self.assertEqual((returned.borrower, returned.due_back), (self.reader, datetime.date(2030, 1, 20)))
+        self.assertEqual(renewal.loaned_at, checkout.created_at)
+        self.assertEqual(returned.loaned_at, checkout.created_at)
+        self.assertTrue(all(event.book_id == self.book.pk for event in events))
+
+    def test_other_changes_are_not_logged(self):
+        circulation.reserve(self.copies[0].pk, self.reader)
+        circulation.reassign_imprint(BookInstance.objects.all(), 'New Imprint')
+        self.assertFalse(LoanEvent.objects.exists())
+
+
+class LoanRollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        cls.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        readers = [User.objects.create_user(username=f'reader{number}') for number in range(2)]
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(name='English')
+        cls.genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Horror')]
+        cls.book = Book.objects.create(
+            title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author, language=cls.language,
+        )
+        cls.book.genre.set(cls.genres)
+        cls.other_book = Book.objects.create(title='Other Title', summary='Summary', isbn='HIJKLMN')
+
+        # Dois empréstimos em janeiro (um devolvido com atraso em fevereiro) e um do outro livro em março:
+        cls.jan, cls.feb, cls.mar = datetime.date(2025, 1, 30), datetime.date(2025, 2, 14), datetime.date(2025, 3, 2)
+        events = []
+        for reader in readers:
+            events.append(LoanEvent(
+                kind='checkout', book=cls.book, borrower=reader, due_back=datetime.date(2025, 2, 10),
+                loaned_at=at(cls.jan), created_at=at(cls.jan),
+            ))
+        events += [
+            LoanEvent(kind='return', book=cls.book, borrower=readers[0], due_back=datetime.date(2025, 2, 10),
+                      loaned_at=at(cls.jan), created_at=at(cls.feb)),
+            LoanEvent(kind='renew', book=cls.book, borrower=readers[1], due_back=datetime.date(2025, 3, 1),
+                      loaned_at=at(cls.jan), created_at=at(cls.feb)),
+            LoanEvent(kind='checkout', book=cls.other_book, borrower=readers[0], loaned_at=at(cls.mar),
+                      created_at=at(cls.mar)),
+        ]
+        LoanEvent.objects.bulk_create(events)
+
+    def rollup(self, **options):
+        out = StringIO()
+        call_command('rollup_loans', stdout=out, **options)
+        return out.getvalue()
+
+    def test_rollup_by_dimension(self):
+        self.assertIn('Rolled up 5 loan events in 32 days (3 months).', self.rollup(until=self.mar))
+
+        day = LoanRollup.objects.get(period='day', start=self.jan, dimension='book', key=self.book.pk)
+        self.assertEqual((day.loans, day.borrower_days), (2, 2))
+        month = LoanRollup.objects.get(
+            period='month', start=datetime.date(2025, 2, 1), dimension='genre', key=self.genres[0].pk,
+        )
+        self.assertEqual((month.returns, month.overdue_returns, month.loan_days, month.renewals), (1, 1, 15, 1))
+        self.assertEqual(LoanRollup.objects.filter(period='day', dimension='author').count(), 2)
+
+        # Uma nova execução recalcula apenas o último dia agregado:
+        self.assertIn('Rolled up 1 loan events in 1 days (1 months).', self.rollup(until=self.mar))
+
+    def test_report_reads_only_rollups(self):
+        self.rollup(since=self.jan, until=self.mar)
+        rows, totals = analytics.loan_report('genre', datetime.date(2025, 1, 15), datetime.date(2025, 3, 31))
+        self.assertEqual([row['name'] for row in rows], ['Fantasy', 'Horror'])
+        self.assertEqual((rows[0]['loans'], rows[0]['avg_loan_days'], rows[0]['overdue_rate']), (2, 15, 1))
+        self.assertEqual((totals['loans'], totals['returns']), (3, 1))
+        # reader0 pegou livros em dois dias: são 3 usuários-dia, mas apenas 2 usuários distintos.
+        self.assertEqual(totals['borrower_days'], 3)
+
+        # Os meses inteiros vêm das linhas mensais, as pontas das diárias:
+        rows, totals = analytics.loan_report('book', datetime.date(2025, 2, 1), datetime.date(2025, 3, 1))
+        self.assertEqual(totals['loans'], 0)
+        self.assertEqual((rows[0]['returns'], rows[0]['renewals']), (1, 1))
+
+        self.client.force_login(self.librarian)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('loan-report'), {'dimension': 'author', 'start': '2025-01-01', 'end': '2025-12-31'},
+            )
+        self.assertContains(response, 'Smith, John')
+        self.assertContains(response, '<th>Borrower-days</th>', html=True)
+        self.assertFalse(any('catalog_loanevent' in query['sql'] for query in context.captured_queries))
+
+    def test_borrower_with_two_books_counts_once_a_day(self):
+        LoanEvent.objects.create(
+            kind='checkout', book=self.book, borrower=User.objects.get(username='reader0'),
+            loaned_at=at(self.mar), created_at=at(self.mar, hour=15),
+        )
+        self.rollup(since=self.mar, until=self.mar)
+        rows, totals = analytics.loan_report('book', self.mar, self.mar)
+        self.assertEqual([row['borrower_days'] for row in rows], [1, 1])
+        self.assertEqual((totals['loans'], totals['borrower_days']), (2, 1))
+
+    def test_report_requires_permission(self):
+        self.client.force_login(User.objects.get(username='reader0'))
+        self.assertEqual(self.client.get(reverse('loan-report')).status_code, 302)
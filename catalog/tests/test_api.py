@@ -0,0 +1,159 @@
+import datetime
+import json
+import uuid
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogApiReadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.language = Language.objects.create(name='English')
+        genres = [Genre.objects.create(name=name) for name in ('Fantasy', 'Science fiction')]
+        for number in range(5):
+            book = Book.objects.create(
+                title=f'Book {number}', summary='Summary', isbn=f'ISBN{number}',
+                author=cls.author, language=cls.language,
+            )
+            book.genre.set(genres)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_with_sparse_fields(self):
+        response = self.client.get(reverse('api-collection', args=['books']), {'fields': 'title,author'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[0], {'title': 'Book 0', 'author': self.author.pk})
+
+    def test_expansion_does_not_query_per_row(self):
+        url = reverse('api-collection', args=['books'])
+        # Livros (com autor e língua via JOIN) + gêneros em uma query de prefetch:
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'expand': 'author,language,genre'})
+        book = response.json()['results'][0]
+        self.assertEqual(book['author']['last_name'], 'Le Guin')
+        self.assertEqual(book['language'], {'id': self.language.pk, 'name': 'English'})
+        self.assertEqual([genre['name'] for genre in book['genre']], ['Fantasy', 'Science fiction'])
+        self.assertEqual(book['copies_available'], 1)
+
+    def test_cursor_pagination(self):
+        url = reverse('api-collection', args=['books'])
+        first = self.client.get(url, {'page_size': 3, 'fields': 'title'}).json()
+        self.assertEqual([book['title'] for book in first['results']], ['Book 0', 'Book 1', 'Book 2'])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([book['title'] for book in second['results']], ['Book 3', 'Book 4'])
+        self.assertIsNone(second['next'])
+
+    def test_conditional_get_returns_304_until_the_catalog_changes(self):
+        url = reverse('api-collection', args=['authors'])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Author.objects.create(first_name='Iain', last_name='Banks')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_detail_and_errors(self):
+        copy = BookInstance.objects.first()
+        response = self.client.get(reverse('api-item', args=['copies', copy.pk]), {'expand': 'book'})
+        self.assertEqual(response.json()['book']['title'], copy.book.title)
+        self.assertNotIn('borrower', response.json())
+
+        self.assertEqual(self.client.get(reverse('api-item', args=['copies', 'not-a-uuid'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-collection', args=['users'])).status_code, 404)
+        response = self.client.get(reverse('api-collection', args=['books']), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogApiWriteTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        User.objects.create_user(username='reader', password='2HJ1vRV0Z&3iD')
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.language = Language.objects.create(name='English')
+
+    def send(self, method, url, data):
+        return getattr(self.client, method)(url, json.dumps(data), content_type='application/json')
+
+    def test_writes_require_permission(self):
+        self.client.login(username='reader', password='2HJ1vRV0Z&3iD')
+        response = self.send('post', reverse('api-collection', args=['genres']), {'name': 'Horror'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_update_and_delete(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        response = self.send('post', reverse('api-collection', args=['books']), {
+            'title': 'A Wizard of Earthsea', 'summary': 'Mage', 'isbn': '9780553383041',
+            'author': self.author.pk, 'language': self.language.pk, 'genre': [self.genre.pk],
+        })
+        self.assertEqual(response.status_code, 201)
+        url = reverse('api-item', args=['books', response.json()['id']])
+
+        response = self.send('patch', url, {'title': 'Earthsea'})
+        self.assertEqual(response.status_code, 200)
+        book = Book.objects.get()
+        self.assertEqual((book.title, book.isbn), ('Earthsea', '9780553383041'))
+        self.assertEqual(list(book.genre.all()), [self.genre])
+
+        response = self.send('put', url, {'title': '', 'summary': 'Mage', 'isbn': '9780553383041'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.json()['errors'])
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Book.objects.exists())
+
+    def test_copy_status_is_read_only(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+        response = self.send('patch', reverse('api-item', args=['copies', copy.pk]), {'status': 'o', 'imprint': 'New'})
+        self.assertEqual(response.status_code, 200)
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.imprint), ('a', 'New'))
+
+    def test_circulation_actions(self):
+        self.client.login(username='librarian', password='2HJ1vRV0Z&3iD')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+        def action(name, data=None):
+            return self.send('post', reverse('api-copy-action', args=[copy.pk, name]), data or {})
+
+        response = action('checkout', {'borrower': 'reader'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'o')
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).borrower.username, 'reader')
+
+        # Transições não permitidas no status atual são recusadas pelo módulo de circulação:
+        response = action('checkout', {'borrower': 'reader'})
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('it is on loan', response.json()['detail'])
+
+        self.assertEqual(action('renew', {'due_back': '2000-01-01'}).status_code, 400)
+        due_back = datetime.date.today() + datetime.timedelta(weeks=2)
+        self.assertEqual(action('renew', {'due_back': due_back.isoformat()}).json()['due_back'], due_back.isoformat())
+
+        response = action('return')
+        self.assertEqual(response.json()['status'], 'a')
+        self.assertEqual(action('checkout', {'borrower': 'nobody'}).status_code, 400)
+        self.assertEqual(action('burn').status_code, 404)
+        url = reverse('api-copy-action', args=[uuid.uuid4(), 'return'])
+        self.assertEqual(self.send('post', url, {}).status_code, 404)
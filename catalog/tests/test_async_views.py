@@ -0,0 +1,107 @@
+import re
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connections
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+
+from .. import async_views
+from ..models import Author, Book, BookInstance
+
+
+@override_settings(CATALOG_ASYNC_PARALLEL_QUERIES=False)
+class AsyncCatalogViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_id in range(13):
+            book = Book.objects.create(
+                title=f'Outro Livro {book_id:02}', summary='Summary', isbn=f'ISBN{book_id}', author=cls.author
+            )
+            BookInstance.objects.create(book=book, imprint='Unlikely Imprint, 2016', status='a')
+        cls.book = book
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, path):
+        request = AsyncRequestFactory().get(path)
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        return request
+
+    async def test_index(self):
+        request = self.request('/catalog/')
+        response = await async_views.index(request)
+        self.assertContains(response, '<strong>Books:</strong> 13')
+        self.assertContains(response, 'Outro Livro 00')
+        self.assertNotIn('num_visits', response.cookies)
+        self.assertFalse(request.session.modified)
+
+    async def test_book_list_is_paginated(self):
+        response = await async_views.book_list(self.request('/catalog/books/?page=2'))
+        self.assertContains(response, 'Outro Livro 12')
+        self.assertNotContains(response, 'Outro Livro 09')
+        self.assertContains(response, 'Page 2 of 2.')
+
+    async def test_book_list_invalid_page_returns_404(self):
+        with self.assertRaises(Http404):
+            await async_views.book_list(self.request('/catalog/books/?page=5'))
+
+    async def test_book_list_keyset_pagination(self):
+        response = await async_views.book_list(self.request('/catalog/books/?cursor='))
+        self.assertContains(response, 'Outro Livro 09')
+        self.assertNotContains(response, 'Outro Livro 10')
+        self.assertNotContains(response, 'Page 1 of')
+
+        next_cursor = re.search(r'\?cursor=([\w-]+)">next', response.content.decode()).group(1)
+        response = await async_views.book_list(self.request(f'/catalog/books/?cursor={next_cursor}'))
+        self.assertContains(response, 'Outro Livro 12')
+        self.assertNotContains(response, 'Outro Livro 09')
+
+    async def test_book_list_invalid_cursor_returns_404(self):
+        with self.assertRaises(Http404):
+            await async_views.book_list(self.request('/catalog/books/?cursor=garbage'))
+
+    async def test_book_detail(self):
+        response = await async_views.book_detail(self.request(f'/catalog/book/{self.book.pk}'), pk=self.book.pk)
+        self.assertContains(response, 'Unlikely Imprint, 2016')
+
+    async def test_author_detail(self):
+        request = self.request(f'/catalog/author/{self.author.pk}')
+        response = await async_views.author_detail_view(request, pk=self.author.pk)
+        self.assertContains(response, 'Smith, John')
+        self.assertContains(response, '(1)')
+
+
+@override_settings(CATALOG_ASYNC_PARALLEL_QUERIES=True)
+class ParallelQueriesTest(TransactionTestCase):
+    """As queries paralelas rodam em threads do executor (os dados precisam estar gravados)."""
+
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_id in range(3):
+            Book.objects.create(title=f'Outro Livro {book_id}', summary='Summary', isbn=f'ISBN{book_id}', author=author)
+
+    async def test_queries_close_their_thread_connection(self):
+        closed_in = []
+        close_all = connections.close_all
+
+        def record_close():
+            closed_in.append(threading.get_ident())
+            close_all()
+
+        request = AsyncRequestFactory().get('/catalog/books/')
+        request.user = AnonymousUser()
+        with mock.patch.object(connections, 'close_all', record_close):
+            response = await async_views.book_list(request)
+
+        self.assertContains(response, 'Outro Livro 2')
+        # COUNT e página, cada um fechando a conexão da sua thread do executor:
+        self.assertEqual(len(closed_in), 2)
+        self.assertNotIn(threading.get_ident(), closed_in)
@@ -0,0 +1,190 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..cache import bump_catalog_version, get_catalog_version
+from ..models import Author, Book, BookInstance, Genre, Language
+
+
+class CatalogPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_is_served_from_cache(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Available')
+
+    def test_copy_change_invalidates_cached_page(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.assertContains(self.client.get(url), 'Available')
+
+        self.copy.status = 'o'
+        self.copy.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'On loan')
+        self.assertNotContains(response, 'Available')
+
+    def test_every_catalog_model_bumps_version(self):
+        for create in (
+            lambda: Genre.objects.create(name='Fantasy'),
+            lambda: Language.objects.create(name='English'),
+            lambda: Author.objects.create(first_name='Jane', last_name='Doe'),
+            lambda: self.book.genre.add(Genre.objects.create(name='Horror')),
+        ):
+            version = get_catalog_version()
+            create()
+            self.assertGreater(get_catalog_version(), version)
+
+    def test_authenticated_users_bypass_page_cache(self):
+        url = reverse('author-detail', args=[self.author.pk])
+        self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertContains(response, 'testuser1')
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+    def test_copies_fragment_is_cached(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        # A versão da página fica em cache; livro (com autor e língua) e gêneros. A lista de cópias
+        # vem do fragmento em cache:
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'Unlikely Imprint, 2016')
+
+
+class ConditionalCatalogPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author)
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_page_returns_304_without_queries(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_copy_change_updates_book_and_author_pages(self):
+        urls = [reverse('book-detail', args=[self.book.pk]), reverse('author-detail', args=[self.author.pk])]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        self.copy.status = 'o'
+        self.copy.save()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_imprint_change_updates_book_page(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        etag = self.client.get(url)['ETag']
+
+        self.copy.imprint = 'Second Imprint, 2020'
+        self.copy.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Second Imprint, 2020')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_moving_a_book_updates_the_previous_author_page(self):
+        url = reverse('author-detail', args=[self.author.pk])
+        etag = self.client.get(url)['ETag']
+        self.book.author = Author.objects.create(first_name='Jane', last_name='Doe')
+        self.book.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Book Title')
+
+    def test_author_list_changes_when_an_author_is_deleted(self):
+        Author.objects.create(first_name='Jane', last_name='Doe')
+        url = reverse('authors')
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        Author.objects.get(last_name='Doe').delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_authenticated_pages_are_private(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        anonymous_etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+
+    def test_missing_book_is_not_conditional(self):
+        response = self.client.get(reverse('book-detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+# A "réplica" é o próprio banco de teste (como com TEST MIRROR); o atraso de replicação é simulado
+# incrementando a versão do catálogo antes de aplicar a alteração, e a alteração "replicada" é aplicada
+# depois com um UPDATE (que não dispara sinais).
+@override_settings(DATABASE_REPLICAS=['default'], DATABASE_REPLICA_PIN_SECONDS=5)
+class LaggingReplicaPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Old Title', summary='Summary', isbn='ABCDEFG', author=author)
+        BookInstance.objects.create(book=cls.book, imprint='Unlikely Imprint, 2016', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_read_from_a_lagging_replica_are_cached_briefly(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url)
+
+        # Gravação confirmada no principal (nova versão), ainda não aplicada na réplica:
+        bump_catalog_version()
+        response = self.client.get(url)
+        self.assertContains(response, 'Old Title')
+        stale_etag = response['ETag']
+
+        # A réplica alcança o principal:
+        Book.objects.filter(pk=self.book.pk).update(title='New Title', updated_at=timezone.now())
+        self.assertContains(self.client.get(url), 'Old Title')
+
+        later = time.time() + 6
+        with mock.patch('time.time', return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=stale_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'New Title')
+
+    def test_pages_read_from_the_primary_keep_the_full_timeout(self):
+        url = reverse('book-detail', args=[self.book.pk])
+        self.client.get(url, HTTP_COOKIE='db_primary=1')
+        Book.objects.filter(pk=self.book.pk).update(title='New Title')
+
+        later = time.time() + 6
+        with mock.patch('time.time', return_value=later):
+            self.assertContains(self.client.get(url), 'Old Title')
@@ -0,0 +1,287 @@
+import datetime
+import uuid
+
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from .. import circulation
+from ..models import Book, BookInstance, BookInstanceAudit, Hold, LibraryStats
+
+
+class CirculationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.other_reader = User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.copies = [
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a') for _ in range(3)
+        ]
+
+    def assertDenormalizedDataMatchTables(self):
+        stats = LibraryStats.load()
+        rebuilt = LibraryStats.rebuild()
+        for field in LibraryStats.STATUS_FIELDS.values():
+            self.assertEqual(getattr(stats, field), getattr(rebuilt, field), field)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.copies_available, self.book.bookinstance_set.filter(status='a').count())
+        self.assertEqual(self.book.copies_on_loan, self.book.bookinstance_set.filter(status='o').count())
+
+    def test_checkout_and_return(self):
+        copy = circulation.checkout(self.copies[0].pk, self.reader)
+        self.assertEqual((copy.status, copy.borrower), ('o', self.reader))
+        self.assertEqual(copy.due_back, datetime.date.today() + circulation.LOAN_PERIOD)
+        self.assertDenormalizedDataMatchTables()
+
+        copy = circulation.return_copy(copy.pk)
+        copy.refresh_from_db()
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('a', None, None))
+        self.assertDenormalizedDataMatchTables()
+
+    def test_cannot_check_out_a_copy_twice(self):
+        circulation.checkout(self.copies[0].pk, self.reader)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.copies[0].pk, self.other_reader)
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[0].pk).borrower, self.reader)
+
+    def test_reserved_copy_only_goes_to_its_borrower(self):
+        circulation.reserve(self.copies[0].pk, self.reader)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.copies[0].pk, self.other_reader)
+        self.assertEqual(circulation.checkout(self.copies[0].pk, self.reader).status, 'o')
+
+    def test_renew_requires_a_loan(self):
+        with self.assertRaises(circulation.CirculationError):
+            circulation.renew(self.copies[0].pk, datetime.date.today())
+        with self.assertRaises(circulation.CirculationError):
+            circulation.return_copy(uuid.uuid4())
+
+    def test_bulk_checkout_and_return(self):
+        ids = [copy.pk for copy in self.copies]
+        circulation.checkout(ids[0], self.other_reader)
+
+        result = circulation.checkout_copies(ids, self.reader)
+        self.assertEqual(sorted(result.done), sorted(ids[1:]))
+        self.assertEqual(result.skipped, [ids[0]])
+        self.assertDenormalizedDataMatchTables()
+
+        result = circulation.return_copies([str(pk) for pk in ids] + [uuid.uuid4()])
+        self.assertEqual(len(result.done), 3)
+        self.assertEqual(len(result.skipped), 1)
+        self.assertFalse(BookInstance.objects.filter(status='o').exists())
+        self.assertDenormalizedDataMatchTables()
+
+    def test_bulk_admin_operations_are_audited(self):
+        due_back = datetime.date(2030, 1, 10)
+        circulation.checkout_copies([copy.pk for copy in self.copies[:2]], self.reader, due_back)
+        queryset = BookInstance.objects.filter(book=self.book)
+
+        self.assertEqual(circulation.extend_due_back(queryset, 2, user=self.other_reader), 2)
+        self.assertEqual(
+            set(queryset.filter(status='o').values_list('due_back', flat=True)), {datetime.date(2030, 1, 24)},
+        )
+        record = BookInstanceAudit.objects.get(action='extend', book_instance=self.copies[0])
+        self.assertEqual(record.changes, {'due_back': ['2030-01-10', '2030-01-24']})
+        self.assertEqual(record.user, self.other_reader)
+
+        # Apenas a cópia disponível vai para a manutenção; as emprestadas são devolvidas:
+        self.assertEqual(circulation.send_to_maintenance(queryset), 1)
+        self.assertEqual(circulation.mark_returned(queryset), 2)
+        self.assertEqual(circulation.reassign_imprint(queryset, 'New Imprint'), 3)
+        self.assertEqual(BookInstanceAudit.objects.count(), 2 + 1 + 2 + 3)
+        self.assertEqual(
+            BookInstanceAudit.objects.get(action='return', book_instance=self.copies[0]).changes,
+            {'status': ['o', 'a'], 'borrower_id': [self.reader.pk, None], 'due_back': ['2030-01-24', None]},
+        )
+        self.assertEqual(queryset.filter(status='m').count(), 1)
+        self.assertDenormalizedDataMatchTables()
+
+    def test_bulk_admin_operations_do_not_query_per_copy(self):
+        for _ in range(20):
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        # Seleção (FOR UPDATE), auditoria (bulk_create), UPDATE, LibraryStats e contadores do livro
+        # (bloqueio, contagem e UPDATE), os pedidos para os quais as cópias estavam separadas, mais os
+        # savepoints das duas transações:
+        with self.assertNumQueries(12):
+            self.assertEqual(circulation.send_to_maintenance(BookInstance.objects.all()), 23)
+        self.assertDenormalizedDataMatchTables()
+
+
+class HoldQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.readers = [
+            User.objects.create_user(username=f'reader{number}', password='1X<ISRUkw+tuK') for number in range(4)
+        ]
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='o', borrower=cls.readers[0])
+
+    assertDenormalizedDataMatchTables = CirculationTest.assertDenormalizedDataMatchTables
+
+    def test_returned_copy_goes_to_the_head_of_the_queue(self):
+        first = circulation.place_hold(self.book, self.readers[1])
+        second = circulation.place_hold(self.book, self.readers[2])
+        urgent = circulation.place_hold(self.book, self.readers[3], priority=1)
+        self.assertEqual([first.status, second.status, urgent.status], ['w', 'w', 'w'])
+        with self.assertRaises(circulation.CirculationError):
+            circulation.place_hold(self.book, self.readers[1])
+
+        circulation.return_copy(self.copy.pk)
+        self.copy.refresh_from_db()
+        urgent.refresh_from_db()
+        self.assertEqual((self.copy.status, self.copy.borrower), ('r', self.readers[3]))
+        self.assertEqual((urgent.status, urgent.book_instance), ('r', self.copy))
+        self.assertEqual(Hold.objects.filter(status='w').count(), 2)
+        self.assertDenormalizedDataMatchTables()
+
+        # Apenas o usuário do pedido pode retirar a cópia, e o pedido fica atendido:
+        with self.assertRaises(circulation.CirculationError):
+            circulation.checkout(self.copy.pk, self.readers[1])
+        circulation.checkout(self.copy.pk, self.readers[3])
+        self.assertEqual(Hold.objects.get(pk=urgent.pk).status, 'f')
+
+        # Cancelar um pedido pronto passa a cópia para o próximo da fila (ordem de chegada):
+        circulation.return_copy(self.copy.pk)
+        circulation.cancel_hold(first.pk)
+        self.assertEqual(Hold.objects.get(pk=first.pk).status, 'c')
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, 'r')
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.readers[2])
+        self.assertDenormalizedDataMatchTables()
+
+    def test_available_copy_is_held_immediately(self):
+        copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        hold = circulation.place_hold(self.book, self.readers[1])
+        self.assertEqual((hold.status, hold.book_instance), ('r', copy))
+        self.assertEqual(BookInstance.objects.get(pk=copy.pk).status, 'r')
+        self.assertDenormalizedDataMatchTables()
+
+    def test_bulk_returns_fulfil_holds(self):
+        copies = [self.copy] + [
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.readers[0])
+            for _ in range(2)
+        ]
+        holds = [circulation.place_hold(self.book, reader) for reader in self.readers[1:3]]
+
+        circulation.return_copies([copy.pk for copy in copies[:1]])
+        self.assertEqual(circulation.mark_returned(BookInstance.objects.filter(status='o')), 2)
+        self.assertEqual(set(Hold.objects.values_list('status', flat=True)), {'r'})
+        self.assertEqual(
+            sorted(BookInstance.objects.values_list('status', flat=True)), ['a', 'r', 'r'],
+        )
+        self.assertEqual(
+            {hold.book_instance.borrower for hold in Hold.objects.select_related('book_instance')},
+            {hold.patron for hold in holds},
+        )
+        self.assertDenormalizedDataMatchTables()
+
+        # Uma cópia separada que vai para a manutenção devolve o pedido para a fila:
+        ready = Hold.objects.get(patron=self.readers[1])
+        circulation.send_to_maintenance(BookInstance.objects.filter(pk=ready.book_instance_id))
+        ready.refresh_from_db()
+        self.assertEqual((ready.status, ready.book_instance, ready.expires_at), ('w', None, None))
+        self.assertDenormalizedDataMatchTables()
+
+    def test_expired_holds_pass_the_copy_on(self):
+        first = circulation.place_hold(self.book, self.readers[1])
+        second = circulation.place_hold(self.book, self.readers[2])
+        circulation.return_copy(self.copy.pk)
+        past = timezone.now() - datetime.timedelta(minutes=1)
+
+        Hold.objects.filter(status='r').update(expires_at=past)
+        self.assertEqual(circulation.expire_holds(batch_size=1), 1)
+        self.assertEqual(Hold.objects.get(pk=first.pk).status, 'e')
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, 'r')
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).borrower, self.readers[2])
+        self.assertDenormalizedDataMatchTables()
+
+        # Sem ninguém na fila, a cópia volta a ficar disponível:
+        Hold.objects.filter(status='r').update(expires_at=past)
+        self.assertEqual(circulation.expire_holds(), 1)
+        self.assertEqual(BookInstance.objects.get(pk=self.copy.pk).status, 'a')
+        self.assertDenormalizedDataMatchTables()
+
+    def test_head_of_queue_does_not_read_the_whole_queue(self):
+        Hold.objects.bulk_create([
+            Hold(book=self.book, patron=User.objects.create_user(username=f'patron{number}'))
+            for number in range(200)
+        ])
+        head = Hold.objects.filter(book=self.book, status='w').order_by(*Hold.QUEUE_ORDER).first()
+        # Cópia bloqueada, primeiro da fila (LIMIT 1), cópia, LibraryStats, contadores do livro (bloqueio,
+        # contagem e UPDATE), resumo do usuário que devolveu (INSERT OR IGNORE, bloqueio, contagem e
+        # UPDATE), evento de devolução (início do empréstimo e INSERT) e pedido atualizados, mais os
+        # savepoints:
+        with self.assertNumQueries(20) as context:
+            circulation.return_copy(self.copy.pk)
+        self.assertEqual(Hold.objects.get(pk=head.pk).status, 'r')
+        self.assertTrue(any('LIMIT 1' in query['sql'] for query in context.captured_queries))
+
+    def test_bulk_fulfilment_does_not_read_the_whole_queue(self):
+        Hold.objects.bulk_create([
+            Hold(book=self.book, patron=User.objects.create_user(username=f'patron{number}'))
+            for number in range(49)
+        ])
+        head = Hold.objects.filter(book=self.book, status='w').order_by(*Hold.QUEUE_ORDER).first()
+        # O mesmo número de queries com qualquer tamanho de fila: devolução em massa (seleção, UPDATE,
+        # LibraryStats, contadores, resumo e evento), livros com fila, primeiro da fila, cópia, pedido,
+        # LibraryStats e contadores do livro, mais os savepoints:
+        with self.assertNumQueries(29) as context:
+            circulation.return_copies([self.copy.pk])
+        self.assertEqual(Hold.objects.get(pk=head.pk).status, 'r')
+        # Livros com fila (EXISTS) e primeiro da fila: as leituras dos pedidos têm sempre LIMIT.
+        hold_reads = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and '"catalog_hold"' in query['sql']
+        ]
+        self.assertEqual(len(hold_reads), 2)
+        for sql in hold_reads:
+            self.assertIn('LIMIT', sql)
+
+    def test_bulk_fulfilment_reserves_copies_with_one_update(self):
+        copies = [self.copy] + [
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', borrower=self.readers[0])
+            for _ in range(2)
+        ]
+        holds = [circulation.place_hold(self.book, reader) for reader in self.readers[1:]]
+        with CaptureQueriesContext(connection) as context:
+            circulation.return_copies([copy.pk for copy in copies])
+        copy_updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "catalog_bookinstance"')
+        ]
+        # O UPDATE da devolução e um único UPDATE das cópias separadas para a fila:
+        self.assertEqual(len(copy_updates), 2)
+        for hold in holds:
+            hold.refresh_from_db()
+            self.assertEqual((hold.status, hold.book_instance.borrower), ('r', hold.patron))
+        self.assertDenormalizedDataMatchTables()
+
+
+class ReturnBooksViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.copy = BookInstance.objects.create(
+            book=book, imprint='Imprint', status='o', due_back=datetime.date.today(), borrower=cls.librarian,
+        )
+
+    def test_returns_scanned_barcodes(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        unknown = uuid.uuid4()
+        response = self.client.post(reverse('return-books'), {'barcodes': f'{self.copy.pk}\n{unknown}'}, follow=True)
+        # Post/redirect/get: recarregar a página de resultado não reenvia o carrinho.
+        self.assertRedirects(response, reverse('return-books'))
+        self.assertContains(response, '1 copy returned.')
+        self.assertContains(response, f'Not on loan (or unknown), not returned: {unknown}')
+        self.copy.refresh_from_db()
+        self.assertEqual(self.copy.status, 'a')
+
+    def test_invalid_barcode_is_a_form_error(self):
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('return-books'), {'barcodes': 'not-a-barcode'})
+        self.assertFormError(response, 'form', 'barcodes', 'Invalid barcode: not-a-barcode')
@@ -0,0 +1,315 @@
+import datetime
+import json
+import smtplib
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Author, Book, BookInstance, Genre, Hold, Language, LibraryStats, OverdueNotice
+from ..search import search_books
+
+
+class ExplainCatalogQueriesCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=librarian)
+
+    def test_prints_plan_for_every_view(self):
+        out = StringIO()
+        call_command('explain_catalog_queries', user='librarian', stdout=out)
+        output = out.getvalue()
+        for url in ('/catalog/books/', '/catalog/authors/', '/catalog/mybooks/', '/catalog/borrowed/'):
+            self.assertIn(f'{url} (200)', output)
+        self.assertIn('bookinst_borrower_status_idx', output)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite has no EXPLAIN ANALYZE.')
+    def test_analyze_unsupported_is_a_command_error(self):
+        with self.assertRaisesMessage(CommandError, '--analyze is not supported on sqlite'):
+            call_command('explain_catalog_queries', analyze=True, stdout=StringIO())
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        Author.objects.create(first_name='Ursula', last_name='Le Guin')
+
+    def write(self, name, content):
+        path = Path(self.directory.name) / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def test_imports_csv_resolving_related_rows(self):
+        path = self.write('catalog.csv', (
+            'title,summary,isbn,author_first_name,author_last_name,language,genres,copies,imprint,status\n'
+            'A Wizard of Earthsea,Mage,9780553383041,Ursula,Le Guin,English,Fantasy;Young adult,3,Parnassus,a\n'
+            'The Dispossessed,Utopia,9780061054884,Ursula,Le Guin,English,Science fiction,2,Harper,\n'
+            'No ISBN,Skipped,,Ursula,Le Guin,English,Fantasy,1,Harper,a\n'
+        ))
+        call_command('import_catalog', path, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(set(Genre.objects.values_list('name', flat=True)), {'Fantasy', 'Young adult', 'Science fiction'})
+        earthsea = Book.objects.get(isbn='9780553383041')
+        self.assertEqual(str(earthsea.author), 'Le Guin, Ursula')
+        self.assertEqual(earthsea.genre.count(), 2)
+        self.assertEqual(earthsea.bookinstance_set.filter(status='a').count(), 3)
+        self.assertEqual(BookInstance.objects.filter(status='m').count(), 2)
+        self.assertEqual((earthsea.copies_total, earthsea.copies_available), (3, 3))
+        self.assertEqual(Book.objects.get(isbn='9780061054884').copies_maintenance, 2)
+
+        stats = LibraryStats.load()
+        self.assertEqual((stats.num_books, stats.num_instances, stats.num_genres), (2, 5, 3))
+        self.assertEqual([book.title for book in search_books('wizard', limit=10)], ['A Wizard of Earthsea'])
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        path = self.write('catalog.csv', (
+            'title,isbn,copies,status\n'
+            'Good,ISBN1,2,a\n'
+            'Bad copies,ISBN2,two,a\n'
+            'Bad status,ISBN3,1,x\n'
+            'Negative,ISBN4,-1,a\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, stdout=out, stderr=err)
+
+        self.assertEqual(list(Book.objects.values_list('isbn', flat=True)), ['ISBN1'])
+        self.assertEqual(BookInstance.objects.count(), 2)
+        self.assertIn("Row 2 skipped: invalid copies 'two'.", err.getvalue())
+        self.assertIn("Row 3 skipped: invalid status 'x'.", err.getvalue())
+        self.assertIn('Row 4 skipped: invalid copies -1.', err.getvalue())
+        self.assertIn('(3 rows skipped)', out.getvalue())
+
+    def test_jsonl_rows_with_wrong_types_are_skipped(self):
+        rows = [
+            {'title': 'Good', 'isbn': 'ISBN1', 'genres': ['Fantasy', 'Horror']},
+            {'title': 'Numeric ISBN', 'isbn': 9781234567897},
+            {'title': 42, 'isbn': 'ISBN3'},
+            {'title': 'Genres string', 'isbn': 'ISBN4', 'genres': 'Fantasy'},
+            ['not', 'an', 'object'],
+        ]
+        path = self.write('catalog.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        err = StringIO()
+        call_command('import_catalog', path, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(list(Book.objects.values_list('isbn', flat=True)), ['ISBN1'])
+        self.assertEqual(sorted(Genre.objects.values_list('name', flat=True)), ['Fantasy', 'Horror'])
+        self.assertIn('Row 2 skipped: invalid isbn 9781234567897.', err.getvalue())
+        self.assertIn('Row 3 skipped: invalid title 42.', err.getvalue())
+        self.assertIn("Row 4 skipped: invalid genres 'Fantasy' (expected a list of names).", err.getvalue())
+        self.assertIn('Row 5 skipped: not an object.', err.getvalue())
+
+    def test_jsonl_import_is_resumable_and_idempotent(self):
+        rows = [
+            {'title': f'Book {number}', 'isbn': f'ISBN{number}', 'genres': ['Fantasy'], 'copies': 1}
+            for number in range(5)
+        ]
+        path = self.write('catalog.jsonl', '\n'.join(json.dumps(row) for row in rows))
+        checkpoint = Path(self.directory.name) / 'checkpoint'
+        checkpoint.write_text('3')
+
+        call_command('import_catalog', path, checkpoint=str(checkpoint), stdout=StringIO())
+        self.assertEqual(sorted(Book.objects.values_list('isbn', flat=True)), ['ISBN3', 'ISBN4'])
+        self.assertEqual(checkpoint.read_text(), '5')
+
+        # Uma nova execução completa pula os ISBNs já importados:
+        call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 5)
+        self.assertEqual(BookInstance.objects.count(), 5)
+
+
+class ExportCatalogCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        for number in range(5):
+            book = Book.objects.create(title=f'Book {number}', summary='Summary', isbn=f'ISBN{number}', author=author)
+            book.genre.add(*[Genre.objects.get_or_create(name=name)[0] for name in ('Fantasy', 'Classic')])
+            BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+    def test_exports_books_in_chunks_as_csv(self):
+        out = StringIO()
+        call_command('export_catalog', 'books', chunk_size=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'id,title,summary,isbn,author_first_name,author_last_name,language,genres')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].endswith(',Book 0,Summary,ISBN0,Ursula,Le Guin,,Classic;Fantasy'))
+
+    def test_exported_books_can_be_imported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / 'books.csv')
+            call_command('export_catalog', 'books', output=path)
+            Book.objects.all().delete()
+            call_command('import_catalog', path, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 5)
+        self.assertEqual(Book.objects.filter(genre__name='Fantasy').count(), 5)
+
+    def test_exports_copies_as_jsonl(self):
+        out = StringIO()
+        call_command('export_catalog', 'copies', format='jsonl', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['status'], 'a')
+        self.assertIn(rows[0]['book_title'], [f'Book {number}' for number in range(5)])
+
+
+class SeedAndBenchmarkCommandTest(TestCase):
+    def test_seed_catalog(self):
+        call_command('seed_catalog', books=40, copies_per_book=2, users=5, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 40)
+        self.assertEqual(Author.objects.count(), 8)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertTrue(Book.genre.through.objects.exists())
+        on_loan = BookInstance.objects.filter(status='o')
+        self.assertFalse(on_loan.filter(borrower__isnull=True).exists())
+        self.assertEqual(LibraryStats.load().num_instances, BookInstance.objects.count())
+        book = Book.objects.first()
+        self.assertEqual(book.copies_total, book.bookinstance_set.count())
+
+    def test_seed_catalog_again_after_a_deletion(self):
+        call_command('seed_catalog', books=10, copies_per_book=1, users=1, stdout=StringIO())
+        Book.objects.order_by('pk').first().delete()
+        call_command('seed_catalog', books=10, copies_per_book=1, users=0, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 19)
+        self.assertEqual(Book.objects.order_by('-isbn').values_list('isbn', flat=True).first(), '9790000000019')
+
+    def test_benchmark_catalog_saves_json(self):
+        call_command('seed_catalog', books=15, copies_per_book=2, users=2, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'benchmark.json'
+            out = StringIO()
+            call_command('benchmark_catalog', requests=3, warmup=0, user='reader0', output=str(output), stdout=out)
+            call_command('benchmark_catalog', requests=3, warmup=0, compare=str(output), stdout=out)
+            result = json.loads(output.read_text())
+
+        self.assertEqual(result['results']['books']['status'], [200])
+        self.assertEqual(result['results']['my-borrowed']['status'], [200])
+        for name in ('index', 'book-detail', 'author-detail', 'search', 'borrowed-books'):
+            self.assertIn(name, result['results'])
+            self.assertGreater(result['results'][name]['requests_per_second'], 0)
+        self.assertIn('p95', out.getvalue())
+
+    def test_profile_templates(self):
+        call_command('seed_catalog', books=15, copies_per_book=2, users=2, stdout=StringIO())
+        out = StringIO()
+        call_command('profile_templates', renders=2, page_size=5, top=1000, stdout=out)
+        output = out.getvalue()
+        for name in ('base.html', 'catalog/book_detail.html', 'catalog/bookinstance_list_borrowed_staff.html'):
+            self.assertIn(name, output)
+        self.assertIn('{% for copy in copies %}', output)
+
+
+class ProcessOverdueCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2030, 1, 10)
+        book = Book.objects.create(title='Overdue Book', summary='Summary', isbn='ISBN0')
+        readers = [
+            User.objects.create_user(username=f'reader{number}', email=f'reader{number}@example.com')
+            for number in range(3)
+        ]
+        readers.append(User.objects.create_user(username='no-email'))
+        for reader in readers:
+            for days in (1, 2):
+                BookInstance.objects.create(
+                    book=book, imprint='Imprint', status='o', borrower=reader,
+                    due_back=cls.today - datetime.timedelta(days=days),
+                )
+        # Não está atrasado:
+        BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=readers[0], due_back=cls.today)
+
+    def process(self, **options):
+        call_command('process_overdue', date=self.today, chunk_size=2, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_overdue_queryset(self):
+        self.assertEqual(BookInstance.objects.overdue(self.today).count(), 8)
+        copy = BookInstance.objects.with_overdue(self.today).filter(due_back=self.today).get()
+        self.assertFalse(copy.is_overdue)
+
+    def test_sends_one_email_per_borrower(self):
+        self.process()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            'reader0@example.com', 'reader1@example.com', 'reader2@example.com',
+        ])
+        self.assertEqual(mail.outbox[0].body.count('Overdue Book'), 2)
+        self.assertEqual(OverdueNotice.objects.count(), 6)
+
+    def test_rerun_does_not_duplicate_emails(self):
+        self.process()
+        self.process()
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failed_send_is_retried_without_resending_the_others(self):
+        send_messages = mail.get_connection().__class__.send_messages
+
+        def fail_for_reader1(connection, messages):
+            if messages[0].to == ['reader1@example.com']:
+                raise smtplib.SMTPRecipientsRefused({'reader1@example.com': (450, b'Try again later')})
+            return send_messages(connection, messages)
+
+        with mock.patch.object(mail.get_connection().__class__, 'send_messages', fail_for_reader1):
+            self.process()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['reader0@example.com', 'reader2@example.com'])
+        self.assertFalse(OverdueNotice.objects.filter(borrower__username='reader1').exists())
+
+        self.process()
+        self.assertEqual([message.to[0] for message in mail.outbox[2:]], ['reader1@example.com'])
+        self.assertEqual(OverdueNotice.objects.count(), 6)
+
+    def test_renewed_loan_is_notified_again(self):
+        self.process()
+        copy = BookInstance.objects.filter(borrower__username='reader1').first()
+        copy.due_back = self.today - datetime.timedelta(days=3)
+        copy.save()
+        self.process()
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_dry_run_sends_nothing(self):
+        self.process(dry_run=True)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(OverdueNotice.objects.exists())
+
+
+class ExpireHoldsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.copy = BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+        cls.patrons = [User.objects.create_user(username=f'patron{number}') for number in range(2)]
+
+    def test_expires_uncollected_holds_and_fulfils_new_copies(self):
+        ready = Hold.objects.create(
+            book=self.book, patron=self.patrons[0], status='r', book_instance=self.copy,
+            expires_at=timezone.now() - datetime.timedelta(days=1),
+        )
+        BookInstance.objects.filter(pk=self.copy.pk).update(status='r', borrower=self.patrons[0])
+        waiting = Hold.objects.create(book=self.book, patron=self.patrons[1])
+
+        out = StringIO()
+        call_command('expire_holds', dry_run=True, stdout=out)
+        self.assertIn('Would expire 1 holds.', out.getvalue())
+        self.assertEqual(Hold.objects.get(pk=ready.pk).status, 'r')
+
+        # Uma cópia nova, cadastrada enquanto o livro tinha fila, também é separada:
+        new_copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        Hold.objects.create(book=self.book, patron=User.objects.create_user(username='patron2'))
+        out = StringIO()
+        call_command('expire_holds', stdout=out)
+        self.assertIn('Expired 1 holds; 1 waiting holds got an available copy.', out.getvalue())
+        self.assertEqual(Hold.objects.get(pk=ready.pk).status, 'e')
+        self.assertEqual(Hold.objects.get(pk=waiting.pk).book_instance, self.copy)
+        self.assertEqual(BookInstance.objects.get(pk=new_copy.pk).status, 'r')
+        self.assertEqual(Hold.objects.filter(status='r').count(), 2)
@@ -0,0 +1,91 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+
+from ..metrics import registry
+from ..middleware import PerformanceMetricsMiddleware, QueryRecorder
+from ..models import Author, Book
+
+
+class PerformanceMetricsMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='2HJ1vRV0Z&3iD', is_staff=True)
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('books'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_metrics_are_aggregated_per_url_name(self):
+        self.client.get(reverse('books'))
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('authors'))
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['books'][0], 1)
+        self.assertEqual(snapshot['authors'][0], 2)
+        # 2 queries da versão da página (apenas na primeira requisição) + 2 por requisição:
+        self.assertEqual(snapshot['authors'][3]['db_queries_total'], 6)
+        self.assertGreater(snapshot['authors'][3]['response_bytes_total'], 0)
+        self.assertGreater(snapshot['authors'][3]['template_duration_seconds_total'], 0)
+
+    def test_metrics_endpoint_exports_prometheus_text(self):
+        self.client.get(reverse('books'))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'catalog_request_duration_seconds_count{view="books"} 1')
+        self.assertContains(response, 'catalog_db_queries_total{view="books"} 2')
+
+    def test_metrics_endpoint_requires_staff_or_token(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        with self.settings(CATALOG_METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+    async def test_async_requests_count_queries_from_executor_threads(self):
+        def query():
+            # Roda em uma thread do executor, com a conexão própria dessa thread:
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        async def view(request):
+            await asyncio.gather(
+                sync_to_async(query, thread_sensitive=False)(), sync_to_async(query, thread_sensitive=False)(),
+            )
+            return HttpResponse('ok')
+
+        middleware = PerformanceMetricsMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = await middleware(AsyncRequestFactory().get('/'))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertEqual(registry.snapshot()['unresolved'][3]['db_queries_total'], 2)
+
+
+class QueryRecorderTest(TestCase):
+    def test_counts_duplicate_queries(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            Book.objects.count()
+            Book.objects.count()
+            Author.objects.count()
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual(recorder.duplicates, 1)
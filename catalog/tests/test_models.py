@@ -1,5 +1,12 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
-from ..models import Author
+from django.contrib.auth.models import User
+
+from .. import circulation
+from ..models import Author, Book, BookInstance, BorrowerSummary, Genre, LibraryStats
 
 # create your tests here:
 
@@ -72,3 +79,230 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
         # Isso irá falhar se o urlconf não estiver definido.
         self.assertEquals(author.get_absolute_url(), '/catalog/author/1')
+
+
+class LibraryStatsModelTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Big', last_name='Bob')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author)
+        Genre.objects.create(name='Fantasy')
+        for status in ('a', 'a', 'o', 'm'):
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status=status)
+
+    def assertStatsMatchTables(self):
+        stats = LibraryStats.load()
+        rebuilt = LibraryStats.rebuild()
+        for field in LibraryStats._meta.concrete_fields:
+            self.assertEqual(getattr(stats, field.attname), getattr(rebuilt, field.attname), field.attname)
+
+    def test_counts_follow_creation(self):
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_books, 1)
+        self.assertEqual(stats.num_authors, 1)
+        self.assertEqual(stats.num_genres, 1)
+        self.assertEqual(stats.num_instances, 4)
+        self.assertEqual(stats.num_instances_available, 2)
+        self.assertEqual(stats.num_instances_on_loan, 1)
+        self.assertEqual(stats.num_instances_maintenance, 1)
+        self.assertStatsMatchTables()
+
+    def test_status_change_moves_count(self):
+        copy = BookInstance.objects.filter(status='a').first()
+        copy.status = 'r'
+        copy.save()
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_instances_available, 1)
+        self.assertEqual(stats.num_instances_reserved, 1)
+        self.assertStatsMatchTables()
+
+    def test_delete_decrements_counts(self):
+        BookInstance.objects.filter(status='o').delete()
+        Genre.objects.all().delete()
+        stats = LibraryStats.load()
+        self.assertEqual(stats.num_instances, 3)
+        self.assertEqual(stats.num_instances_on_loan, 0)
+        self.assertEqual(stats.num_genres, 0)
+        self.assertStatsMatchTables()
+
+    def test_load_rebuilds_missing_row(self):
+        LibraryStats.objects.all().delete()
+        self.assertEqual(LibraryStats.load().num_instances, 4)
+
+
+class BookCopyCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.other_book = Book.objects.create(title='Other Title', summary='Summary', isbn='HIJKLMN')
+        cls.loan_due = datetime.date(2030, 1, 10)
+        for status, due_back in (('a', None), ('a', None), ('o', cls.loan_due), ('m', None)):
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status=status, due_back=due_back)
+
+    def assertCountersMatchTables(self, book):
+        book.refresh_from_db()
+        counters = {field: getattr(book, field) for field in Book.COPY_COUNTER_FIELDS}
+        Book.refresh_copy_counters([book.pk])
+        book.refresh_from_db()
+        self.assertEqual(counters, {field: getattr(book, field) for field in Book.COPY_COUNTER_FIELDS})
+
+    def test_counters_follow_creation(self):
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.copies_total, 4)
+        self.assertEqual(self.book.copies_available, 2)
+        self.assertEqual(self.book.copies_on_loan, 1)
+        self.assertEqual(self.book.copies_maintenance, 1)
+        self.assertEqual(self.book.next_due_back, self.loan_due)
+        self.assertCountersMatchTables(self.book)
+
+    def test_loan_updates_available_and_next_due_back(self):
+        copy = BookInstance.objects.filter(status='a').first()
+        copy.status = 'o'
+        copy.due_back = datetime.date(2030, 1, 5)
+        copy.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.copies_available, 1)
+        self.assertEqual(self.book.copies_on_loan, 2)
+        self.assertEqual(self.book.next_due_back, datetime.date(2030, 1, 5))
+        self.assertCountersMatchTables(self.book)
+
+    def test_status_change_updates_counters(self):
+        copy = BookInstance.objects.filter(status='m').first()
+        copy.status = 'a'
+        copy.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available, self.book.copies_maintenance), (3, 0))
+        self.assertCountersMatchTables(self.book)
+
+    def test_status_only_saves_update_counters_and_stats(self):
+        # Apenas o status muda (sem due_back), duas vezes na mesma instância: os handlers de LibraryStats
+        # e dos contadores do livro comparam com o status carregado antes que ele seja atualizado.
+        copy = BookInstance.objects.filter(status='a').first()
+        copy.status = 'm'
+        copy.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_available, self.book.copies_maintenance), (1, 2))
+
+        copy.status = 'r'
+        copy.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.copies_maintenance, self.book.copies_reserved), (1, 1))
+        self.assertCountersMatchTables(self.book)
+        stats = LibraryStats.load()
+        self.assertEqual((stats.num_instances_available, stats.num_instances_maintenance), (1, 1))
+        self.assertEqual(stats.num_instances_reserved, 1)
+
+    def test_moving_a_copy_updates_both_books(self):
+        copy = BookInstance.objects.filter(status='o').first()
+        copy.book = self.other_book
+        copy.save()
+        self.book.refresh_from_db()
+        self.other_book.refresh_from_db()
+        self.assertEqual((self.book.copies_total, self.book.next_due_back), (3, None))
+        self.assertEqual((self.other_book.copies_total, self.other_book.next_due_back), (1, self.loan_due))
+
+    def test_delete_decrements_counters(self):
+        BookInstance.objects.filter(status='a').first().delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.copies_total, 3)
+        self.assertEqual(self.book.copies_available, 1)
+
+    def test_saving_a_stale_book_keeps_counters(self):
+        stale_book = Book.objects.get(pk=self.book.pk)
+        BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        stale_book.title = 'New Title'
+        stale_book.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'New Title')
+        self.assertEqual(self.book.copies_total, 5)
+
+    def test_reconcile_rebuilds_counters(self):
+        Book.objects.update(copies_total=0, copies_available=0, next_due_back=None)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.copies_total, 4)
+        self.assertEqual(self.book.copies_available, 2)
+        self.assertEqual(self.book.next_due_back, self.loan_due)
+
+
+
+class BorrowerSummaryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        cls.other_reader = User.objects.create_user(username='other', password='1X<ISRUkw+tuK')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a') for _ in range(3)]
+
+    def summary(self, user=None):
+        return BorrowerSummary.for_user(user or self.reader)
+
+    def test_summary_follows_single_loans(self):
+        self.assertEqual(self.summary().active_loans, 0)
+        circulation.checkout(self.copies[0].pk, self.reader, datetime.date(2030, 1, 10))
+        circulation.checkout(self.copies[1].pk, self.reader, datetime.date(2030, 1, 5))
+        summary = self.summary()
+        self.assertEqual(
+            (summary.active_loans, summary.next_due_back, summary.lifetime_loans), (2, datetime.date(2030, 1, 5), 2),
+        )
+
+        circulation.renew(self.copies[1].pk, datetime.date(2030, 2, 1))
+        self.assertEqual(self.summary().next_due_back, datetime.date(2030, 1, 10))
+        circulation.return_copy(self.copies[0].pk)
+        summary = self.summary()
+        self.assertEqual(
+            (summary.active_loans, summary.next_due_back, summary.lifetime_loans), (1, datetime.date(2030, 2, 1), 2),
+        )
+
+        # Reservar uma cópia não é um empréstimo:
+        circulation.reserve(self.copies[2].pk, self.reader)
+        self.assertEqual(self.summary().active_loans, 1)
+
+    def test_summary_follows_bulk_operations(self):
+        circulation.checkout_copies([copy.pk for copy in self.copies], self.reader, datetime.date(2030, 1, 10))
+        self.assertEqual((self.summary().active_loans, self.summary().lifetime_loans), (3, 3))
+
+        circulation.return_copies([self.copies[0].pk])
+        circulation.extend_due_back(BookInstance.objects.filter(status='o'), 1)
+        summary = self.summary()
+        self.assertEqual((summary.active_loans, summary.next_due_back), (2, datetime.date(2030, 1, 17)))
+
+        circulation.mark_returned(BookInstance.objects.all())
+        summary = self.summary()
+        self.assertEqual((summary.active_loans, summary.next_due_back, summary.lifetime_loans), (0, None, 3))
+
+    def test_overdue_count_is_recomputed_on_a_new_day(self):
+        today = datetime.date.today()
+        circulation.checkout(self.copies[0].pk, self.reader, today)
+        self.assertEqual(self.summary().overdue_loans, 0)
+
+        tomorrow = today + datetime.timedelta(days=1)
+        self.assertEqual(BorrowerSummary.for_user(self.reader, tomorrow).overdue_loans, 1)
+        # Recalculado uma vez por dia:
+        with self.assertNumQueries(1):
+            self.assertEqual(BorrowerSummary.for_user(self.reader, tomorrow).overdue_loans, 1)
+
+    def test_reconcile_rebuilds_summaries(self):
+        circulation.checkout(self.copies[0].pk, self.reader)
+        BorrowerSummary.objects.update(active_loans=0, next_due_back=None)
+        call_command('reconcile_counters', stdout=StringIO())
+        summary = self.summary()
+        self.assertEqual((summary.active_loans, summary.lifetime_loans), (1, 1))
+
+class BookInstanceDisplayTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for status, due_back in (('a', None), ('m', None), ('o', datetime.date(2020, 1, 1)), ('r', None)):
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status=status, due_back=due_back)
+
+    def test_annotations_match_model_methods(self):
+        copies = BookInstance.objects.with_display()
+        for copy in copies:
+            self.assertEqual(copy.status_label, copy.get_status_display())
+            self.assertEqual(copy.book_url, self.book.get_absolute_url())
+            self.assertEqual(bool(copy.overdue), copy.status == 'o')
+        self.assertEqual(
+            {copy.status: copy.status_css for copy in copies},
+            {'a': 'text-success', 'm': 'text-danger', 'o': 'text-warning', 'r': 'text-warning'},
+        )
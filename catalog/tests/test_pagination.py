@@ -0,0 +1,90 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Author, Book, BookInstance
+from ..pagination import InvalidCursor, KeysetPaginator
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Sobrenomes repetidos para exercitar o desempate pelos demais campos da ordenação:
+        for author_id in range(13):
+            Author.objects.create(first_name=f'Christian {author_id:02}', last_name=f'Surname {author_id % 4}')
+
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for copy_id in range(7):
+            due_back = None if copy_id % 3 == 0 else datetime.date(2022, 1, 1 + copy_id % 2)
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, status='o')
+
+    def walk(self, paginator):
+        """Percorre todas as páginas para frente e depois de volta, retornando as duas sequências."""
+        forward, pages = [], [paginator.page()]
+        while True:
+            forward.extend(pages[-1])
+            if not pages[-1].has_next():
+                break
+            pages.append(paginator.page(pages[-1].next_cursor))
+
+        backward, page = list(pages[-1]), pages[-1]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward = list(page) + backward
+        return forward, backward
+
+    def test_walks_authors_in_model_ordering(self):
+        paginator = KeysetPaginator(Author.objects.all(), 5, ('last_name', 'first_name', 'id'))
+        forward, backward = self.walk(paginator)
+        expected = list(Author.objects.order_by('last_name', 'first_name', 'id'))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_walks_nullable_ordering_with_nulls_last(self):
+        paginator = KeysetPaginator(BookInstance.objects.all(), 2, ('due_back', 'id'))
+        forward, backward = self.walk(paginator)
+        self.assertEqual(len(forward), 7)
+        self.assertEqual(len(set(copy.pk for copy in forward)), 7)
+        self.assertEqual(forward, backward)
+        due_dates = [copy.due_back for copy in forward]
+        self.assertEqual(due_dates, sorted(date for date in due_dates if date) + [None] * due_dates.count(None))
+
+    def test_first_page_has_no_previous(self):
+        page = KeysetPaginator(Author.objects.all(), 10, ('last_name', 'first_name', 'id')).page()
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Author.objects.all(), 10, ('last_name', 'first_name', 'id'))
+        with self.assertRaises(InvalidCursor):
+            paginator.page('not-a-cursor')
+
+
+class KeysetPaginationViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for author_id in range(13):
+            Author.objects.create(first_name=f'Christian {author_id}', last_name=f'Surname {author_id}')
+
+    def test_cursor_parameter_enables_keyset_pagination(self):
+        response = self.client.get(reverse('authors') + '?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page_obj'].is_keyset)
+        self.assertEqual(len(response.context['author_list']), 10)
+
+        response = self.client.get(reverse('authors'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['author_list']), 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    @override_settings(CATALOG_KEYSET_PAGINATION=True)
+    def test_setting_enables_keyset_pagination(self):
+        response = self.client.get(reverse('authors'))
+        self.assertTrue(response.context['page_obj'].is_keyset)
+        self.assertContains(response, '?cursor=')
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('authors') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from locallibrary.db.pool import ConnectionPool, PoolTimeout, get_pool, render_prometheus
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+
+    def close(self):
+        self.closed = True
+
+
+def check(connection):
+    if connection.broken:
+        raise ConnectionError('server closed the connection unexpectedly')
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def test_released_connection_is_reused(self):
+        pool = ConnectionPool('test', max_size=2)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['acquisitions'], stats['in_use']), (1, 2, 1))
+
+    def test_full_pool_times_out(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.05)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiting_thread_gets_the_released_connection(self):
+        pool = ConnectionPool('test', max_size=1, timeout=5)
+        connection = pool.acquire(FakeConnection)
+        timer = threading.Timer(0.05, pool.release, [connection])
+        timer.start()
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        timer.join()
+        self.assertGreater(pool.stats()['wait_sum'], 0)
+
+    def test_broken_idle_connection_is_replaced(self):
+        pool = ConnectionPool('test', max_size=1, health_check_interval=0, check=check)
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+        connection.broken = True
+        time.sleep(0.01)
+
+        replacement = pool.acquire(FakeConnection)
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_connection_that_cannot_be_reset_is_closed(self):
+        pool = ConnectionPool('test', max_size=1, reset=lambda connection: not connection.broken)
+        connection = pool.acquire(FakeConnection)
+        connection.broken = True
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_old_connections_are_not_reused(self):
+        pool = ConnectionPool('test', max_size=1, max_lifetime=0)
+        connection = pool.acquire(FakeConnection)
+        time.sleep(0.01)
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+
+    def test_failed_connect_frees_the_slot(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.05)
+
+        def refuse():
+            raise ConnectionError('connection refused')
+
+        with self.assertRaises(ConnectionError):
+            pool.acquire(refuse)
+        self.assertIsInstance(pool.acquire(FakeConnection), FakeConnection)
+
+    def test_prometheus_export(self):
+        pool = get_pool('pool-metrics-test', max_size=3)
+        pool.release(pool.acquire(FakeConnection))
+        text = '\n'.join(render_prometheus())
+        self.assertIn('db_pool_wait_seconds_count{database="pool-metrics-test"} 1', text)
+        self.assertIn('db_pool_idle{database="pool-metrics-test"} 1', text)
+        self.assertIn('db_pool_max_size{database="pool-metrics-test"} 3', text)
@@ -0,0 +1,62 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve
+
+from .. import routers
+from ..middleware import ReplicaRoutingMiddleware
+from ..models import Book
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = routers.ReplicaRouter()
+
+    def route(self, method, path, cookies=None, write=False):
+        """Executa a requisição no middleware e retorna (banco usado na leitura, resposta)."""
+        routed = {}
+
+        def get_response(request):
+            match = resolve(request.path)
+            self.middleware.process_view(request, match.func, match.args, match.kwargs)
+            if write:
+                self.router.db_for_write(Book)
+            routed['read'] = self.router.db_for_read(Book)
+            return HttpResponse()
+
+        self.middleware = ReplicaRoutingMiddleware(get_response)
+        request = getattr(self.factory, method)(path)
+        request.COOKIES.update(cookies or {})
+        response = self.middleware(request)
+        return routed['read'], response
+
+    def test_catalog_reads_use_a_replica(self):
+        for path in ('/catalog/', '/catalog/books/', '/catalog/book/1', '/catalog/authors/', '/catalog/author/1'):
+            self.assertEqual(self.route('get', path)[0], 'replica1', path)
+
+    def test_other_views_use_the_primary(self):
+        self.assertIsNone(self.route('get', '/catalog/mybooks/')[0])
+        self.assertIsNone(self.route('post', '/catalog/books/')[0])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        read, response = self.route('post', '/catalog/returns/')
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+        read, response = self.route('get', '/catalog/books/', cookies={routers.PIN_COOKIE: '1'})
+        self.assertIsNone(read)
+
+    def test_reads_after_a_write_in_the_same_request_use_the_primary(self):
+        read, response = self.route('get', '/catalog/', write=True)
+        self.assertIsNone(read)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'catalog'))
+        self.assertIsNone(self.router.allow_migrate('default', 'catalog'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        read, response = self.route('get', '/catalog/books/')
+        self.assertIsNone(read)
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
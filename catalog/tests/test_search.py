@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Author, Book, Genre
+from ..search import search_books
+
+
+class BookSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.wizard = Book.objects.create(
+            title='A Wizard of Earthsea', summary='A young mage on an archipelago.', isbn='9780553383041',
+            author=cls.author,
+        )
+        cls.wizard.genre.add(cls.fantasy)
+        cls.dispossessed = Book.objects.create(
+            title='The Dispossessed', summary='An ambiguous utopia about a wizard-free anarchist moon.',
+            isbn='9780061054884', author=cls.author,
+        )
+
+    def titles(self, query):
+        return [book.title for book in search_books(query, limit=10)]
+
+    def test_matches_title_summary_and_isbn(self):
+        self.assertEqual(self.titles('earthsea'), ['A Wizard of Earthsea'])
+        self.assertEqual(self.titles('anarchist'), ['The Dispossessed'])
+        self.assertEqual(self.titles('9780061054884'), ['The Dispossessed'])
+
+    def test_title_matches_rank_above_summary_matches(self):
+        self.assertEqual(self.titles('wizard'), ['A Wizard of Earthsea', 'The Dispossessed'])
+
+    def test_matches_author_and_genre_names(self):
+        self.assertEqual(self.titles('guin'), ['A Wizard of Earthsea', 'The Dispossessed'])
+        self.assertEqual(self.titles('fantasy'), ['A Wizard of Earthsea'])
+
+    def test_prefix_and_all_terms_required(self):
+        self.assertEqual(self.titles('earth wiz'), ['A Wizard of Earthsea'])
+        self.assertEqual(self.titles('earthsea anarchist'), [])
+        self.assertEqual(self.titles('"*)'), [])
+
+    def test_index_follows_related_changes(self):
+        self.author.last_name = 'Kroeber'
+        self.author.save()
+        self.assertEqual(len(self.titles('kroeber')), 2)
+
+        self.fantasy.name = 'Myth'
+        self.fantasy.save()
+        self.assertEqual(self.titles('myth'), ['A Wizard of Earthsea'])
+
+        self.wizard.genre.clear()
+        self.assertEqual(self.titles('myth'), [])
+
+        self.dispossessed.delete()
+        self.assertEqual(self.titles('anarchist'), [])
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.titles('guin'), ['A Wizard of Earthsea', 'The Dispossessed'])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'earthsea'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'catalog/book_search.html')
+        self.assertEqual(response.context['results'], [self.wizard])
+        self.assertFalse(response.context['has_next'])
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import uuid
 
@@ -6,16 +7,54 @@ from django.contrib.auth.models import Permission
 # Necessário para atribuir o usuário como um mutuário:
 from django.contrib.auth.models import User
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from ..models import Author, BookInstance, Book, Genre, Language
+from .helpers import QueryBudgetMixin
+
+
+class IndexViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_book = Book.objects.create(title='Outro Livro', summary='My book summary', isbn='ABCDEFG')
+        for status in ('a', 'o', 'o'):
+            BookInstance.objects.create(book=test_book, imprint='Unlikely Imprint, 2016', status=status)
+
+    def test_counts_come_from_library_stats(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_instances'], 3)
+        self.assertEqual(response.context['num_instances_available'], 1)
+        self.assertEqual(response.context['num_instances_on_loan'], 2)
+        self.assertEqual([str(book) for book in response.context['filter_books_by']], ['Outro Livro'])
+
+    def test_visit_counter_does_not_write_session(self):
+        user = User.objects.create_user(username='testuser1', password='1X<ISRUkw+tuK')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'id="num-visits"')
+        self.assertFalse([query for query in context.captured_queries if 'django_session' in query['sql']])
+
+    def test_visit_counter_sets_no_cookie(self):
+        # Um cookie por visitante impediria o cache compartilhado das páginas públicas (Vary: Cookie):
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.cookies)
 
 
 class AuthorListViewTest(TestCase):
+    def setUp(self):
+        # As páginas do catálogo ficam em cache entre os testes (o rollback não invalida o cache).
+        cache.clear()
+
     @classmethod
-    def SetUpTestData(cls):
+    def setUpTestData(cls):
         # Cria 13 autores para os testes de paginação:
         number_of_authors = 13
         
@@ -44,7 +83,7 @@ class AuthorListViewTest(TestCase):
         self.assertTrue('is_paginated' in response.context)
         if response.context['is_paginated']:
             self.assertTrue(response.context['is_paginated'])
-            self.assertTrue(response.context['author_list'] == 10)
+            self.assertTrue(len(response.context['author_list']) == 10)
         else:
             self.assertFalse(response.context['is_paginated'])
     
@@ -177,6 +216,21 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
                 last_date = book.due_back
 
 
+    def test_loan_summary_json_and_badge(self):
+        self.assertEqual(self.client.get(reverse('my-loan-summary')).status_code, 302)
+        for copy in BookInstance.objects.filter(borrower__username='testuser1')[:3]:
+            copy.status = 'o'
+            copy.due_back = datetime.date(2030, 1, 10)
+            copy.save()
+
+        self.client.login(username='testuser1', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('my-loan-summary'))
+        self.assertEqual(response.json(), {
+            'active_loans': 3, 'overdue_loans': 0, 'next_due_back': '2030-01-10', 'lifetime_loans': 3,
+        })
+        response = self.client.get(reverse('books'))
+        self.assertContains(response, '<span class="badge badge-secondary">3</span>', html=True)
+
 class RenewBookInstanceViewTest(TestCase):
     def setUp(self):
         # Cria um usuário:
@@ -297,3 +351,100 @@ class RenewBookInstanceViewTest(TestCase):
                                     {'renewal_date': invalid_date_in_future})
         self.assertEqual(response.status_code, 200)
         self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+
+
+
+class ViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        cls.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        cls.borrower = User.objects.create_user(username='borrower', password='1X<ISRUkw+tuK')
+
+        # Vários autores, livros, gêneros e cópias para que um N+1 apareça na contagem de queries:
+        genres = [Genre.objects.create(name=f'Genre {genre_id}') for genre_id in range(3)]
+        language = Language.objects.create(name='English')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        for book_id in range(8):
+            author = cls.author if book_id % 2 else Author.objects.create(first_name='Jane', last_name=f'Doe {book_id}')
+            book = Book.objects.create(
+                title=f'Book {book_id}', summary='Summary', isbn=f'ISBN{book_id}', author=author, language=language
+            )
+            book.genre.set(genres)
+            for copy_id in range(4):
+                BookInstance.objects.create(
+                    book=book,
+                    imprint='Unlikely Imprint, 2016',
+                    due_back=datetime.date.today() + datetime.timedelta(days=copy_id),
+                    borrower=cls.borrower,
+                    status='o' if copy_id % 2 else 'a',
+                )
+        cls.book = book
+
+    def test_book_list_budget(self):
+        self.assertQueryBudget(reverse('books'), 2)
+
+    def test_book_detail_budget(self):
+        # Versão da página (updated_at do livro e do autor) + livro + gêneros + cópias:
+        self.assertQueryBudget(reverse('book-detail', args=[self.book.pk]), 4)
+
+    def test_author_list_budget(self):
+        # Versão da página (MAX(updated_at) + LibraryStats) + COUNT da paginação + página:
+        self.assertQueryBudget(reverse('authors'), 4)
+
+    def test_author_detail_budget(self):
+        # Versão da página + autor + livros:
+        self.assertQueryBudget(reverse('author-detail', args=[self.author.pk]), 3)
+
+    def test_my_borrowed_budget(self):
+        self.client.force_login(self.borrower)
+        # Sessão + usuário + resumo dos empréstimos + COUNT da paginação + página (a sessão não é mais
+        # gravada a cada requisição):
+        self.assertQueryBudget(reverse('my-borrowed'), 5)
+
+    def test_all_borrowed_budget(self):
+        self.client.force_login(self.librarian)
+        # Sessão + usuário + permissões (2) + resumo dos empréstimos (menu lateral) + COUNT da paginação
+        # + página (sem gravação da sessão):
+        self.assertQueryBudget(reverse('borrowed-books'), 7)
+
+
+
+class ExportCatalogViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.librarian = User.objects.create_user(username='librarian', password='2HJ1vRV0Z&3iD')
+        cls.librarian.user_permissions.add(Permission.objects.get(name='Set book as returned'))
+        Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_redirect_if_not_librarian(self):
+        response = self.client.get(reverse('export-catalog', args=['authors', 'csv']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_streams_export(self):
+        self.client.force_login(self.librarian)
+        response = self.client.get(reverse('export-catalog', args=['authors', 'jsonl']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn(b'"last_name": "Smith"', b''.join(response.streaming_content))
+
+    def test_unknown_dataset_returns_404(self):
+        self.client.force_login(self.librarian)
+        response = self.client.get(reverse('export-catalog', args=['users', 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportCatalogAsgiTest(TransactionTestCase):
+    def test_export_is_streamed_from_the_event_loop(self):
+        # Sob ASGI o conteúdo é percorrido dentro do event loop (as queries rodam em outra thread,
+        # por isso os dados precisam estar gravados):
+        Author.objects.create(first_name='John', last_name='Smith')
+        self.client.force_login(User.objects.create_superuser(username='admin', password='2HJ1vRV0Z&3iD'))
+        response = self.client.get(reverse('export-catalog', args=['authors', 'csv']))
+
+        async def consume():
+            return b''.join(response)
+
+        content = asyncio.run(consume())
+        self.assertIn(b',John,Smith,', content)
@@ -1,15 +1,34 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# Em um deploy ASGI (ver README) as views de leitura mais acessadas podem ser servidas pelas versões assíncronas:
+if settings.CATALOG_ASYNC_VIEWS:
+    index, book_list, book_detail = async_views.index, async_views.book_list, async_views.book_detail
+    author_detail = async_views.author_detail_view
+else:
+    index, book_list, book_detail = views.index, views.BookListView.as_view(), views.BookDetailView.as_view()
+    author_detail = views.author_detail_view
 
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('books/', views.BookListView.as_view(), name='books'),
-    path('book/<int:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('', index, name='index'),
+    path('books/', book_list, name='books'),
+    path('book/<int:pk>', book_detail, name='book-detail'),
     path('authors/', views.AuthorListView.as_view(), name='authors'),
-    path('author/<int:pk>', views.author_detail_view, name='author-detail'),
+    path('author/<int:pk>', author_detail, name='author-detail'),
+    path('search/', views.book_search, name='search'),
     path('mybooks/', views.LoanedBooksByUserListView.as_view(), name='my-borrowed'),
+    path('mybooks/summary/', views.loan_summary, name='my-loan-summary'),
     path('borrowed/', views.OnLoanBooksListView.as_view(), name='borrowed-books'),
     path('book/<uuid:pk>/renew/', views.renew_book_librarian, name='renew-book-librarian'),
+    path('returns/', views.return_books_librarian, name='return-books'),
+    path('reports/loans/', views.loan_report, name='loan-report'),
+    path('export/<str:dataset>.<str:file_format>', views.export_catalog, name='export-catalog'),
+    path('_metrics', views.metrics, name='metrics'),
+    path('api/', api.api_root, name='api-root'),
+    path('api/<str:resource>/', api.collection, name='api-collection'),
+    path('api/<str:resource>/<str:pk>', api.item, name='api-item'),
+    path('api/copies/<str:pk>/<str:action>', api.copy_action, name='api-copy-action'),
     path('author/create/', views.AuthorCreate.as_view(), name='author-create'),
     path('author/<int:pk>/update/', views.AuthorUpdate.as_view(), name='author-update'),
     path('author/<int:pk>/delete/', views.AuthorDelete.as_view(), name='author-delete'),
@@ -1,11 +1,23 @@
 import datetime
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.contrib.auth.decorators import permission_required
-from django.http import HttpResponseRedirect
+from django.contrib.auth.decorators import login_required, permission_required
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.template.response import TemplateResponse
 from django.urls import reverse, reverse_lazy
-from .forms import RenewBookForm
-from .models import Book, Author, BookInstance, Genre
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from . import analytics, circulation, export
+from .cache import author_list_version, author_version, book_version, cache_catalog_page, conditional_catalog_page
+from .forms import LoanReportForm, RenewBookForm, ReturnCartForm
+from .metrics import registry
+from .models import Book, Author, BookInstance, BorrowerSummary, LibraryStats, detail_url
+from .pagination import KeysetPaginationMixin
+from .routers import replica_reads
+from .search import search_books
 from django.views import generic
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
@@ -13,97 +25,170 @@ from django.views.generic.edit import CreateView, UpdateView, DeleteView
 # Create your views here.
 
 
+@replica_reads
 def index(request):
     """View function para a home page do site."""
 
-    # Gera a contagem de alguns dos objetos principais
-    num_books = Book.objects.all().count()
-    num_instances = Book.objects.all().count()
-    num_genres = Genre.objects.all().count()
+    # Todas as contagens vêm da linha desnormalizada de LibraryStats (uma única query):
+    stats = LibraryStats.load()
 
-    # Livros disponíveis (status = 'a')
-    num_instances_available = BookInstance.objects.filter(status__exact='a').count()
-
-    # Livro com alguma palavra específica:
+    # Livro com alguma palavra específica (consulta o índice de busca, limitado a 10 livros):
     word = 'Outro'
-    filter_books_by = Book.objects.filter(title__icontains=word)
-
-    # O 'all()' fica implícito como padrão.
-    num_authors = Author.objects.count()
-
-    #  Número de visitas para esta view (é contado na variável session):
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits + 1
+    filter_books_by = search_books(word, limit=10)
 
     context = {
-        'num_books': num_books,
-        'num_instances': num_instances,
-        'num_instances_available': num_instances_available,
-        'num_authors': num_authors,
-        'num_genres': num_genres,
+        'num_books': stats.num_books,
+        'num_instances': stats.num_instances,
+        'num_instances_available': stats.num_instances_available,
+        'num_instances_on_loan': stats.num_instances_on_loan,
+        'num_authors': stats.num_authors,
+        'num_genres': stats.num_genres,
         'word': word,
         'filter_books_by': filter_books_by,
-        'num_visits': num_visits
     }
 
     # Renderiza o template HTML (index.html) com os dados da variável 'context':
-    return render(request, 'index.html', context=context)
+    # O número de visitas é contado pelo próprio template, no localStorage do navegador:
+    return TemplateResponse(request, 'index.html', context=context)
 
 
-class BookListView(generic.ListView):
+@method_decorator(cache_catalog_page, name='dispatch')
+class BookListView(KeysetPaginationMixin, generic.ListView):
     model = Book
+    replica_reads = True  # leituras servidas por uma réplica (catalog/routers.py)
     context_object_name = 'book_list'  # <- variável de template
     # queryset = Book.objects.filter(title__icontains='Livro')[:5]  # Pega 5 livros que contém a palavra filtrada.
     template_name = 'books/book_list.html'  # Especifica o nome/localização do template
     paginate_by = 10
+    # O template exibe o autor de cada livro, então ele é carregado no mesmo JOIN:
+    queryset = (
+        Book.objects.select_related('author')
+        .only('title', 'author__first_name', 'author__last_name')
+        .order_by('title', 'id')
+    )
+    keyset_ordering = ('title', 'id')
+
+    def get_queryset(self):
+        # A URL de cada livro vem do banco (sem um reverse() por linha no template):
+        return super().get_queryset().annotate(url=detail_url('book-detail'))
 
 
+@method_decorator(conditional_catalog_page(book_version), name='dispatch')
+@method_decorator(cache_catalog_page, name='dispatch')
 class BookDetailView(generic.DetailView):
     model = Book
+    replica_reads = True
+    # Autor e língua via JOIN; gêneros em uma query. As cópias são buscadas (em uma query) pelo
+    # template apenas quando o fragmento em cache da lista de cópias não é encontrado:
+    queryset = Book.objects.select_related('author', 'language').prefetch_related('genre')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['copies'] = self.object.bookinstance_set.with_display()
+        return context
 
 
-class AuthorListView(generic.ListView):
+@method_decorator(conditional_catalog_page(author_list_version, use_last_modified=False), name='dispatch')
+class AuthorListView(KeysetPaginationMixin, generic.ListView):
     model = Author
+    replica_reads = True
     paginate_by = 10
+    keyset_ordering = ('last_name', 'first_name', 'id')
+    queryset = Author.objects.only('first_name', 'last_name', 'date_of_birth', 'date_of_death')
+
+    def get_queryset(self):
+        return super().get_queryset().annotate(url=detail_url('author-detail'))
 
 
+@replica_reads
+@conditional_catalog_page(author_version)
+@cache_catalog_page
 def author_detail_view(request, pk):
     authors = Author.objects.filter(pk=pk)
-    books = Book.objects.filter(author=pk).order_by('title')
+    # O número de cópias de cada livro vem do contador desnormalizado Book.copies_total (sem COUNT por livro):
+    books = Book.objects.filter(author=pk).annotate(url=detail_url('book-detail')).order_by('title')
     # instances = BookInstance.objects.filter(book__author__id=pk)
     context = {
         'authors': authors,
         'books': books,
     }
-    return render(request, 'catalog/author_detail.html', context)
+    return TemplateResponse(request, 'catalog/author_detail.html', context)
 
 
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+@replica_reads
+def book_search(request):
+    """View function para a busca textual de livros (título, resumo, ISBN, autor e gênero)."""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    # Busca um resultado a mais apenas para saber se existe uma próxima página (sem COUNT):
+    per_page = 10
+    results = search_books(query, limit=per_page + 1, offset=(page - 1) * per_page) if query else []
+
+    context = {
+        'query': query,
+        'results': results[:per_page],
+        'page': page,
+        'has_next': len(results) > per_page,
+        'has_previous': page > 1,
+    }
+    return TemplateResponse(request, 'catalog/book_search.html', context)
+
+
+class LoanedBooksByUserListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """class-based view genérica que lista os livros emprestados para o usuário atual."""
 
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_user.html'
     paginate_by = 10
+    keyset_ordering = ('due_back', 'id')
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o').order_by('due_back')
-
-
-class OnLoanBooksListView(PermissionRequiredMixin, generic.ListView):
+        # O resumo (uma busca pela primary key, também usado no menu lateral) evita a query dos
+        # empréstimos de quem não tem nenhum:
+        if not BorrowerSummary.for_request(self.request).active_loans:
+            return BookInstance.objects.none()
+        return (
+            BookInstance.objects.filter(borrower=self.request.user)
+            .filter(status__exact='o')
+            .select_related('book')
+            .with_display()
+            .order_by('due_back', 'id')
+        )
+
+
+@login_required
+def loan_summary(request):
+    """View function que retorna o resumo dos empréstimos do usuário atual em JSON (ex: para o menu lateral)."""
+    response = JsonResponse(BorrowerSummary.for_request(request).as_dict())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class OnLoanBooksListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """class-based view genérica que lista quais usuários pegaram livros emprestados"""
     model = BookInstance
     template_name = 'catalog/bookinstance_list_borrowed_staff.html'
     paginate_by = 10
+    keyset_ordering = ('due_back', 'id')
     permission_required = 'catalog.can_mark_returned'
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o').order_by('due_back')
+        return (
+            BookInstance.objects.filter(status__exact='o')
+            .select_related('book', 'borrower')
+            .with_display()
+            .order_by('due_back', 'id')
+        )
 
 
 @permission_required('catalog.can_mark_returned')
 def renew_book_librarian(request, pk):
     """View function para renovação de BookInstance específico por um bibliotecário."""
-    book_instance = get_object_or_404(BookInstance, pk=pk)
+    book_instance = get_object_or_404(BookInstance.objects.select_related('book', 'borrower'), pk=pk)
 
     # Se for uma requisição POST, será processado os dados do Form
     if request.method == 'POST':
@@ -113,12 +198,14 @@ def renew_book_librarian(request, pk):
         
         # Checa se o formulário é válido:
         if form.is_valid():
-            # Processa os em form.cleaned_data conforme necessário (aqui apenas escrevemos no campo modelo due_back)
-            book_instance.due_back = form.cleaned_data['renewal_date']
-            book_instance.save()
-            
-            # Rediceciona para a nova URL:
-            return HttpResponseRedirect(reverse('borrowed-books'))
+            # Grava a nova data de devolução com a linha da cópia bloqueada (ver catalog/circulation.py):
+            try:
+                circulation.renew(book_instance.pk, form.cleaned_data['renewal_date'])
+            except circulation.CirculationError as error:
+                form.add_error(None, str(error))
+            else:
+                # Rediceciona para a nova URL:
+                return HttpResponseRedirect(reverse('borrowed-books'))
 
     # Se for uma requisição GET (ou qualquer outro método) cria um formulário padrão.
     else:
@@ -133,6 +220,66 @@ def renew_book_librarian(request, pk):
     return render(request, 'catalog/book_renew_librarian.html', context)
 
 
+@permission_required('catalog.can_mark_returned')
+def return_books_librarian(request):
+    """View function para registrar de uma vez a devolução de um carrinho de cópias (uma transação)."""
+    if request.method == 'POST':
+        form = ReturnCartForm(request.POST)
+        if form.is_valid():
+            result = circulation.return_copies(form.cleaned_data['barcodes'])
+            returned = len(result.done)
+            messages.success(request, f"{returned} cop{'y' if returned == 1 else 'ies'} returned.")
+            if result.skipped:
+                messages.warning(
+                    request, 'Not on loan (or unknown), not returned: ' + ', '.join(map(str, result.skipped))
+                )
+            # Redireciona (post/redirect/get) para que recarregar a página não reenvie o carrinho:
+            return HttpResponseRedirect(reverse('return-books'))
+    else:
+        form = ReturnCartForm()
+
+    return render(request, 'catalog/return_books_librarian.html', {'form': form})
+
+
+@permission_required('catalog.can_mark_returned')
+def export_catalog(request, dataset, file_format):
+    """View function que transmite a exportação do catálogo (livros, autores ou cópias) sem carregá-la na memória."""
+    if dataset not in export.DATASETS or file_format not in export.FORMATS:
+        raise Http404('Unknown export.')
+
+    _, content_type = export.FORMATS[file_format]
+    lines = export.stream_lines(export.export_lines(dataset, file_format))
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
+
+
+@permission_required('catalog.can_mark_returned')
+def loan_report(request):
+    """View function do relatório de circulação, lido apenas dos totais pré-agregados (comando rollup_loans)."""
+    form = LoanReportForm(request.GET)
+    context = {'form': form}
+    if form.is_valid():
+        rows, totals = analytics.loan_report(
+            form.cleaned_data['dimension'], form.cleaned_data['start'], form.cleaned_data['end'],
+        )
+        context.update(form.cleaned_data, rows=rows, totals=totals)
+    return render(request, 'catalog/loan_report.html', context)
+
+
+def metrics(request):
+    """View function que exporta as métricas de desempenho (formato texto do Prometheus).
+
+    Disponível para usuários staff e para quem enviar o CATALOG_METRICS_TOKEN (ex: o servidor do Prometheus).
+    O endereço do cliente não é usado: atrás de um proxy reverso local todas as requisições vêm de 127.0.0.1.
+    """
+    token = getattr(settings, 'CATALOG_METRICS_TOKEN', '')
+    authorized = token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    if not request.user.is_staff and not authorized:
+        raise PermissionDenied
+    return HttpResponse(registry.render_prometheus(), content_type='text/plain; version=0.0.4')
+
+
 # Formulários para criar, alterar e deletar autores:
 class AuthorCreate(PermissionRequiredMixin, CreateView):
     model = Author
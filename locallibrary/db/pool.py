@@ -0,0 +1,207 @@
+"""Pool de conexões em processo, compartilhado pelas threads de um worker (gthread/ASGI).
+
+O pool não depende do driver: o backend (locallibrary/db/postgresql/base.py) informa como abrir,
+verificar, limpar e fechar uma conexão. Cada pool mantém métricas (tempo de espera por uma conexão,
+timeouts, conexões criadas/descartadas) exportadas em /catalog/_metrics por render_prometheus().
+"""
+import threading
+import time
+from collections import deque
+
+# Limites (segundos) dos buckets do histograma de espera por uma conexão:
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão ficou livre dentro do timeout do pool."""
+
+
+class ConnectionPool:
+    """Pool de no máximo max_size conexões; as livres são reutilizadas da mais recente para a mais antiga.
+
+    Uma conexão livre há mais de max_idle_time segundos, ou aberta há mais de max_lifetime, é fechada
+    em vez de reutilizada; livre há mais de health_check_interval segundos, é verificada com check()
+    antes de ser entregue. Na devolução, reset() deve retornar False se a conexão não puder voltar ao pool.
+    """
+
+    def __init__(self, alias, max_size=10, timeout=10.0, max_idle_time=300.0, max_lifetime=3600.0,
+                 health_check_interval=30.0, check=None, reset=None, close=None):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self._check = check or (lambda connection: None)
+        self._reset = reset or (lambda connection: True)
+        self._close = close or (lambda connection: connection.close())
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conexão, instante da devolução)
+        self._opened_at = {}  # id(conexão) -> instante da abertura
+        self._size = 0  # conexões abertas (livres + em uso) ou sendo abertas
+
+        self.acquisitions = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def acquire(self, connect):
+        """Retorna uma conexão livre ou abre uma nova com connect(); espera até timeout se o pool estiver cheio."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            connection = released_at = None
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"No connection available in the '{self.alias}' pool after {self.timeout} seconds "
+                            f"({self.max_size} connections in use)."
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opened_at[id(connection)] = time.monotonic()
+                    self.created += 1
+            elif not self._is_reusable(connection, released_at):
+                self._discard(connection)
+                continue
+
+            self._record_wait(time.monotonic() - start)
+            return connection
+
+    def release(self, connection):
+        """Devolve a conexão ao pool (ou a fecha, se ela estiver quebrada, em transação ou velha demais)."""
+        try:
+            reusable = self._reset(connection)
+        except Exception:
+            reusable = False
+        if not reusable or self._expired(connection, time.monotonic()):
+            self._discard(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def close_idle(self):
+        """Fecha todas as conexões livres (ex: antes de um fork ou no encerramento do worker)."""
+        with self._cond:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+    def _expired(self, connection, now):
+        return now - self._opened_at.get(id(connection), now) > self.max_lifetime
+
+    def _is_reusable(self, connection, released_at):
+        now = time.monotonic()
+        if self._expired(connection, now) or now - released_at > self.max_idle_time:
+            return False
+        if now - released_at > self.health_check_interval:
+            try:
+                self._check(connection)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, connection):
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+        with self._cond:
+            self._opened_at.pop(id(connection), None)
+            self._size -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    def _record_wait(self, wait):
+        with self._cond:
+            self.acquisitions += 1
+            self.wait_sum += wait
+            for index, limit in enumerate(WAIT_BUCKETS):
+                if wait <= limit:
+                    self.wait_buckets[index] += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'acquisitions': self.acquisitions,
+                'wait_sum': self.wait_sum,
+                'wait_buckets': list(self.wait_buckets),
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'discarded': self.discarded,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, **options):
+    """Retorna o pool do banco 'alias' no processo atual, criando-o com as opções informadas."""
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(alias, **options)
+        return _pools[alias]
+
+
+def all_pools():
+    with _pools_lock:
+        return dict(_pools)
+
+
+def render_prometheus():
+    """Linhas no formato texto do Prometheus com as métricas de todos os pools do processo."""
+    pools = sorted(all_pools().items())
+    if not pools:
+        return []
+    lines = [
+        '# HELP db_pool_wait_seconds Tempo de espera por uma conexão do pool.',
+        '# TYPE db_pool_wait_seconds histogram',
+    ]
+    stats = [(alias, pool.stats()) for alias, pool in pools]
+    for alias, pool_stats in stats:
+        for limit, count in zip(WAIT_BUCKETS, pool_stats['wait_buckets']):
+            lines.append(f'db_pool_wait_seconds_bucket{{database="{alias}",le="{limit}"}} {count}')
+        lines.append(f'db_pool_wait_seconds_bucket{{database="{alias}",le="+Inf"}} {pool_stats["acquisitions"]}')
+        lines.append(f'db_pool_wait_seconds_sum{{database="{alias}"}} {pool_stats["wait_sum"]:.6f}')
+        lines.append(f'db_pool_wait_seconds_count{{database="{alias}"}} {pool_stats["acquisitions"]}')
+
+    for name, kind, help_text in (
+        ('in_use', 'gauge', 'Conexões do pool em uso.'),
+        ('idle', 'gauge', 'Conexões livres no pool.'),
+        ('max_size', 'gauge', 'Tamanho máximo do pool.'),
+        ('timeouts', 'counter', 'Esperas por uma conexão que excederam o timeout do pool.'),
+        ('created', 'counter', 'Conexões abertas pelo pool.'),
+        ('discarded', 'counter', 'Conexões fechadas pelo pool (quebradas, ociosas ou velhas demais).'),
+    ):
+        metric = f'db_pool_{name}_total' if kind == 'counter' else f'db_pool_{name}'
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for alias, pool_stats in stats:
+            lines.append(f'{metric}{{database="{alias}"}} {pool_stats[name]}')
+    return lines
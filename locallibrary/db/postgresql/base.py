@@ -0,0 +1,87 @@
+"""Backend PostgreSQL com health checks das conexões persistentes e pool de conexões opcional.
+
+Configurado em DATABASES (ver settings.py e a seção "Conexões com o banco" do README):
+
+    'ENGINE': 'locallibrary.db.postgresql',
+    'CONN_HEALTH_CHECKS': True,  # verifica a conexão persistente antes da primeira query de cada requisição
+    'POOL': {'max_size': 10, 'timeout': 10},  # opcional: pool compartilhado pelas threads do processo
+
+Com 'POOL' a conexão de cada thread é emprestada do pool (locallibrary/db/pool.py) ao ser aberta e
+devolvida a ele quando o Django a fecha (no fim da requisição, com CONN_MAX_AGE = 0).
+"""
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from ..pool import PoolTimeout, get_pool
+
+Database = base.Database
+
+
+def _check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def _reset_connection(connection):
+    """Prepara a conexão para voltar ao pool; retorna False se ela deve ser fechada."""
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        # A requisição terminou no meio de uma transação (ex: erro dentro de um atomic()).
+        connection.rollback()
+    return connection.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Se a conexão persistente já foi verificada nesta requisição.
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        return get_pool(self.alias, check=_check_connection, reset=_reset_connection, **options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            return pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Chamado no início e no fim de cada requisição: a conexão mantida aberta entre requisições
+        # será verificada antes da próxima query.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and not self.in_atomic_block
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            # Uma conexão persistente pode ter sido derrubada pelo servidor (restart, failover, timeout do
+            # pgbouncer): é fechada aqui, e reaberta logo abaixo, em vez de falhar na primeira query.
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
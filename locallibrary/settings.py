@@ -33,6 +33,10 @@ ALLOWED_HOSTS = [
     '127.0.0.1'
 ]
 
+# Token com acesso ao endpoint de métricas (/catalog/_metrics) sem login de staff, enviado pelo Prometheus
+# no cabeçalho 'Authorization: Bearer <token>'. Vazio: apenas usuários staff.
+CATALOG_METRICS_TOKEN = os.environ.get('CATALOG_METRICS_TOKEN', '')
+
 
 # Application definition
 
@@ -48,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'catalog.middleware.PerformanceMetricsMiddleware',
+    'catalog.middleware.ReplicaRoutingMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,7 +67,12 @@ CSRF_COOKIE_SECURE = True
 
 SESSION_COOKIE_SECURE = True
 
-SESSION_SAVE_EVERY_REQUEST = True
+# Grava a sessão apenas quando ela é alterada (login, logout, etc.), e não a cada requisição.
+SESSION_SAVE_EVERY_REQUEST = False
+
+# 'cached_db' lê as sessões do cache e só grava no banco quando elas mudam. Use
+# 'django.contrib.sessions.backends.signed_cookies' para não usar a tabela django_session.
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
 
 ROOT_URLCONF = 'locallibrary.urls'
 
@@ -71,13 +82,24 @@ TEMPLATES = [
         'DIRS': [
             os.path.join(BASE_DIR, 'templates')
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Os templates são lidos e compilados uma vez por processo e reutilizados nas requisições seguintes
+            # (em desenvolvimento, com DJANGO_TEMPLATE_CACHE=0, são recarregados a cada renderização).
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ] if os.environ.get('DJANGO_TEMPLATE_CACHE', '1') == '1' else [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'catalog.context_processors.catalog',
             ],
         },
     },
@@ -97,6 +119,37 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# Memória local por padrão (desenvolvimento e testes). Em produção, com vários workers, use um cache
+# compartilhado para que a invalidação das páginas do catálogo alcance todos eles:
+# REDIS_URL (ex: redis://127.0.0.1:6379/1) ou DJANGO_CACHE_DIR (cache em arquivos).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif os.environ.get('DJANGO_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+    }
+
+# Tempo (segundos) que as páginas do catálogo ficam em cache para usuários anônimos (0 desativa).
+CATALOG_PAGE_CACHE_TIMEOUT = int(os.environ.get('CATALOG_PAGE_CACHE_TIMEOUT', 600))
+
+# Cache-Control: max-age (segundos) das páginas condicionais do catálogo para usuários anônimos, durante
+# o qual um proxy reverso/CDN pode servi-las sem consultar a aplicação (depois revalida com o ETag).
+CATALOG_PAGE_MAX_AGE = int(os.environ.get('CATALOG_PAGE_MAX_AGE', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -145,12 +198,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Redirect to home URL after login (Default redirects to /accounts/profile/)
 LOGIN_REDIRECT_URL = '/'
 
+# Usa paginação por keyset (cursor) em todas as list views do catálogo, em vez de apenas
+# quando o parâmetro '?cursor=' é informado. Evita COUNT(*) e OFFSET em catálogos grandes.
+CATALOG_KEYSET_PAGINATION = os.environ.get('CATALOG_KEYSET_PAGINATION', '') == '1'
+
+# Serve a home page, a lista/detalhes de livros e os detalhes do autor com as views assíncronas de
+# 'catalog/async_views.py' (apenas faz sentido em um deploy ASGI, ver README).
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS', '') == '1'
+
+# Nas views assíncronas, executa as queries independentes de uma página em threads/conexões separadas
+# (cada query abre e fecha a sua conexão; desativado por padrão).
+CATALOG_ASYNC_PARALLEL_QUERIES = os.environ.get('CATALOG_ASYNC_PARALLEL_QUERIES', '') == '1'
+
+# Cache-Control: max-age (segundos) das respostas GET da API JSON; com 0 os clientes e a CDN
+# revalidam a cada requisição usando o ETag (resposta 304 sem consultar o banco).
+CATALOG_API_MAX_AGE = int(os.environ.get('CATALOG_API_MAX_AGE', 0))
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Heroku: Atualiza a configuração do banco de dados de $DATABASE_URL.
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Réplicas de leitura: DATABASE_REPLICA_URLS com uma ou mais URLs separadas por vírgula (ex:
+# 'postgres://.../library_replica' ou, localmente, 'sqlite:////caminho/db-replica.sqlite3'). As views de
+# leitura do catálogo leem de uma réplica; gravações e leituras logo após gravar usam o principal
+# (ver catalog/routers.py). Nos testes as réplicas apontam para o banco de teste principal.
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = dj_database_url.parse(url.strip(), conn_max_age=500)
+    DATABASES[f'replica{number}']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+
+# Conexões com o PostgreSQL (principal e réplicas), conforme DATABASE_POOL_MODE (ver README):
+# - 'persistent' (padrão): uma conexão por thread, mantida aberta entre as requisições (CONN_MAX_AGE);
+# - 'pool': pool no processo, compartilhado pelas threads do worker (gthread/ASGI), com no máximo
+#   DATABASE_POOL_SIZE conexões por processo e espera de até DATABASE_POOL_TIMEOUT segundos por uma livre;
+# - 'pgbouncer': conexões com um pgbouncer em transaction mode, sem cursores do lado do servidor.
+# Nos três modos a conexão reutilizada é verificada antes de ser usada (health check).
+DATABASE_POOL_MODE = os.environ.get('DATABASE_POOL_MODE', 'persistent')
+for database in DATABASES.values():
+    if database['ENGINE'] not in ('django.db.backends.postgresql', 'django.db.backends.postgresql_psycopg2'):
+        continue
+    database['ENGINE'] = 'locallibrary.db.postgresql'
+    database['CONN_HEALTH_CHECKS'] = True
+    if DATABASE_POOL_MODE == 'pool':
+        # A conexão volta para o pool no fim de cada requisição.
+        database['CONN_MAX_AGE'] = 0
+        database['POOL'] = {
+            'max_size': int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        }
+    elif DATABASE_POOL_MODE == 'pgbouncer':
+        # Em transaction mode cada transação pode usar uma conexão diferente do servidor.
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Tempo (segundos) em que um cliente que acabou de gravar continua lendo do banco principal.
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 10))
+
 # Simplified static file serving;
 # https://warehouse.python.org/project/whitenoise/
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'